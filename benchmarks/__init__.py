@@ -0,0 +1,3 @@
+"""
+Бенчмарки бота
+""" 
\ No newline at end of file
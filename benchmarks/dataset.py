@@ -0,0 +1,155 @@
+import bisect
+import itertools
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Sequence
+
+from src.database.database import Database
+from src.utils.domains import LinkClassifier
+from src.utils.urls import url_hash
+from src.utils.utils import get_file_category
+
+# id первого пользователя в синтетических данных
+FIRST_USER_ID = 100000
+# Сколько строк вставлять за один executemany
+INSERT_CHUNK = 50000
+
+# Слова для названий и описаний файлов (по ним же строятся поисковые запросы)
+WORDS = [
+    'отчет', 'договор', 'счет', 'фото', 'презентация', 'резюме', 'scan', 'invoice', 'report',
+    'project', 'backup', 'notes', 'лекция', 'конспект', 'план', 'бюджет', 'выписка', 'паспорт',
+    'travel', 'music', 'draft', 'final', 'summary', 'photo', 'диплом', 'курсовая', 'таблица',
+    'smeta', 'contract', 'receipt', 'video', 'record', 'анкета', 'заявление', 'справка',
+]
+# Теги: в начале списка - популярные, к концу - редкие (выбираются по закону Ципфа)
+TAGS = [
+    'работа', 'личное', 'важное', 'учеба', 'документы', 'семья', 'отпуск', 'финансы', 'налоги',
+    'здоровье', 'машина', 'квартира', 'проект', 'архив', 'срочно', 'клиенты', 'счета', 'курсы',
+    'книги', 'музыка', 'фильмы', 'рецепты', 'спорт', 'дети', 'подарки', 'ремонт', 'страховка',
+    'банк', 'визы', 'билеты', '2023', '2024', '2025', 'черновик', 'итог', 'q1', 'q2', 'q3', 'q4',
+]
+# Расширения файлов и их доля среди загрузок (категория берется из get_file_category)
+EXTENSIONS = [
+    ('jpg', 30), ('pdf', 18), ('png', 8), ('mp4', 8), ('docx', 7), ('xlsx', 4), ('txt', 3),
+    ('mp3', 4), ('zip', 3), ('ogg', 3), ('doc', 2), ('pptx', 2), ('rar', 1), ('mov', 2),
+    ('webp', 2), ('csv', 1), ('apk', 1), ('py', 1),
+]
+# Сайты для сохраненных ссылок
+LINK_HOSTS = [
+    'github.com', 'habr.com', 'youtube.com', 'stackoverflow.com', 'docs.python.org', 'ozon.ru',
+    'wildberries.ru', 'vc.ru', 'medium.com', 'news.ycombinator.com', 'vk.com', 't.me',
+    'wikipedia.org', 'coursera.org', 'notion.so', 'example.com', 'blog.example.org',
+]
+
+
+class Dataset(NamedTuple):
+    """Сгенерированная БД: пользователи и по одной активной ссылке на файл у каждого"""
+    db_path: str
+    total_files: int
+    user_ids: List[int]
+    share_ids: Dict[int, str]
+
+
+class WeightedChoice:
+    """Быстрый выбор элемента с заданными весами (кумулятивные суммы и бинарный поиск)"""
+
+    def __init__(self, items: Sequence, weights: Sequence[float]):
+        self.items = list(items)
+        self.cumulative = list(itertools.accumulate(weights))
+
+    def __call__(self, rng: random.Random):
+        return self.items[bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+def zipf_weights(count: int, exponent: float) -> List[float]:
+    """Веса 1/rank^exponent: при exponent=0 распределение равномерное"""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def seed_database(db_path: str, total_files: int, users: int = 100, seed: int = 1,
+                  zipf: float = 0.0, links: int = 0) -> Dataset:
+    """
+    Создать БД со схемой бота и заполнить ее синтетическими данными.
+
+    total_files файлов распределяются между users пользователями: равномерно
+    (zipf=0) или по закону Ципфа с показателем zipf - немногие активные
+    пользователи хранят большую часть файлов, как в живой базе. Так же
+    распределяются links сохраненных ссылок. Пользователям выдается тариф без
+    ограничений, чтобы квоты не мешали сценариям загрузки.
+    """
+    Database(db_path)
+    rng = random.Random(seed)
+    user_ids = [FIRST_USER_ID + index for index in range(users)]
+    choose_user = WeightedChoice(user_ids, zipf_weights(users, zipf)) if zipf else None
+    choose_extension = WeightedChoice([ext for ext, _ in EXTENSIONS], [weight for _, weight in EXTENSIONS])
+    choose_tag = WeightedChoice(TAGS, zipf_weights(len(TAGS), 1.0))
+    upload_date = datetime.now() - timedelta(days=365)
+    first_files: Dict[int, int] = {}
+
+    def owner(index: int) -> int:
+        return choose_user(rng) if choose_user else user_ids[index % users]
+
+    def file_rows():
+        for index in range(total_files):
+            extension = choose_extension(rng)
+            user_id = owner(index)
+            first_files.setdefault(user_id, index)
+            tags = {choose_tag(rng) for _ in range(rng.randint(1, 3))} if rng.random() < 0.3 else None
+            yield (
+                f"seed_file_{index}", f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{index}.{extension}",
+                int(rng.lognormvariate(13, 1.5)) + 1, extension, get_file_category(extension), user_id,
+                (upload_date + timedelta(seconds=index * 30)).strftime('%Y-%m-%d %H:%M:%S'),
+                ' '.join(rng.sample(WORDS, 4)) if rng.random() < 0.3 else None,
+                ','.join(sorted(tags)) if tags else None,
+                index, user_id
+            )
+
+    classifier = LinkClassifier()
+
+    def link_rows():
+        for index in range(links):
+            url = f"https://{rng.choice(LINK_HOSTS)}/{rng.choice(WORDS)}/{index}"
+            yield (
+                owner(index), f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}", url,
+                classifier.classify(url), url_hash(url)
+            )
+
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        _insert_chunked(cursor, '''
+            INSERT INTO files (file_id, file_name, file_size, file_type, category, user_id,
+                               upload_date, description, tags, message_id, chat_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', file_rows())
+        _insert_chunked(cursor, '''
+            INSERT INTO user_links (user_id, title, url, category, url_hash)
+            VALUES (?, ?, ?, ?, ?)
+        ''', link_rows())
+
+        cursor.executemany(
+            'INSERT OR REPLACE INTO user_quotas (user_id, tier) VALUES (?, ?)',
+            [(user_id, 'unlimited') for user_id in user_ids]
+        )
+
+        # Ссылка на первый файл каждого пользователя, у которого есть файлы
+        share_ids = {}
+        expires_date = datetime.now() + timedelta(days=365)
+        for number, (user_id, index) in enumerate(sorted(first_files.items())):
+            share_ids[user_id] = f"bench{number:08d}"
+            cursor.execute('''
+                INSERT INTO share_links (share_id, file_id, user_id, record_id, expires_date)
+                SELECT ?, file_id, user_id, id, ? FROM files WHERE file_id = ?
+            ''', (share_ids[user_id], expires_date, f"seed_file_{index}"))
+        conn.commit()
+
+    return Dataset(db_path, total_files, user_ids, share_ids)
+
+
+def _insert_chunked(cursor: sqlite3.Cursor, query: str, rows):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, INSERT_CHUNK))
+        if not chunk:
+            break
+        cursor.executemany(query, chunk)
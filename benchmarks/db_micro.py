@@ -0,0 +1,387 @@
+"""
+Микробенчмарки методов Database на синтетической БД с перекосом данных
+(пользователи по закону Ципфа, смесь типов файлов, словарь тегов).
+
+Для каждого метода замеряются задержки p50/p99, пик выделенной памяти Python
+за вызов и выполненные SQL-запросы: план из EXPLAIN QUERY PLAN и оценка
+количества просмотренных строк по плану и статистике индексов. Методы,
+работающие с данными пользователя, замеряются для самого активного
+пользователя (heavy) и для типичного (typical).
+
+Запуск:
+    python -m benchmarks.db_micro --files 100000 --links 20000 --output db_report.json
+    python -m benchmarks.db_micro --methods get_user_files,search_files --files 1000000
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from benchmarks.dataset import WORDS, seed_database
+from benchmarks.e2e import percentile
+from src.database.database import Database
+
+# Разбор строки плана: SCAN/SEARCH таблицы, индекс и условия по его колонкам
+_PLAN_RE = re.compile(
+    r'^(?P<op>SCAN|SEARCH) (?P<table>\w+)'
+    r'(?: USING (?:(?:COVERING )?INDEX (?P<index>\w+)|INTEGER PRIMARY KEY|ROWID)(?: \((?P<cond>[^)]*)\))?)?'
+)
+# Таблицы и их псевдонимы в FROM/JOIN (в плане запроса указываются псевдонимы)
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_NOT_ALIASES = {'', 'WHERE', 'SET', 'ON', 'JOIN', 'LEFT', 'INNER', 'GROUP', 'ORDER', 'LIMIT', 'VALUES', 'USING'}
+# Запросы, для которых имеет смысл строить план
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+class TracedDatabase(Database):
+    """Database, которая записывает SQL всех запросов, пока включен capture"""
+
+    def __init__(self, db_path: str):
+        self.capture = False
+        self.statements: List[str] = []
+        super().__init__(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = super()._connect()
+        if self.capture:
+            conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+class PlanAnalyzer:
+    """
+    План запроса и оценка просмотренных строк.
+
+    SCAN - вся таблица. SEARCH по индексу - строки с теми же значениями колонок
+    индекса, что и в запросе (значения берутся из SQL с подставленными
+    параметрами), поэтому оценка учитывает перекос: у активного пользователя
+    строк намного больше среднего. Если значения найти не удалось, берется
+    среднее число строк на значение ключа.
+    """
+
+    def __init__(self, db_path: str):
+        self.conn = sqlite3.connect(db_path)
+        self._table_rows: Dict[str, int] = {}
+        self._rows_per_key: Dict[Tuple[str, int], float] = {}
+        self._index_tables = dict(self.conn.execute(
+            "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"
+        ))
+
+    def close(self):
+        self.conn.close()
+
+    def explain(self, statement: str) -> Tuple[List[str], Optional[int]]:
+        """Строки плана и оценка количества строк, которые прочитает запрос"""
+        try:
+            plan = [row[3] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+        except sqlite3.Error as e:
+            return [f"не удалось построить план: {e}"], None
+        aliases = {
+            alias or table: table
+            for table, alias in _TABLE_RE.findall(statement)
+            if alias.upper() not in _NOT_ALIASES
+        }
+        estimate = 0
+        for detail in plan:
+            match = _PLAN_RE.match(detail)
+            if match:
+                estimate += self._estimate(match, aliases, statement)
+        return plan, estimate
+
+    def _estimate(self, match, aliases: Dict[str, str], statement: str) -> int:
+        name, index, cond = match.group('table'), match.group('index'), match.group('cond') or ''
+        table = self._index_tables.get(index) or aliases.get(name, name)
+        if match.group('op') == 'SCAN':
+            return self.table_rows(table)
+        if index is None:
+            # Поиск по rowid
+            return 1
+        columns = re.findall(r'(\w+)=\?', cond)
+        values = [_find_value(statement, column) for column in columns]
+        if columns and all(value is not None for value in values):
+            where = ' AND '.join(f"{column} = {value}" for column, value in zip(columns, values))
+            try:
+                return self.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        return max(1, round(self.rows_per_key(table, index, len(columns))))
+
+    def table_rows(self, table: str) -> int:
+        if table not in self._table_rows:
+            try:
+                self._table_rows[table] = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            except sqlite3.Error:
+                self._table_rows[table] = 0
+        return self._table_rows[table]
+
+    def rows_per_key(self, table: str, index: str, columns: int) -> float:
+        """Среднее число строк на одно значение первых columns колонок индекса"""
+        key = (index, columns)
+        if key not in self._rows_per_key:
+            names = [row[2] for row in self.conn.execute(f"PRAGMA index_info({index})")][:columns]
+            total = self.table_rows(table)
+            if not names:
+                self._rows_per_key[key] = total
+            else:
+                distinct = self.conn.execute(
+                    f"SELECT COUNT(*) FROM (SELECT DISTINCT {', '.join(names)} FROM {table})"
+                ).fetchone()[0]
+                self._rows_per_key[key] = total / distinct if distinct else 0
+        return self._rows_per_key[key]
+
+
+def _find_value(statement: str, column: str) -> Optional[str]:
+    """Литерал, с которым колонка сравнивается на равенство в SQL с подставленными параметрами"""
+    match = re.search(rf"\b(?:\w+\.)?{column}\s*=\s*('(?:[^']|'')*'|-?\d+(?:\.\d+)?)", statement)
+    return match.group(1) if match else None
+
+
+class Context(NamedTuple):
+    """Данные для аргументов методов: пользователь и его записи"""
+    user_id: int
+    record_ids: List[int]
+    file_ids: List[str]
+    link_ids: List[int]
+    urls: List[str]
+    share_ids: List[str]
+
+
+def load_context(db_path: str, user_id: int) -> Context:
+    with sqlite3.connect(db_path) as conn:
+        files = conn.execute('SELECT id, file_id FROM files WHERE user_id = ? LIMIT 1000', (user_id,)).fetchall()
+        links = conn.execute('SELECT id, url FROM user_links WHERE user_id = ? LIMIT 1000', (user_id,)).fetchall()
+        shares = [row[0] for row in conn.execute('SELECT share_id FROM share_links LIMIT 1000')]
+    return Context(
+        user_id, [row[0] for row in files], [row[1] for row in files],
+        [row[0] for row in links], [row[1] for row in links], shares
+    )
+
+
+def _pick(rng: random.Random, items: list, default=0):
+    return rng.choice(items) if items else default
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    """Слово с опечаткой (переставлены две соседние буквы) для нечеткого поиска"""
+    if len(word) < 4:
+        return word
+    position = rng.randrange(1, len(word) - 2)
+    return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+
+
+# Уникальные значения для методов записи
+_counter = itertools.count()
+
+# Метод -> функция, возвращающая аргументы вызова
+BENCHMARKS: Dict[str, Callable[[Context, random.Random], tuple]] = {
+    'get_user_files': lambda c, r: (c.user_id,),
+    'get_user_files_by_category': lambda c, r: (c.user_id, r.choice(['images', 'documents', 'videos'])),
+    'get_user_categories': lambda c, r: (c.user_id,),
+    'get_file_by_id': lambda c, r: (_pick(r, c.file_ids, 'missing'),),
+    'check_file_exists': lambda c, r: (_pick(r, c.file_ids, 'missing'), c.user_id),
+    'get_file_by_record_id': lambda c, r: (_pick(r, c.record_ids),),
+    'search_files': lambda c, r: (c.user_id, r.choice(WORDS)),
+    'search_file_ids': lambda c, r: (c.user_id, r.choice(WORDS)),
+    'get_files_by_record_ids': lambda c, r: (c.user_id, r.sample(c.record_ids, min(10, len(c.record_ids)))),
+    'fuzzy_search_file_ids': lambda c, r: (c.user_id, _typo(r, r.choice(WORDS))),
+    'prefix_search_file_ids': lambda c, r: (c.user_id, r.choice(WORDS)[:3]),
+    'get_recent_file_ids': lambda c, r: (c.user_id,),
+    'get_file_stats': lambda c, r: (c.user_id,),
+    'get_storage_usage': lambda c, r: (c.user_id,),
+    'get_user_quota_settings': lambda c, r: (c.user_id,),
+    'get_share_link': lambda c, r: (_pick(r, c.share_ids, 'missing'),),
+    'check_link_exists': lambda c, r: (c.user_id, _pick(r, c.urls, 'https://example.com/missing')),
+    'get_existing_link_urls': lambda c, r: (c.user_id, r.sample(c.urls, min(20, len(c.urls)))),
+    'get_cached_link_title': lambda c, r: (_pick(r, c.urls, 'https://example.com/missing'),),
+    'get_links_for_check': lambda c, r: (_pick(r, c.link_ids), 200, 0),
+    'get_dead_user_links': lambda c, r: (c.user_id, 2),
+    'count_dead_user_links': lambda c, r: (c.user_id, 2),
+    'get_link_check_info': lambda c, r: (_pick(r, c.link_ids),),
+    'get_link_category_overrides': lambda c, r: (c.user_id,),
+    'get_service_state': lambda c, r: ('benchmark',),
+    'get_user_links': lambda c, r: (c.user_id,),
+    'get_user_links_by_category': lambda c, r: (c.user_id, r.choice(['tools', 'education', 'news'])),
+    'get_user_link_categories': lambda c, r: (c.user_id,),
+    'get_user_link_by_id': lambda c, r: (_pick(r, c.link_ids), c.user_id),
+    'search_user_links': lambda c, r: (c.user_id, r.choice(WORDS)),
+    'get_user_links_by_ids': lambda c, r: (c.user_id, r.sample(c.link_ids, min(10, len(c.link_ids)))),
+    'search_user_link_ids': lambda c, r: (c.user_id, r.choice(WORDS)),
+    'fuzzy_search_user_link_ids': lambda c, r: (c.user_id, _typo(r, r.choice(WORDS))),
+    'prefix_search_user_link_ids': lambda c, r: (c.user_id, r.choice(WORDS)[:3]),
+    'get_user_links_stats': lambda c, r: (c.user_id,),
+    'cleanup_expired_links': lambda c, r: (),
+    # Запись
+    'add_file': lambda c, r: (
+        f"micro_{next(_counter)}", f"{r.choice(WORDS)}.pdf", 1024, 'pdf', 'documents', c.user_id
+    ),
+    'add_user_link': lambda c, r: (c.user_id, r.choice(WORDS), f"https://example.com/micro/{next(_counter)}"),
+    'add_share_link': lambda c, r: (
+        f"micro{next(_counter)}", _pick(r, c.file_ids, 'missing'), c.user_id, _pick(r, c.record_ids)
+    ),
+    'save_cached_link_title': lambda c, r: (f"https://example.com/title/{next(_counter)}", 'Title'),
+    'set_service_state': lambda c, r: ('benchmark', str(next(_counter))),
+}
+# Методы, которым не нужен пользователь (замеряются один раз)
+GLOBAL_METHODS = {
+    'get_file_by_id', 'get_file_by_record_id', 'get_share_link', 'get_cached_link_title',
+    'get_links_for_check', 'get_link_check_info', 'get_service_state', 'cleanup_expired_links',
+    'save_cached_link_title', 'set_service_state',
+}
+
+
+async def bench_method(db: TracedDatabase, analyzer: PlanAnalyzer, name: str, context: Context,
+                       iterations: int, seed: int) -> Dict:
+    method = getattr(db, name)
+    make_args = BENCHMARKS[name]
+    rng = random.Random(seed)
+
+    # Прогрев: кэши и индексы в памяти строятся при первом обращении
+    result = await method(*make_args(context, rng))
+
+    latencies = []
+    for _ in range(iterations):
+        args = make_args(context, rng)
+        started = time.perf_counter()
+        result = await method(*args)
+        latencies.append(time.perf_counter() - started)
+
+    # Память и SQL замеряются отдельным вызовом, чтобы не искажать задержки
+    db.statements.clear()
+    db.capture = True
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline_memory = tracemalloc.get_traced_memory()[0]
+    try:
+        await method(*make_args(context, rng))
+        peak_memory = tracemalloc.get_traced_memory()[1] - baseline_memory
+    finally:
+        tracemalloc.stop()
+        db.capture = False
+
+    queries = []
+    seen = set()
+    for statement in db.statements:
+        text = ' '.join(statement.split())
+        if text in seen or not text.upper().startswith(_EXPLAINABLE):
+            continue
+        seen.add(text)
+        plan, rows = analyzer.explain(text)
+        queries.append({'sql': text[:300], 'plan': plan, 'est_rows_scanned': rows})
+
+    return {
+        'method': name,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'peak_kib': round(peak_memory / 1024, 1),
+        'result_rows': len(result) if isinstance(result, (list, set, dict)) else None,
+        'est_rows_scanned': sum(query['est_rows_scanned'] or 0 for query in queries),
+        'full_scans': sorted({
+            detail for query in queries for detail in query['plan'] if detail.startswith('SCAN')
+        }),
+        'queries': queries,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Микробенчмарки методов Database")
+    parser.add_argument('--files', type=int, default=100000, help="Количество файлов в БД")
+    parser.add_argument('--links', type=int, default=20000, help="Количество сохраненных ссылок")
+    parser.add_argument('--users', type=int, default=1000, help="Количество пользователей")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Показатель распределения Ципфа по пользователям")
+    parser.add_argument('--iterations', type=int, default=50, help="Вызовов каждого метода")
+    parser.add_argument('--methods', help="Только эти методы (через запятую)")
+    parser.add_argument('--db', help="Готовая БД вместо генерации (например, рабочая); замеры идут на ее копии")
+    parser.add_argument('--output', help="Файл для отчета в JSON (по умолчанию - stdout)")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    names = args.methods.split(',') if args.methods else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Неизвестные методы: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    with tempfile.TemporaryDirectory(prefix='bench_db_') as workdir:
+        db_path = os.path.join(workdir, 'micro.db')
+        if not args.db:
+            started = time.perf_counter()
+            dataset = seed_database(db_path, args.files, args.users, zipf=args.zipf, links=args.links)
+            print(f"БД создана за {time.perf_counter() - started:.1f} сек", file=sys.stderr)
+            user_ids = dataset.user_ids
+        else:
+            # Методы записи (add_file, cleanup_expired_links и др.) меняют БД - работаем с копией
+            with sqlite3.connect(args.db) as source, sqlite3.connect(db_path) as target:
+                source.backup(target)
+            with sqlite3.connect(db_path) as conn:
+                user_ids = [row[0] for row in conn.execute(
+                    'SELECT user_id FROM files GROUP BY user_id ORDER BY COUNT(*) DESC'
+                )]
+
+        # Самый активный пользователь и пользователь из середины распределения
+        users = {'heavy': user_ids[0], 'typical': user_ids[len(user_ids) // 10]}
+        contexts = {label: load_context(db_path, user_id) for label, user_id in users.items()}
+        db = TracedDatabase(db_path)
+        analyzer = PlanAnalyzer(db_path)
+
+        results = []
+        try:
+            for name in names:
+                labels = ['heavy'] if name in GLOBAL_METHODS else list(users)
+                for label in labels:
+                    result = await bench_method(db, analyzer, name, contexts[label], args.iterations, seed=1)
+                    result['user'] = label if name not in GLOBAL_METHODS else None
+                    results.append(result)
+                    print(
+                        f"{name:<30} {label if result['user'] else '':<8} p50 {result['p50_ms']:>8.3f} мс "
+                        f"p99 {result['p99_ms']:>8.3f} мс  строк ~{result['est_rows_scanned']:>8} "
+                        f"память {result['peak_kib']:>8.1f} KiB"
+                        + ("  SCAN" if result['full_scans'] else ""),
+                        file=sys.stderr
+                    )
+        finally:
+            analyzer.close()
+
+    public_methods = {
+        name for name, member in inspect.getmembers(Database, inspect.iscoroutinefunction)
+        if not name.startswith('_')
+    }
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'files': args.files,
+            'links': args.links,
+            'users': args.users,
+            'zipf': args.zipf,
+            'iterations': args.iterations,
+            'user_ids': users,
+            'not_benchmarked': sorted(public_methods - set(BENCHMARKS)),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,314 @@
+"""
+Нагрузочный тест конкурентного доступа к SQLite через Database.
+
+Несколько потоков, в каждом свой событийный цикл и несколько корутин, без
+пауз выполняют смесь чтений и записей. Ошибки блокировки считаются по логу
+src.database и относятся к операции, во время которой записаны:
+    lock_errors     - ошибки "database is locked" (уровень ERROR);
+    retries         - сообщения о блокировке ниже уровня ERROR (повторы);
+    silent_failures - операции, которые завершились без исключения, но с
+                      ошибкой блокировки в логе (метод вернул "error", [] или
+                      None - данные потеряны молча);
+    raised          - операции, завершившиеся исключением (DatabaseBusyError
+                      после всех повторов и т.п.).
+
+Прогон повторяется для каждого сочетания режима журнала и busy timeout на
+свежей копии одной и той же БД.
+
+Запуск:
+    python -m benchmarks.db_stress --threads 8 --tasks 4 --seconds 10
+    python -m benchmarks.db_stress --journal-modes delete,wal --busy-timeouts 0,100,5000 --output stress.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import closing
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks.dataset import WORDS, Dataset, WeightedChoice, seed_database
+from benchmarks.e2e import percentile
+from src.database.database import Database
+
+DEFAULT_JOURNAL_MODES = ('delete', 'wal')
+DEFAULT_BUSY_TIMEOUTS = (0, 100, 5000)
+# Операции и их доля в смеси: (метод, пишет ли в БД, вес)
+OPERATIONS = [
+    ('get_user_files', False, 20),
+    ('search_files', False, 20),
+    ('get_share_link', False, 10),
+    ('get_user_links', False, 10),
+    ('add_file', True, 15),
+    ('delete_file_by_record_id', True, 5),
+    ('add_user_link', True, 10),
+    ('set_service_state', True, 10),
+]
+# Признак ошибки блокировки в сообщениях Database
+LOCK_MARKERS = ('database is locked', 'database table is locked')
+
+
+class ConfiguredDatabase(Database):
+    """
+    Database с заданными режимом журнала и busy timeout. Режим журнала
+    устанавливается один раз в init_database: переключение из WAL требует
+    монопольного доступа к файлу, и на каждом соединении оно само упиралось
+    бы в блокировку.
+    """
+
+    def __init__(self, db_path: str, journal_mode: str, busy_timeout_ms: int):
+        self.JOURNAL_MODE = journal_mode
+        self.busy_timeout_ms = busy_timeout_ms
+        super().__init__(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+
+
+class LockLogCounter(logging.Handler):
+    """
+    Счетчик сообщений о блокировке БД по операции, во время которой они записаны.
+
+    Текущая операция хранится в ContextVar, а не в threading.local: Database
+    делает паузы между повторами через asyncio.sleep, и корутины одного потока
+    чередуются посреди операции. Логирование синхронное, поэтому emit видит
+    контекст той корутины, которая пишет сообщение.
+    """
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.current: ContextVar[Optional[Dict[str, int]]] = ContextVar('stress_op_stats', default=None)
+
+    def emit(self, record: logging.LogRecord):
+        stats = self.current.get()
+        if stats is None:
+            return
+        message = record.getMessage()
+        if any(marker in message for marker in LOCK_MARKERS):
+            stats['lock_errors' if record.levelno >= logging.ERROR else 'retries'] += 1
+        elif record.levelno >= logging.ERROR:
+            stats['other_errors'] += 1
+
+
+class OperationStats:
+    """Итоги операций одного прогона (общие для всех потоков)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def add(self, name: str, latency: float, stats: Dict[str, int]):
+        with self.lock:
+            counts = self.counts[name]
+            counts['ops'] += 1
+            for key, value in stats.items():
+                counts[key] += value
+            if stats.get('lock_errors') and not stats.get('raised'):
+                counts['silent_failures'] += 1
+            self.latencies[name].append(latency)
+
+
+def run_worker(db: Database, dataset: Dataset, counter: LockLogCounter, stats: OperationStats,
+               worker: int, tasks: int, deadline: float, write_ratio: float):
+    """Поток со своим событийным циклом: tasks корутин выполняют операции до deadline"""
+    reads = [(name, weight) for name, writes, weight in OPERATIONS if not writes]
+    writes = [(name, weight) for name, writes, weight in OPERATIONS if writes]
+    choose_read = WeightedChoice([name for name, _ in reads], [weight for _, weight in reads])
+    choose_write = WeightedChoice([name for name, _ in writes], [weight for _, weight in writes])
+
+    async def run_task(task: int):
+        rng = random.Random(worker * 1000 + task)
+        added: List[int] = []
+        number = 0
+        while time.perf_counter() < deadline:
+            number += 1
+            name = choose_write(rng) if rng.random() < write_ratio else choose_read(rng)
+            user_id = rng.choice(dataset.user_ids)
+            if name == 'delete_file_by_record_id' and not added:
+                name = 'add_file'
+
+            op_stats = defaultdict(int)
+            token = counter.current.set(op_stats)
+            started = time.perf_counter()
+            try:
+                if name == 'get_user_files':
+                    await db.get_user_files(user_id)
+                elif name == 'search_files':
+                    await db.search_files(user_id, rng.choice(WORDS))
+                elif name == 'get_share_link':
+                    await db.get_share_link(rng.choice(list(dataset.share_ids.values())))
+                elif name == 'get_user_links':
+                    await db.get_user_links(user_id)
+                elif name == 'add_file':
+                    record_id = await db.add_file(
+                        f"stress_{worker}_{task}_{number}", f"{rng.choice(WORDS)}_{number}.pdf",
+                        rng.randint(1024, 10 ** 6), 'pdf', 'documents', user_id
+                    )
+                    if isinstance(record_id, int):
+                        added.append(record_id)
+                elif name == 'delete_file_by_record_id':
+                    await db.delete_file_by_record_id(added.pop(), user_id)
+                elif name == 'add_user_link':
+                    url = f"https://example.com/stress/{worker}/{task}/{number}"
+                    await db.add_user_link(user_id, rng.choice(WORDS), url)
+                elif name == 'set_service_state':
+                    await db.set_service_state(f"stress_{worker}_{task}", str(number))
+            except Exception:
+                op_stats['raised'] += 1
+            finally:
+                counter.current.reset(token)
+            stats.add(name, time.perf_counter() - started, op_stats)
+            # Даем поработать другим корутинам этого потока
+            await asyncio.sleep(0)
+
+    async def run_all():
+        await asyncio.gather(*(run_task(task) for task in range(tasks)))
+
+    asyncio.run(run_all())
+
+
+def run_config(template: str, dataset: Dataset, journal_mode: str, busy_timeout_ms: int,
+               threads: int, tasks: int, seconds: float, write_ratio: float, workdir: str) -> Dict:
+    """Один прогон на свежей копии БД с заданными настройками"""
+    db_path = os.path.join(workdir, f"stress_{journal_mode}_{busy_timeout_ms}.db")
+    with closing(sqlite3.connect(template)) as source, closing(sqlite3.connect(db_path)) as target:
+        source.backup(target)
+    db = ConfiguredDatabase(db_path, journal_mode, busy_timeout_ms)
+
+    counter = LockLogCounter()
+    database_logger = logging.getLogger('src.database')
+    database_logger.addHandler(counter)
+    database_logger.setLevel(logging.DEBUG)
+    stats = OperationStats()
+    deadline = time.perf_counter() + seconds
+    workers = [
+        threading.Thread(
+            target=run_worker, args=(db, dataset, counter, stats, worker, tasks, deadline, write_ratio),
+            name=f"stress-{worker}"
+        )
+        for worker in range(threads)
+    ]
+    started = time.perf_counter()
+    try:
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    finally:
+        database_logger.removeHandler(counter)
+    elapsed = time.perf_counter() - started
+
+    operations = {}
+    totals: Dict[str, int] = defaultdict(int)
+    for name, counts in sorted(stats.counts.items()):
+        latencies = stats.latencies[name]
+        operations[name] = {
+            **counts,
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        }
+        for key, value in counts.items():
+            totals[key] += value
+    all_latencies = [value for values in stats.latencies.values() for value in values]
+
+    return {
+        'journal_mode': journal_mode,
+        'busy_timeout_ms': busy_timeout_ms,
+        'seconds': round(elapsed, 3),
+        'ops': totals['ops'],
+        'ops_per_sec': round(totals['ops'] / elapsed, 1) if elapsed else 0.0,
+        'p99_ms': round(percentile(all_latencies, 0.99) * 1000, 3),
+        'lock_errors': totals['lock_errors'],
+        'retries': totals['retries'],
+        'silent_failures': totals['silent_failures'],
+        'other_errors': totals['other_errors'],
+        'raised': totals['raised'],
+        'operations': operations,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест конкурентного доступа к SQLite")
+    parser.add_argument('--files', type=int, default=10000, help="Количество файлов в БД")
+    parser.add_argument('--users', type=int, default=100, help="Количество пользователей")
+    parser.add_argument('--threads', type=int, default=4, help="Потоков (у каждого свой событийный цикл)")
+    parser.add_argument('--tasks', type=int, default=4, help="Корутин в каждом потоке")
+    parser.add_argument('--seconds', type=float, default=10, help="Длительность прогона одной конфигурации")
+    parser.add_argument('--write-ratio', type=float, default=0.4, help="Доля операций записи")
+    parser.add_argument('--journal-modes', default=','.join(DEFAULT_JOURNAL_MODES),
+                        help="Режимы журнала через запятую (delete, truncate, wal, ...)")
+    parser.add_argument('--busy-timeouts', default=','.join(map(str, DEFAULT_BUSY_TIMEOUTS)),
+                        help="Значения busy timeout (мс) через запятую")
+    parser.add_argument('--output', help="Файл для отчета в JSON (по умолчанию - stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    # Сообщения Database считаются счетчиком, в консоль их не выводим
+    logging.getLogger('src.database').propagate = False
+
+    journal_modes = [mode for mode in args.journal_modes.split(',') if mode]
+    busy_timeouts = [int(timeout) for timeout in args.busy_timeouts.split(',') if timeout]
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_stress_') as workdir:
+        template = os.path.join(workdir, 'template.db')
+        dataset = seed_database(template, args.files, args.users, links=args.files // 5)
+        for journal_mode in journal_modes:
+            for busy_timeout_ms in busy_timeouts:
+                result = run_config(template, dataset, journal_mode, busy_timeout_ms, args.threads,
+                                    args.tasks, args.seconds, args.write_ratio, workdir)
+                results.append(result)
+                print(
+                    f"{journal_mode:<8} timeout {busy_timeout_ms:>6} мс: {result['ops_per_sec']:>9.1f} оп/с "
+                    f"p99 {result['p99_ms']:>8.2f} мс  блокировок {result['lock_errors']:>5}  "
+                    f"повторов {result['retries']:>5}  потеряно молча {result['silent_failures']:>5}",
+                    file=sys.stderr
+                )
+
+    # Конфигурации без ошибок блокировки - от самой быстрой
+    reliable = sorted(
+        (item for item in results if not item['lock_errors'] and not item['raised']),
+        key=lambda item: -item['ops_per_sec']
+    )
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'files': args.files,
+            'users': args.users,
+            'threads': args.threads,
+            'tasks': args.tasks,
+            'seconds': args.seconds,
+            'write_ratio': args.write_ratio,
+        },
+        'recommended': (
+            {'journal_mode': reliable[0]['journal_mode'], 'busy_timeout_ms': reliable[0]['busy_timeout_ms']}
+            if reliable else None
+        ),
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
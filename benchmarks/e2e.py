@@ -0,0 +1,210 @@
+"""
+Сквозной бенчмарк: синтетические обновления проходят через настоящие
+Dispatcher и router бота, SQLite на диске и сессию Bot API, которая отвечает
+мгновенно. Замеряются обновлений в секунду и задержки p50/p99 по сценариям
+при разном количестве сохраненных файлов.
+
+Запуск:
+    python -m benchmarks.e2e --sizes 1000,100000 --ops 200 --output report.json
+    python -m benchmarks.e2e --baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import aiogram
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.dataset import WORDS, Dataset, seed_database
+from benchmarks.fake_session import InstantSession
+from benchmarks.updates import callback_update, document_update, message_update, to_update
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+FLOWS = ('upload', 'list', 'search', 'share_open', 'export')
+# Допустимое ухудшение относительно базового прогона (доля)
+DEFAULT_TOLERANCE = 0.15
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def flow_updates(flow: str, dataset: Dataset, index: int, rng: random.Random) -> List[dict]:
+    """Обновления одной операции сценария (загрузка - три шага диалога)"""
+    user_id = dataset.user_ids[index % len(dataset.user_ids)]
+    if flow == 'upload':
+        file_id = f"bench_upload_{dataset.total_files}_{index}"
+        return [
+            document_update(user_id, file_id, f"{rng.choice(WORDS)}_{index}.pdf", rng.randint(1024, 10 ** 7)),
+            callback_update(user_id, 'skip_description'),
+            callback_update(user_id, 'skip_tags'),
+        ]
+    if flow == 'list':
+        return [message_update(user_id, '/files')]
+    if flow == 'search':
+        return [message_update(user_id, f"/search {rng.choice(WORDS)}")]
+    if flow == 'share_open':
+        share_id = dataset.share_ids[rng.choice(list(dataset.share_ids))]
+        return [message_update(user_id, f"/start file_{share_id}")]
+    if flow == 'export':
+        return [callback_update(user_id, 'export_files')]
+    raise ValueError(f"Неизвестный сценарий: {flow}")
+
+
+async def run_flow(dp: Dispatcher, bot: Bot, session: InstantSession, flow: str, dataset: Dataset,
+                   ops: int, concurrency: int, seed: int) -> Dict:
+    """Выполнить ops операций сценария и посчитать пропускную способность и задержки"""
+    rng = random.Random(seed)
+    operations = [flow_updates(flow, dataset, index, rng) for index in range(ops)]
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    session.calls.clear()
+
+    async def run_operation(payloads: List[dict]):
+        async with semaphore:
+            # Шаги одной операции идут по порядку, как у живого пользователя
+            for payload in payloads:
+                started = time.perf_counter()
+                await dp.feed_update(bot, to_update(bot, payload))
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_operation(payloads) for payloads in operations))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'flow': flow,
+        'size': dataset.total_files,
+        'ops': ops,
+        'updates': len(latencies),
+        'seconds': round(elapsed, 4),
+        'updates_per_sec': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'api_calls': dict(session.calls),
+    }
+
+
+async def run_size(size: int, flows, ops: int, users: int, concurrency: int, workdir: str) -> List[Dict]:
+    """Создать БД на size файлов и прогнать по ней все сценарии"""
+    import src.handlers.handlers as handlers
+    from src.database.database import Database
+
+    db_path = os.path.join(workdir, f"bench_{size}.db")
+    started = time.perf_counter()
+    dataset = seed_database(db_path, size, users)
+    print(f"БД на {size} файлов создана за {time.perf_counter() - started:.1f} сек", file=sys.stderr)
+
+    handlers.db = Database(db_path)
+    session = InstantSession()
+    bot = Bot('42:BENCHMARK', session=session)
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(handlers.router)
+
+    results = []
+    for flow in flows:
+        result = await run_flow(dp, bot, session, flow, dataset, ops, concurrency, seed=size)
+        print(
+            f"{size:>9} {flow:<11} {result['updates_per_sec']:>10.1f} upd/s "
+            f"p50 {result['p50_ms']:>8.2f} мс  p99 {result['p99_ms']:>8.2f} мс",
+            file=sys.stderr
+        )
+        results.append(result)
+
+    # Роутер нельзя подключить к двум диспетчерам - отсоединяем его для следующего размера
+    handlers.router._parent_router = None
+    return results
+
+
+def compare_with_baseline(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Сравнить результаты с базовыми; возвращает описания ухудшений"""
+    previous = {(item['size'], item['flow']): item for item in baseline.get('results', [])}
+    regressions = []
+    for item in results:
+        base = previous.get((item['size'], item['flow']))
+        if base is None:
+            continue
+        if item['updates_per_sec'] < base['updates_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{item['flow']} @ {item['size']}: {item['updates_per_sec']} upd/s "
+                f"(было {base['updates_per_sec']})"
+            )
+        if item['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{item['flow']} @ {item['size']}: p99 {item['p99_ms']} мс (было {base['p99_ms']})"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк обработки обновлений")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Количество сохраненных файлов через запятую")
+    parser.add_argument('--flows', default=','.join(FLOWS), help="Сценарии через запятую")
+    parser.add_argument('--ops', type=int, default=200, help="Операций на сценарий")
+    parser.add_argument('--users', type=int, default=100, help="Пользователей, между которыми делятся файлы")
+    parser.add_argument('--concurrency', type=int, default=1, help="Одновременных операций (не больше --users)")
+    parser.add_argument('--output', help="Файл для отчета в JSON (по умолчанию - stdout)")
+    parser.add_argument('--baseline', help="Отчет прошлого прогона для сравнения")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Допустимое ухудшение относительно базового прогона (доля)")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Логи обработчиков на каждое обновление исказили бы замеры
+    logging.basicConfig(level=logging.WARNING)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    flows = [flow for flow in args.flows.split(',') if flow]
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+        for size in sizes:
+            results.extend(await run_size(size, flows, args.ops, args.users, args.concurrency, workdir))
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'aiogram': aiogram.__version__,
+            'platform': platform.platform(),
+            'ops': args.ops,
+            'users': args.users,
+            'concurrency': args.concurrency,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"Ухудшение: {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("Ухудшений относительно базового прогона нет", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,311 @@
+"""
+Локальный сервер, который подменяет api.telegram.org для нагрузочных тестов
+без сети. Отвечает на getMe, getUpdates, sendMessage, sendDocument/Photo/
+Video/Audio, answerCallbackQuery, getFile и скачивание файлов; на прочие
+методы - true. Задержку ответа и долю ответов 429 (с retry_after) можно
+настроить. Встроенный генератор выдает через getUpdates поток обновлений
+с заданной частотой: команды, загрузки файлов с ответами на вопросы,
+ссылки и нажатия кнопок.
+
+Запуск:
+    python -m benchmarks.fake_api --port 8081 --rate 50 --latency-ms 30 --rate-429 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_TOKEN=42:FAKE python -m src.bot.main
+
+Счетчики вызовов и состояние очереди обновлений - GET /stats.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.dataset import FIRST_USER_ID, WORDS, WeightedChoice
+from benchmarks.updates import callback_update, document_update, message_update
+
+logger = logging.getLogger(__name__)
+
+# Сценарии потока обновлений и их доля
+FLOWS = {
+    'start': 5,
+    'list': 25,
+    'search': 20,
+    'upload': 20,
+    'link': 10,
+    'show_files': 20,
+}
+# Методы отправки медиа и поле сообщения, в котором Telegram возвращает файл
+MEDIA_METHODS = {
+    'sendDocument': 'document',
+    'sendPhoto': 'photo',
+    'sendVideo': 'video',
+    'sendAudio': 'audio',
+}
+
+
+class FakeTelegramAPI:
+    """Состояние поддельного Bot API: очередь обновлений, счетчики вызовов и ответы методов"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, rate_429: float = 0.0,
+                 retry_after: int = 1, file_size: int = 65536, users: int = 100,
+                 step_delay: float = 0.5, max_backlog: int = 100000, seed: int = 1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.users = users
+        self.step_delay = step_delay
+        self.max_backlog = max_backlog
+        self.rng = random.Random(seed)
+        self.file_body = b'\0' * file_size
+        self.calls: Counter = Counter()
+        self.throttled: Counter = Counter()
+        self.generated = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.pending: deque = deque()
+        self._updates_ready = asyncio.Event()
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._choose_flow = WeightedChoice(list(FLOWS), list(FLOWS.values()))
+        self.methods = {
+            'getMe': self.get_me,
+            'getUpdates': self.get_updates,
+            'sendMessage': self.send_message,
+            'getFile': self.get_file,
+            **{name: self.send_media for name in MEDIA_METHODS},
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route('*', '/bot{token}/{method}', self.handle_method)
+        app.router.add_get('/file/bot{token}/{path:.+}', self.handle_file)
+        app.router.add_get('/stats', self.handle_stats)
+        return app
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        params = await self._read_params(request)
+        await self._delay()
+
+        if method != 'getUpdates' and self.rate_429 and self.rng.random() < self.rate_429:
+            self.throttled[method] += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            }, status=429)
+
+        handler = self.methods.get(method)
+        result = await handler(request.match_info['token'], method, params) if handler else True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        self.calls['file'] += 1
+        await self._delay()
+        return web.Response(body=self.file_body, content_type='application/octet-stream')
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict:
+        return {
+            'generated': self.generated,
+            'delivered': self.delivered,
+            'backlog': len(self.pending),
+            'dropped': self.dropped,
+            'calls': dict(self.calls),
+            'throttled': dict(self.throttled),
+        }
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> Dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        if request.method == 'POST':
+            return dict(await request.post())
+        return dict(request.query)
+
+    async def _delay(self):
+        if self.latency_ms or self.jitter_ms:
+            await asyncio.sleep(max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    # Ответы методов
+
+    async def get_me(self, token: str, method: str, params: Dict) -> Dict:
+        return {
+            'id': int(token.split(':', 1)[0]), 'is_bot': True, 'first_name': 'Fake Bot',
+            'username': 'fake_bot', 'can_join_groups': False, 'can_read_all_group_messages': False,
+            'supports_inline_queries': True,
+        }
+
+    async def get_updates(self, token: str, method: str, params: Dict) -> List[Dict]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        # Обновления до offset бот подтвердил - больше их не отдаем
+        while self.pending and self.pending[0]['update_id'] < offset:
+            self.pending.popleft()
+            self.delivered += 1
+        if not self.pending and timeout:
+            self._updates_ready.clear()
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self.pending, limit))
+
+    async def send_message(self, token: str, method: str, params: Dict) -> Dict:
+        return self._message(token, params, text=params.get('text'))
+
+    async def send_media(self, token: str, method: str, params: Dict) -> Dict:
+        field = MEDIA_METHODS[method]
+        value = params.get(field)
+        # Загруженный файл получает новый file_id, отправленный по file_id - возвращается как есть
+        file_id = value if isinstance(value, str) and not value.startswith('attach://') else f"fake_{next(self._file_ids)}"
+        media = {'file_id': file_id, 'file_unique_id': f"u{file_id}", 'file_size': len(self.file_body)}
+        if field == 'photo':
+            media = [{**media, 'width': 1280, 'height': 720}]
+        elif field == 'video':
+            media.update(width=1280, height=720, duration=10)
+        elif field == 'audio':
+            media['duration'] = 180
+        return self._message(token, params, caption=params.get('caption'), **{field: media})
+
+    async def get_file(self, token: str, method: str, params: Dict) -> Dict:
+        file_id = params.get('file_id', 'file')
+        return {
+            'file_id': file_id, 'file_unique_id': f"u{file_id}",
+            'file_size': len(self.file_body), 'file_path': f"documents/{file_id}",
+        }
+
+    def _message(self, token: str, params: Dict, **fields) -> Dict:
+        try:
+            chat_id = int(params.get('chat_id'))
+        except (TypeError, ValueError):
+            chat_id = 1
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': int(token.split(':', 1)[0]), 'is_bot': True, 'first_name': 'Fake Bot'},
+        }
+        message.update({key: value for key, value in fields.items() if value is not None})
+        return message
+
+    # Поток обновлений
+
+    def push(self, update: Dict):
+        """Поставить обновление в очередь getUpdates"""
+        if len(self.pending) >= self.max_backlog:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(update)
+        self.generated += 1
+        self._updates_ready.set()
+
+    def push_flow(self, flow: str, number: int):
+        """Обновления одного сценария; следующие шаги приходят через step_delay, как от человека"""
+        user_id = FIRST_USER_ID + self.rng.randrange(self.users)
+        if flow == 'start':
+            self.push(message_update(user_id, '/start'))
+        elif flow == 'list':
+            self.push(message_update(user_id, '/files'))
+        elif flow == 'search':
+            self.push(message_update(user_id, f"/search {self.rng.choice(WORDS)}"))
+        elif flow == 'link':
+            self.push(message_update(user_id, f"https://example.com/{self.rng.choice(WORDS)}/{number}"))
+        elif flow == 'show_files':
+            self.push(callback_update(user_id, 'show_files'))
+        elif flow == 'upload':
+            file_id = f"fake_upload_{number}"
+            self.push(document_update(user_id, file_id, f"{self.rng.choice(WORDS)}_{number}.pdf",
+                                      self.rng.randint(1024, 10 ** 7)))
+            loop = asyncio.get_running_loop()
+            loop.call_later(self.step_delay, lambda: self.push(callback_update(user_id, 'skip_description')))
+            loop.call_later(self.step_delay * 2, lambda: self.push(callback_update(user_id, 'skip_tags')))
+        else:
+            raise ValueError(f"Неизвестный сценарий: {flow}")
+
+    async def generate(self, rate: float, duration: Optional[float] = None):
+        """Запускать сценарии с частотой rate в секунду (расписание не накапливает отставание)"""
+        started = time.monotonic()
+        for number in itertools.count():
+            due = started + number / rate
+            if duration is not None and due - started >= duration:
+                break
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.push_flow(self._choose_flow(self.rng), number)
+
+
+async def report_progress(api: FakeTelegramAPI, interval: float):
+    previous = api.stats()
+    while True:
+        await asyncio.sleep(interval)
+        current = api.stats()
+        calls = sum(current['calls'].values()) - sum(previous['calls'].values())
+        print(
+            f"обновлений +{current['generated'] - previous['generated']}, "
+            f"обработано +{current['delivered'] - previous['delivered']}, в очереди {current['backlog']}, "
+            f"запросов {calls / interval:.1f}/с, 429 всего {sum(current['throttled'].values())}",
+            file=sys.stderr
+        )
+        previous = current
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Поддельный Telegram Bot API для нагрузочных тестов")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--rate', type=float, default=20, help="Сценариев в секунду (0 - без потока обновлений)")
+    parser.add_argument('--duration', type=float, help="Сколько секунд генерировать обновления")
+    parser.add_argument('--users', type=int, default=100, help="Пользователей (id с FIRST_USER_ID, как в benchmarks.dataset)")
+    parser.add_argument('--latency-ms', type=float, default=0, help="Задержка ответа (мс)")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Разброс задержки (мс)")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Доля ответов 429 Too Many Requests")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after в ответах 429 (сек)")
+    parser.add_argument('--file-size', type=int, default=65536, help="Размер скачиваемых файлов (байт)")
+    parser.add_argument('--step-delay', type=float, default=0.5, help="Пауза между шагами диалога загрузки (сек)")
+    parser.add_argument('--report-every', type=float, default=10, help="Интервал вывода статистики (сек)")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    api = FakeTelegramAPI(args.latency_ms, args.jitter_ms, args.rate_429, args.retry_after,
+                          args.file_size, args.users, args.step_delay, seed=args.seed)
+    runner = web.AppRunner(api.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Поддельный Bot API: http://{args.host}:{args.port}", file=sys.stderr)
+
+    tasks = [asyncio.create_task(report_progress(api, args.report_every))]
+    if args.rate > 0:
+        tasks.append(asyncio.create_task(api.generate(args.rate, args.duration)))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await runner.cleanup()
+        print(json.dumps(api.stats(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        pass
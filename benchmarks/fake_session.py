@@ -0,0 +1,54 @@
+import itertools
+import typing
+from collections import Counter
+from datetime import datetime
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import Chat, File, Message, User
+
+# Пользователь, от имени которого "работает" бот в бенчмарках
+BOT_USER = User(id=42, is_bot=True, first_name='Benchmark Bot', username='benchmark_bot')
+
+
+class InstantSession(AiohttpSession):
+    """
+    Сессия Bot API, которая не ходит в сеть и сразу отвечает правдоподобным
+    результатом нужного типа. Вызовы считаются по методам, чтобы было видно,
+    сколько запросов к Telegram делает каждый сценарий.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[method.__api_method__] += 1
+        return self.fake_result(method)
+
+    def fake_result(self, method):
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        if returning is Message or Message in typing.get_args(returning):
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=getattr(method, 'chat_id', None) or 1, type='private'),
+                from_user=BOT_USER,
+                text=getattr(method, 'text', None)
+            )
+        if returning is User:
+            return BOT_USER
+        if returning is File:
+            file_id = getattr(method, 'file_id', 'file')
+            return File(file_id=file_id, file_unique_id=file_id, file_path=f"documents/{file_id}")
+        if typing.get_origin(returning) is list:
+            return []
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
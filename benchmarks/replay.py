@@ -0,0 +1,213 @@
+"""
+Воспроизведение записанных обновлений (src.monitoring.recorder.UpdateRecorder)
+через настоящие Dispatcher и router бота на копии снимка БД. Сессия Bot API
+отвечает мгновенно, поэтому задержки показывают только работу самого бота.
+
+Обновления подаются с исходными интервалами, ускоренными в --speed раз
+(--speed 0 - без пауз, по одному). Отчет - задержки p50/p90/p99 по видам
+обновлений в JSON.
+
+Запуск:
+    python -m benchmarks.replay logs/recordings/updates_20250101_120000.jsonl.gz \\
+        --db snapshot.db --secret "$RECORD_SECRET" --speed 10 --output replay.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from benchmarks.e2e import percentile
+from benchmarks.fake_session import InstantSession
+from benchmarks.updates import to_update
+from src.monitoring.recorder import pseudonym
+
+# Колонки с id пользователей и чатов, которые заменяются псевдонимами в копии снимка
+ID_COLUMNS = {
+    'files': ('user_id', 'chat_id'),
+    'share_links': ('user_id',),
+    'user_links': ('user_id',),
+    'link_category_overrides': ('user_id',),
+    'user_quotas': ('user_id',),
+}
+
+
+def read_recording(path: str, limit: Optional[int] = None) -> Iterator[Tuple[float, dict]]:
+    """Пары (секунд от начала записи, обновление) из файла записи"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for number, line in enumerate(f):
+            if limit is not None and number >= limit:
+                break
+            if line.strip():
+                item = json.loads(line)
+                yield item['t'], item['update']
+
+
+def update_kind(update: dict) -> str:
+    """Вид обновления для отчета: команда, тип сообщения или префикс данных кнопки"""
+    if 'callback_query' in update:
+        data = update['callback_query'].get('data', '')
+        return f"callback:{data.split(':', 1)[0].split('_page')[0]}"
+    if 'inline_query' in update:
+        return 'inline_query'
+    message = update.get('message') or update.get('edited_message')
+    if message is None:
+        return next((key for key in update if key != 'update_id'), 'unknown')
+    text = message.get('text', '')
+    if text.startswith('/'):
+        return f"command:{text.split()[0].split('@')[0]}"
+    for kind in ('document', 'photo', 'video', 'audio', 'voice', 'video_note', 'animation'):
+        if kind in message:
+            return kind
+    return 'text' if text else 'message'
+
+
+def prepare_snapshot(snapshot: str, workdir: str, secret: Optional[str]) -> str:
+    """
+    Копия снимка БД для прогона (исходный файл не меняется). С секретом записи
+    id в копии заменяются теми же псевдонимами, что и в записанных обновлениях.
+    """
+    db_path = os.path.join(workdir, 'replay.db')
+    with sqlite3.connect(snapshot) as source, sqlite3.connect(db_path) as target:
+        source.backup(target)
+
+    if secret:
+        with sqlite3.connect(db_path) as conn:
+            conn.create_function('pseudonym', 1, lambda value: (
+                pseudonym(value, secret.encode()) if isinstance(value, int) else value
+            ), deterministic=True)
+            for table, columns in ID_COLUMNS.items():
+                assignments = ', '.join(f"{column} = pseudonym({column})" for column in columns)
+                conn.execute(f"UPDATE {table} SET {assignments}")
+            conn.commit()
+    return db_path
+
+
+def summarize(latencies: List[float]) -> Dict:
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p90_ms': round(percentile(latencies, 0.9) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies, default=0.0) * 1000, 3),
+    }
+
+
+async def replay(dp: Dispatcher, bot: Bot, updates: List[Tuple[float, dict]], speed: float) -> Dict:
+    """
+    Подать обновления в диспетчер и собрать задержки по видам.
+
+    При speed > 0 обновления обрабатываются параллельно, как при polling с
+    handle_as_tasks; lag - насколько позже расписания началась обработка.
+    """
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    lags: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+
+    async def feed(payload: dict):
+        kind = update_kind(payload)
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, to_update(bot, payload))
+        except Exception as e:
+            errors[f"{kind}: {type(e).__name__}"] += 1
+        latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    if speed > 0:
+        tasks = []
+        origin = updates[0][0] if updates else 0.0
+        for offset, payload in updates:
+            due = started + (offset - origin) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, time.perf_counter() - due))
+            tasks.append(asyncio.create_task(feed(payload)))
+        await asyncio.gather(*tasks)
+    else:
+        for _, payload in updates:
+            await feed(payload)
+    elapsed = time.perf_counter() - started
+
+    total = [value for values in latencies.values() for value in values]
+    return {
+        'seconds': round(elapsed, 4),
+        'updates_per_sec': round(len(total) / elapsed, 2) if elapsed else 0.0,
+        'total': summarize(total),
+        'schedule_lag_p99_ms': round(percentile(lags, 0.99) * 1000, 3),
+        'kinds': {kind: summarize(values) for kind, values in sorted(latencies.items())},
+        'errors': dict(errors),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений")
+    parser.add_argument('recording', help="Файл записи (.jsonl.gz)")
+    parser.add_argument('--db', required=True, help="Снимок БД бота (копируется, исходный файл не меняется)")
+    parser.add_argument('--secret', help="RECORD_SECRET записи - обезличить id в копии снимка")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Ускорение относительно записи (1 - как было, 0 - без пауз)")
+    parser.add_argument('--limit', type=int, help="Воспроизвести только первые N обновлений")
+    parser.add_argument('--output', help="Файл для отчета в JSON (по умолчанию - stdout)")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Логи обработчиков на каждое обновление исказили бы замеры
+    logging.basicConfig(level=logging.WARNING)
+
+    import src.handlers.handlers as handlers
+    from src.database.database import Database
+
+    updates = list(read_recording(args.recording, args.limit))
+    if not updates:
+        print("В записи нет обновлений", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory(prefix='replay_') as workdir:
+        handlers.db = Database(prepare_snapshot(args.db, workdir, args.secret))
+        bot = Bot('42:REPLAY', session=InstantSession())
+        dp = Dispatcher(storage=MemoryStorage())
+        dp.include_router(handlers.router)
+        result = await replay(dp, bot, updates, args.speed)
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'recording': args.recording,
+            'snapshot': args.db,
+            'speed': args.speed,
+            'recorded_seconds': round(updates[-1][0] - updates[0][0], 3),
+        },
+        **result,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    print(
+        f"{result['total']['count']} обновлений за {result['seconds']:.1f} сек: "
+        f"p50 {result['total']['p50_ms']:.2f} мс  p99 {result['total']['p99_ms']:.2f} мс, "
+        f"ошибок {sum(result['errors'].values())}",
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,69 @@
+import itertools
+import time
+
+from aiogram.types import Update
+
+# Сквозная нумерация обновлений и сообщений, как у настоящего Telegram
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}', 'language_code': 'ru'}
+
+
+def _chat(user_id: int) -> dict:
+    return {'id': user_id, 'type': 'private', 'first_name': f'User {user_id}'}
+
+
+def to_update(bot, payload: dict) -> Update:
+    """Объект Update, привязанный к боту (иначе message.answer() не знает, через кого отвечать)"""
+    return Update.model_validate(payload, context={'bot': bot})
+
+
+def message_update(user_id: int, text: str = None, **fields) -> dict:
+    """Обновление с сообщением пользователя в личном чате"""
+    message = {
+        'message_id': next(_message_ids),
+        'date': int(time.time()),
+        'chat': _chat(user_id),
+        'from': _user(user_id),
+        **fields,
+    }
+    if text is not None:
+        message['text'] = text
+        if text.startswith('/'):
+            command = text.split(maxsplit=1)[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': next(_update_ids), 'message': message}
+
+
+def document_update(user_id: int, file_id: str, file_name: str, file_size: int) -> dict:
+    """Обновление с документом, который пользователь прислал на хранение"""
+    return message_update(user_id, document={
+        'file_id': file_id,
+        'file_unique_id': f"u{file_id}",
+        'file_name': file_name,
+        'file_size': file_size,
+        'mime_type': 'application/pdf',
+    })
+
+
+def callback_update(user_id: int, data: str) -> dict:
+    """Нажатие инлайн-кнопки под сообщением бота"""
+    update_id = next(_update_ids)
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': next(_message_ids),
+                'date': int(time.time()),
+                'chat': _chat(user_id),
+                'text': '...',
+            },
+        },
+    }
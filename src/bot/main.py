@@ -5,9 +5,19 @@ from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 from src.config.config import Config
-from src.handlers.handlers import router, init_database
+from src.database.errors import DatabaseError
+from src.middlewares.throttling import ThrottlingMiddleware
+from src.middlewares.update_watermark import UpdateWatermark
+from src.middlewares.user_scheduler import UserScheduler
+from src.monitoring.metrics import instrument_bot, start_metrics_server
+from src.monitoring.tracing import TracingMiddleware, TracingRequestMiddleware
+from src.monitoring.loop_lag import LoopLagMonitor
+from src.monitoring.recorder import UpdateRecorder
+from src.handlers.handlers import router, init_database, start_background_services, close_background_services, joins_url_batch, url_batch_tasks
 
 # Создаем директории для логов и данных, если их нет
 os.makedirs('logs', exist_ok=True)
@@ -25,13 +35,41 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+async def drain_updates(dp: Dispatcher, timeout: float):
+    """
+    Дождаться обработчиков, которые уже работают (новые обновления к этому
+    моменту не запрашиваются), и отложенных ими подтверждений пачек ссылок;
+    через timeout секунд оставшиеся отменяются.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    await wait_or_cancel(set(dp._handle_update_tasks), timeout, "обновлений")
+    # Обработчики, закончившиеся только что, тоже могли отложить подтверждение
+    await wait_or_cancel(set(url_batch_tasks), max(0.0, deadline - loop.time()), "пачек ссылок")
+
+async def wait_or_cancel(tasks: set, timeout: float, what: str):
+    """Дождаться задач не дольше timeout секунд, оставшиеся отменить"""
+    if not tasks:
+        return
+    logger.info(f"⏳ Ждем завершения {len(tasks)} {what} (не дольше {timeout:.0f} сек)")
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        logger.warning(f"⚠️ Не дождались {len(pending)} {what} - отменяем")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
 async def main():
     """Главная функция запуска бота"""
     # Initialize database first
-    init_database()
+    db = init_database()
     
     # Инициализируем бота и диспетчер
-    bot = Bot(token=Config.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    session = None
+    if Config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(Config.TELEGRAM_API_URL))
+        logger.info(f"🔌 Bot API: {Config.TELEGRAM_API_URL}")
+    bot = Bot(token=Config.BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
     
     # Временно используем MemoryStorage для отладки
     from aiogram.fsm.storage.memory import MemoryStorage
@@ -49,17 +87,71 @@ async def main():
         logger.warning("⚠️ Не удалось получить информацию о боте")
         logger.warning("🔧 Бот будет использовать 'your_bot_username' в ссылках")
     
+    # Трассировка обновлений - первым middleware, чтобы в нее попадало все остальное
+    tracing = None
+    if Config.TRACING_ENABLED:
+        tracing = TracingMiddleware(Config.TRACE_SLOW_MS, Config.TRACE_BUFFER_SIZE, Config.TRACE_EXPORT_PATH)
+        dp.update.outer_middleware(tracing)
+        bot.session.middleware(TracingRequestMiddleware())
+    
+    # Пропуск обновлений, которые уже были обработаны до перезапуска
+    watermark = UpdateWatermark(db)
+    await watermark.load()
+    dp.update.outer_middleware(watermark)
+    
+    # Запись обновлений для воспроизведения нагрузки в бенчмарках
+    recorder = None
+    if Config.RECORD_UPDATES_ENABLED:
+        recorder = UpdateRecorder(Config.RECORD_UPDATES_DIR, Config.RECORD_SECRET)
+        dp.update.outer_middleware(recorder)
+    
+    # Обновления одного пользователя - по очереди (иначе они гоняются за данные FSM),
+    # разных пользователей - параллельно; подключается последним на dp.update
+    dp.update.outer_middleware(UserScheduler(Config.UPDATES_CONCURRENCY, Config.UPDATES_MAX_PER_USER))
+    
+    # Ограничиваем частоту запросов до обработчиков и обращений к БД
+    throttling = None
+    if Config.THROTTLE_ENABLED:
+        throttling = ThrottlingMiddleware.from_config(exempt=joins_url_batch)
+        dp.message.outer_middleware(throttling)
+        dp.callback_query.outer_middleware(throttling)
+        dp.inline_query.outer_middleware(throttling)
+    
     # Регистрируем роутеры
     dp.include_router(router)
     
+    # Метрики для Prometheus: обработчики, БД и запросы к Bot API
+    metrics_runner = None
+    if Config.METRICS_ENABLED:
+        instrument_bot(dp, bot, router)
+        metrics_runner = await start_metrics_server(
+            Config.METRICS_HOST, Config.METRICS_PORT, tracing.slow_updates if tracing else None
+        )
+    
     logger.info("🤖 FileStorage Bot запускается...")
     
+    # Запускаем фоновые сервисы (проверка ссылок)
+    start_background_services()
+    
+    # Следим за блокировками событийного цикла
+    loop_lag_monitor = None
+    if Config.LOOP_LAG_ENABLED:
+        loop_lag_monitor = LoopLagMonitor(Config.LOOP_LAG_INTERVAL, Config.LOOP_LAG_THRESHOLD_MS / 1000)
+        loop_lag_monitor.start()
+    
+    # При остановке (SIGTERM/SIGINT) aiogram прекращает получать обновления и вызывает
+    # shutdown до закрытия сессии - обработчики еще могут ответить пользователям
+    async def on_shutdown():
+        await drain_updates(dp, Config.SHUTDOWN_TIMEOUT)
+    dp.shutdown.register(on_shutdown)
+    
     try:
-        # Запускаем бота с настройками для избежания конфликтов
+        # Накопившиеся за время перезапуска обновления не сбрасываются, а разбираются
+        # обычным путем; одновременно работают не больше UPDATES_CONCURRENCY обработчиков
         await dp.start_polling(
             bot,
-            allowed_updates=["message", "callback_query"],
-            drop_pending_updates=True
+            allowed_updates=["message", "callback_query", "inline_query"],
+            tasks_concurrency_limit=Config.UPDATES_MAX_PENDING
         )
         logger.info("🛑 Бот запущен")
     except KeyboardInterrupt:
@@ -67,7 +159,23 @@ async def main():
     except Exception as e:
         logger.error(f"❌ Ошибка при запуске бота: {e}")
     finally:
+        # Сначала сохраняем все, что еще не записано, потом обслуживаем БД и закрываем соединения
+        await watermark.close()
+        await close_background_services(Config.SHUTDOWN_TIMEOUT)
+        if recorder is not None:
+            recorder.close()
+        try:
+            await db.optimize()
+        except DatabaseError as e:
+            logger.error(f"❌ Не удалось обслужить БД перед остановкой: {e}")
+        if loop_lag_monitor is not None:
+            await loop_lag_monitor.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if throttling is not None:
+            await throttling.close()
         await bot.session.close()
+        logger.info("🛑 Бот остановлен")
 
 if __name__ == "__main__":
     # Проверяем токен бота
@@ -4,20 +4,131 @@ from dotenv import load_dotenv
 # Загружаем переменные окружения
 load_dotenv()
 
+def parse_quota_tiers(value: str) -> dict:
+    """
+    Разбор тарифов квот из строки вида "free:1024:1000,premium:10240:10000"
+    (имя:лимит в MB:лимит файлов, 0 - без ограничения)
+    """
+    tiers = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, max_mb, max_files = (part.strip() for part in item.split(':'))
+        tiers[name] = {
+            'max_bytes': int(float(max_mb) * 1024 * 1024),
+            'max_files': int(max_files)
+        }
+    return tiers
+
 class Config:
     # Telegram Bot Token
     BOT_TOKEN = os.getenv('BOT_TOKEN', 'your_bot_token_here')
     
+    # Адрес сервера Bot API (пусто - api.telegram.org); например, локальный
+    # benchmarks.fake_api для нагрузочных тестов без сети
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '').rstrip('/')
+    
+    # Администраторы бота (id через запятую) - им доступны команды диагностики
+    ADMIN_IDS = {int(user_id) for user_id in os.getenv('ADMIN_IDS', '').split(',') if user_id.strip()}
+    
     # Максимальный размер файла в байтах (50MB по умолчанию)
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 52428800))
     
+    # Квоты хранилища: тарифы и тариф по умолчанию (индивидуальные лимиты - в таблице user_quotas)
+    QUOTA_TIERS = parse_quota_tiers(os.getenv('QUOTA_TIERS', 'free:1024:1000,premium:10240:10000,unlimited:0:0'))
+    QUOTA_DEFAULT_TIER = os.getenv('QUOTA_DEFAULT_TIER', 'free')
+    
     # Redis настройки
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
     REDIS_PREFIX = os.getenv('REDIS_PREFIX', 'filestorage_bot')
     
+    # Ограничение частоты запросов: токенов в секунду и емкость корзины для всех событий
+    # и отдельно для тяжелых действий (экспорт, поиск, ссылки на файлы); хранилище memory или redis
+    THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'true').lower() == 'true'
+    THROTTLE_BACKEND = os.getenv('THROTTLE_BACKEND', 'memory')
+    THROTTLE_RATE = float(os.getenv('THROTTLE_RATE', 2))
+    THROTTLE_BURST = int(os.getenv('THROTTLE_BURST', 10))
+    THROTTLE_HEAVY_RATE = float(os.getenv('THROTTLE_HEAVY_RATE', 0.2))
+    THROTTLE_HEAVY_BURST = int(os.getenv('THROTTLE_HEAVY_BURST', 3))
+    # Инлайн-запросы приходят на каждое нажатие клавиши - у них своя, более щедрая корзина
+    THROTTLE_INLINE_RATE = float(os.getenv('THROTTLE_INLINE_RATE', 5))
+    THROTTLE_INLINE_BURST = int(os.getenv('THROTTLE_INLINE_BURST', 30))
+    # Через сколько секунд после ошибки Redis снова пробовать его вместо лимитов в памяти процесса
+    THROTTLE_REDIS_RETRY = float(os.getenv('THROTTLE_REDIS_RETRY', 30))
+    
     # Логирование
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     
+    # Инлайн-режим: сколько секунд Telegram кэширует ответ и пауза перед поиском (мс),
+    # за которую успевают прийти следующие нажатия клавиш
+    INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', 30))
+    INLINE_DEBOUNCE_MS = int(os.getenv('INLINE_DEBOUNCE_MS', 300))
+    
+    # Получение названий страниц для сохраненных ссылок: таймаут (сек), сколько байт
+    # читать из ответа, общий лимит соединений и лимит на один хост, размер кэша в памяти,
+    # через сколько секунд повторить запрос страницы, название которой получить не удалось
+    TITLE_FETCH_ENABLED = os.getenv('TITLE_FETCH_ENABLED', 'true').lower() == 'true'
+    TITLE_FETCH_TIMEOUT = float(os.getenv('TITLE_FETCH_TIMEOUT', 5))
+    TITLE_FETCH_MAX_BYTES = int(os.getenv('TITLE_FETCH_MAX_BYTES', 16384))
+    TITLE_FETCH_CONCURRENCY = int(os.getenv('TITLE_FETCH_CONCURRENCY', 10))
+    TITLE_FETCH_PER_HOST = int(os.getenv('TITLE_FETCH_PER_HOST', 2))
+    TITLE_CACHE_SIZE = int(os.getenv('TITLE_CACHE_SIZE', 5000))
+    TITLE_FETCH_RETRY_AFTER = int(os.getenv('TITLE_FETCH_RETRY_AFTER', 3600))
+    
+    # Фоновая проверка доступности ссылок: размер пачки, параллельных запросов,
+    # минимальный интервал между запросами к одному хосту (сек), как часто перепроверять
+    # ссылку (сек) и после скольких неудачных проверок подряд она считается нерабочей
+    LINK_CHECK_ENABLED = os.getenv('LINK_CHECK_ENABLED', 'true').lower() == 'true'
+    LINK_CHECK_BATCH_SIZE = int(os.getenv('LINK_CHECK_BATCH_SIZE', 200))
+    LINK_CHECK_CONCURRENCY = int(os.getenv('LINK_CHECK_CONCURRENCY', 20))
+    LINK_CHECK_HOST_INTERVAL = float(os.getenv('LINK_CHECK_HOST_INTERVAL', 1.0))
+    LINK_CHECK_TIMEOUT = float(os.getenv('LINK_CHECK_TIMEOUT', 10))
+    LINK_CHECK_RECHECK_AFTER = int(os.getenv('LINK_CHECK_RECHECK_AFTER', 86400))
+    LINK_CHECK_IDLE_SLEEP = int(os.getenv('LINK_CHECK_IDLE_SLEEP', 600))
+    LINK_CHECK_DEAD_AFTER = int(os.getenv('LINK_CHECK_DEAD_AFTER', 2))
+    
+    # Метрики в формате Prometheus: HTTP-сервер на локальном интерфейсе (GET /metrics)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+    
+    # Трассировка обновлений: порог медленного обновления (мс), сколько самых медленных
+    # хранить в памяти и файл JSON Lines для медленных обновлений (пусто - не писать)
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+    TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 1000))
+    TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', 50))
+    TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', 'logs/slow_updates.jsonl')
+    
+    # Сколько обновлений обрабатывать одновременно (обновления одного пользователя - всегда
+    # по очереди) и сколько полученных обновлений может ждать обработки: дальше новые
+    # не запрашиваются, пока очередь не разберется (в том числе после перезапуска).
+    # Обновления пользователя сверх UPDATES_MAX_PER_USER ждущих отбрасываются, чтобы один
+    # пользователь не занял весь UPDATES_MAX_PENDING (пересланная пачка - до 100 сообщений)
+    UPDATES_CONCURRENCY = int(os.getenv('UPDATES_CONCURRENCY', 32))
+    UPDATES_MAX_PENDING = int(os.getenv('UPDATES_MAX_PENDING', 1000))
+    UPDATES_MAX_PER_USER = int(os.getenv('UPDATES_MAX_PER_USER', 100))
+    
+    # Сколько секунд при остановке ждать обработчиков и очередей записи
+    SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 20))
+    
+    # Запись входящих обновлений для воспроизведения (benchmarks.replay): каталог для
+    # файлов записи и секрет для псевдонимов id (пусто - случайный на каждый запуск)
+    RECORD_UPDATES_ENABLED = os.getenv('RECORD_UPDATES_ENABLED', 'false').lower() == 'true'
+    RECORD_UPDATES_DIR = os.getenv('RECORD_UPDATES_DIR', 'logs/recordings')
+    RECORD_SECRET = os.getenv('RECORD_SECRET', '')
+    
+    # Профилирование по команде администратора: длительность по умолчанию и максимальная (сек),
+    # интервал между снимками стека (сек)
+    PROFILE_DEFAULT_SECONDS = int(os.getenv('PROFILE_DEFAULT_SECONDS', 30))
+    PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', 300))
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+    
+    # Сторожевой таймер событийного цикла: как часто замерять задержку (сек)
+    # и после какой задержки (мс) снимать стек главного потока
+    LOOP_LAG_ENABLED = os.getenv('LOOP_LAG_ENABLED', 'true').lower() == 'true'
+    LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', 0.1))
+    LOOP_LAG_THRESHOLD_MS = float(os.getenv('LOOP_LAG_THRESHOLD_MS', 200))
+    
     # Информация о боте (будет установлена при запуске)
     BOT_USERNAME = None
     
@@ -3,12 +3,44 @@ import asyncio
 from datetime import datetime
 from pathlib import Path
 import logging
+from collections import OrderedDict
+
+from src.database.errors import raise_for_db_error
+from src.database.retry import retry_on_busy
+from src.monitoring.metrics import instrument_db_methods
+from src.utils.fuzzy import TrigramIndex
+from src.utils.urls import url_hash
 
 logger = logging.getLogger(__name__)
 
+@instrument_db_methods
+@retry_on_busy
 class Database:
+    # Сколько пользовательских триграммных индексов держать в памяти одновременно
+    FUZZY_INDEX_MAX_USERS = 1000
+    # Для скольких пользователей держать в памяти правила категорий ссылок
+    CATEGORY_OVERRIDES_MAX_USERS = 5000
+    # Для скольких пользователей держать в памяти счетчики занятого места и настройки квот
+    USAGE_CACHE_MAX_USERS = 10000
+    # Сколько ждать снятия блокировки внутри SQLite (сек): это ожидание блокирует событийный цикл,
+    # поэтому оно короткое, а дальше метод повторяется с паузами через asyncio.sleep
+    BUSY_TIMEOUT = 0.1
+    # Общее время на повторы метода при блокировке БД (сек) и границы паузы между повторами
+    BUSY_RETRY_BUDGET = 3.0
+    BUSY_RETRY_BASE_DELAY = 0.02
+    BUSY_RETRY_MAX_DELAY = 0.5
+    # Режим журнала, который init_database один раз устанавливает в файле БД. WAL: чтения
+    # не ждут записи, а запись не ждет чтений (режим сохраняется в файле, соединения его не меняют)
+    JOURNAL_MODE = 'WAL'
+
     def __init__(self, db_path: str = "data/files.db"):
         self.db_path = db_path
+        self._files_fuzzy = OrderedDict()
+        self._links_fuzzy = OrderedDict()
+        self._library_versions = {}
+        self._category_overrides = OrderedDict()
+        self._usage = OrderedDict()
+        self._quota_settings = OrderedDict()
         self._ensure_database_directory()
         self._migrate_old_database()
         self.init_database()
@@ -18,6 +50,10 @@ class Database:
         db_dir = Path(self.db_path).parent
         db_dir.mkdir(parents=True, exist_ok=True)
 
+    def _connect(self) -> sqlite3.Connection:
+        """Новое соединение с БД (все методы открывают соединения только через него)"""
+        return sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT)
+
     def _migrate_old_database(self):
         """Перенести базу данных из устаревшей папки logs при наличии"""
         old_path = Path("logs/files.db")
@@ -34,8 +70,9 @@ class Database:
     
     def init_database(self):
         """Инициализация базы данных"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.execute(f'PRAGMA journal_mode={self.JOURNAL_MODE}')
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS files (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -82,29 +119,184 @@ class Database:
                     is_active BOOLEAN DEFAULT 1
                 )
             ''')
+            
+            # Индекс для проверки дубликатов ссылок пользователя
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_user_links_user_url ON user_links (user_id, url)
+            ''')
+            
+            # Кэш названий страниц по каноническому URL
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS link_titles (
+                    url TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    fetched_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Категории, которые пользователь сам выбрал для доменов своих ссылок
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS link_category_overrides (
+                    user_id INTEGER NOT NULL,
+                    domain TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    PRIMARY KEY (user_id, domain)
+                )
+            ''')
+            
+            # Индивидуальные квоты пользователей (тариф и лимиты поверх лимитов тарифа)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_quotas (
+                    user_id INTEGER PRIMARY KEY,
+                    tier TEXT,
+                    max_bytes INTEGER,
+                    max_files INTEGER
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_files_user_id ON files (user_id)
+            ''')
+            # Одно сообщение пользователя - один файл: повторно доставленное обновление не создаст копию
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_files_chat_message ON files (chat_id, message_id)
+                WHERE chat_id IS NOT NULL AND message_id IS NOT NULL
+            ''')
+            
+            # Состояние фоновых сервисов (например, позиция проверки ссылок)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS service_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            
+            self._add_missing_columns(cursor, 'files', {
+                'media_kind': 'TEXT'
+            })
+            self._backfill_media_kinds(cursor)
+
+            self._add_missing_columns(cursor, 'user_links', {
+                'check_status': 'INTEGER',
+                'check_latency_ms': 'INTEGER',
+                'check_failures': 'INTEGER DEFAULT 0',
+                'last_checked': 'TIMESTAMP',
+                'url_hash': 'TEXT'
+            })
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_user_links_user_failures ON user_links (user_id, check_failures)
+            ''')
+            self._backfill_url_hashes(cursor)
+            
+            # Одна активная ссылка на страницу у каждого пользователя: проверка дубликата - один поиск по индексу
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_user_links_user_hash 
+                ON user_links (user_id, url_hash) WHERE is_active = 1
+            ''')
             conn.commit()
     
+    @staticmethod
+    def _backfill_media_kinds(cursor):
+        """
+        Заполнить media_kind для старых файлов. Медиа без своего имени бот называл
+        photo_*.jpg, video_*.mp4, audio_*.mp3 и voice_*.ogg. Видео и аудио с
+        собственным именем могли прийти и документом, и медиа - для них вид
+        неизвестен ('unknown'), и в инлайн-режим они не попадают: Telegram
+        отклоняет весь ответ из-за одного неверного результата. Остальное - документы.
+        """
+        cursor.execute('SELECT COUNT(*) FROM files WHERE media_kind IS NULL')
+        if not cursor.fetchone()[0]:
+            return
+
+        for media_kind, pattern in (('photo', 'photo_[0-9]*.jpg'), ('video', 'video_[0-9]*.mp4'),
+                                    ('audio', 'audio_[0-9]*.mp3'), ('voice', 'voice_[0-9]*.ogg')):
+            cursor.execute('''
+                UPDATE files SET media_kind = ? WHERE media_kind IS NULL AND file_name GLOB ?
+            ''', (media_kind, pattern))
+        cursor.execute('''
+            UPDATE files SET media_kind = 'unknown' WHERE media_kind IS NULL AND category IN ('videos', 'audio')
+        ''')
+        cursor.execute("UPDATE files SET media_kind = 'document' WHERE media_kind IS NULL")
+        logger.info("Заполнен тип медиа для старых файлов")
+
+    def _backfill_url_hashes(self, cursor):
+        """Заполнить url_hash для старых ссылок и убрать накопившиеся дубликаты"""
+        cursor.execute('SELECT id, url FROM user_links WHERE url_hash IS NULL')
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        
+        cursor.executemany('UPDATE user_links SET url_hash = ? WHERE id = ?',
+                           [(url_hash(url), link_id) for link_id, url in rows])
+        
+        # Из активных дубликатов оставляем самую раннюю ссылку
+        cursor.execute('''
+            UPDATE user_links SET is_active = 0 
+            WHERE is_active = 1 AND id NOT IN (
+                SELECT MIN(id) FROM user_links WHERE is_active = 1 GROUP BY user_id, url_hash
+            )
+        ''')
+        logger.info(f"Заполнен url_hash для {len(rows)} ссылок, скрыто дубликатов: {cursor.rowcount}")
+    
+    @staticmethod
+    def _add_missing_columns(cursor, table: str, columns: dict):
+        """Добавить в существующую таблицу колонки, появившиеся в новых версиях"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                logger.info(f"Добавлена колонка {table}.{name}")
+    
+    def get_library_version(self, user_id: int) -> int:
+        """Текущая версия библиотеки пользователя (меняется при любом добавлении или удалении)"""
+        return self._library_versions.get(user_id, 0)
+
+    def _bump_library_version(self, user_id: int):
+        """Отметить изменение библиотеки пользователя"""
+        self._library_versions[user_id] = self._library_versions.get(user_id, 0) + 1
+
     async def add_file(self, file_id: str, file_name: str, file_size: int, 
                        file_type: str, category: str, user_id: int, description: str = None, tags: str = None,
-                       message_id: int = None, chat_id: int = None):
-        """Добавить файл в базу данных"""
+                       message_id: int = None, chat_id: int = None, media_kind: str = None):
+        """
+        Добавить файл в базу данных.
+
+        media_kind - вид медиа в Telegram (photo, video, audio, voice, document):
+        file_id можно отправить только тем же видом, каким файл был получен.
+
+        Повторное сохранение того же сообщения (chat_id, message_id) ничего не
+        меняет и возвращает id уже сохраненной записи.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT INTO files (file_id, file_name, file_size, file_type, category, user_id, description, tags, message_id, chat_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (file_id, file_name, file_size, file_type, category, user_id, description, tags, message_id, chat_id))
+                    INSERT INTO files (file_id, file_name, file_size, file_type, category, user_id, description, tags, message_id, chat_id, media_kind)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (chat_id, message_id) WHERE chat_id IS NOT NULL AND message_id IS NOT NULL DO NOTHING
+                ''', (file_id, file_name, file_size, file_type, category, user_id, description, tags, message_id, chat_id,
+                      media_kind or 'document'))
+                if cursor.rowcount == 0:
+                    cursor.execute('''
+                        SELECT id FROM files WHERE chat_id = ? AND message_id = ?
+                    ''', (chat_id, message_id))
+                    return cursor.fetchone()[0]
                 conn.commit()
+                index = self._files_fuzzy.get(user_id)
+                if index is not None:
+                    index.add(cursor.lastrowid, file_name, tags)
+                self._bump_library_version(user_id)
+                self._adjust_usage(user_id, 1, file_size)
                 return cursor.lastrowid  # Возвращаем ID записи
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при добавлении файла: {e}")
             return "error"  # Возвращаем код ошибки
     
     async def get_user_files(self, user_id: int):
         """Получить все файлы пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, file_id, file_name, file_size, file_type, category, user_id, upload_date, description, tags, message_id, chat_id 
@@ -112,13 +304,14 @@ class Database:
                 ''', (user_id,))
                 return cursor.fetchall()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении файлов пользователя: {e}")
             return []
     
     async def get_user_files_by_category(self, user_id: int, category: str):
         """Получить файлы пользователя по категории"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, file_id, file_name, file_size, file_type, category, user_id, upload_date, description, tags, message_id, chat_id 
@@ -126,13 +319,14 @@ class Database:
                 ''', (user_id, category))
                 return cursor.fetchall()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении файлов по категории: {e}")
             return []
     
     async def get_user_categories(self, user_id: int):
         """Получить категории пользователя с количеством файлов"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT category, COUNT(*) as count, SUM(file_size) as total_size
@@ -140,13 +334,14 @@ class Database:
                 ''', (user_id,))
                 return cursor.fetchall()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении категорий пользователя: {e}")
             return []
     
     async def get_file_by_id(self, file_id: str):
         """Получить файл по file_id"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, file_id, file_name, file_size, file_type, category, user_id, upload_date, description, tags, message_id, chat_id 
@@ -154,13 +349,14 @@ class Database:
                 ''', (file_id,))
                 return cursor.fetchone()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении файла: {e}")
             return None
     
     async def check_file_exists(self, file_id: str, user_id: int):
         """Проверить, существует ли файл у пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT file_name, file_size FROM files 
@@ -168,6 +364,7 @@ class Database:
                 ''', (file_id, user_id))
                 return cursor.fetchone()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при проверке существования файла: {e}")
             return None
     
@@ -178,7 +375,7 @@ class Database:
             if isinstance(record_id, str):
                 record_id = int(record_id)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, file_id, file_name, file_size, file_type, category, user_id, upload_date, description, tags, message_id, chat_id 
@@ -188,20 +385,32 @@ class Database:
                 logger.info(f"Поиск файла с record_id {record_id}: {result}")
                 return result
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении файла по ID записи: {e}")
             return None
     
     async def delete_file(self, file_id: str, user_id: int):
         """Удалить файл из базы данных"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, file_size FROM files WHERE file_id = ? AND user_id = ?
+                ''', (file_id, user_id))
+                rows = cursor.fetchall()
                 cursor.execute('''
                     DELETE FROM files WHERE file_id = ? AND user_id = ?
                 ''', (file_id, user_id))
                 conn.commit()
+                index = self._files_fuzzy.get(user_id)
+                if index is not None:
+                    for record_id, _ in rows:
+                        index.remove(record_id)
+                self._bump_library_version(user_id)
+                self._adjust_usage(user_id, -len(rows), -sum(size for _, size in rows))
                 return cursor.rowcount > 0
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при удалении файла: {e}")
             return False
     
@@ -212,21 +421,32 @@ class Database:
             if isinstance(record_id, str):
                 record_id = int(record_id)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT file_size FROM files WHERE id = ? AND user_id = ?
+                ''', (record_id, user_id))
+                row = cursor.fetchone()
                 cursor.execute('''
                     DELETE FROM files WHERE id = ? AND user_id = ?
                 ''', (record_id, user_id))
                 conn.commit()
+                index = self._files_fuzzy.get(user_id)
+                if index is not None:
+                    index.remove(record_id)
+                self._bump_library_version(user_id)
+                if row and cursor.rowcount > 0:
+                    self._adjust_usage(user_id, -1, -row[0])
                 return cursor.rowcount > 0
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при удалении файла по record_id: {e}")
             return False
     
     async def search_files(self, user_id: int, query: str):
         """Поиск файлов по названию, описанию, тегам или типу файла"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, file_id, file_name, file_size, file_type, category, user_id, upload_date, description, tags, message_id, chat_id 
@@ -241,13 +461,134 @@ class Database:
                 ''', (user_id, f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"))
                 return cursor.fetchall()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при поиске файлов: {e}")
             return []
+
+    async def search_file_ids(self, user_id: int, query: str):
+        """Поиск файлов, возвращает только ID записей в порядке выдачи"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id FROM files 
+                    WHERE user_id = ? AND (
+                        file_name LIKE ? OR 
+                        description LIKE ? OR 
+                        tags LIKE ? OR 
+                        file_type LIKE ?
+                    )
+                    ORDER BY upload_date DESC
+                ''', (user_id, f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"))
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при поиске файлов: {e}")
+            return []
+
+    def _get_fuzzy_index(self, indexes: OrderedDict, user_id: int, query: str) -> TrigramIndex:
+        """Получить триграммный индекс пользователя, построив его при первом обращении"""
+        index = indexes.get(user_id)
+        if index is not None:
+            indexes.move_to_end(user_id)
+            return index
+
+        index = TrigramIndex()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (user_id,))
+            index.add_many(cursor.fetchall())
+
+        indexes[user_id] = index
+        if len(indexes) > self.FUZZY_INDEX_MAX_USERS:
+            indexes.popitem(last=False)
+        return index
+
+    async def get_files_by_record_ids(self, user_id: int, record_ids: list):
+        """Получить файлы пользователя по списку ID записей с сохранением порядка"""
+        if not record_ids:
+            return []
+        try:
+            placeholders = ', '.join('?' for _ in record_ids)
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT id, file_id, file_name, file_size, file_type, category, user_id, upload_date, description, tags, message_id, chat_id 
+                    FROM files WHERE user_id = ? AND id IN ({placeholders})
+                ''', (user_id, *record_ids))
+                rows = {row[0]: row for row in cursor.fetchall()}
+                return [rows[record_id] for record_id in record_ids if record_id in rows]
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении файлов по списку ID: {e}")
+            return []
+
+    async def get_file_media_kinds(self, user_id: int, record_ids: list):
+        """Вид медиа в Telegram для файлов пользователя: {ID записи: media_kind}"""
+        if not record_ids:
+            return {}
+        try:
+            placeholders = ', '.join('?' for _ in record_ids)
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT id, media_kind FROM files WHERE user_id = ? AND id IN ({placeholders})
+                ''', (user_id, *record_ids))
+                return dict(cursor.fetchall())
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении вида медиа файлов: {e}")
+            return {}
+
+    async def fuzzy_search_file_ids(self, user_id: int, query: str, limit: int = 8):
+        """Нечеткий поиск файлов по названию и тегам, возвращает ID записей по убыванию сходства"""
+        try:
+            index = self._get_fuzzy_index(
+                self._files_fuzzy, user_id,
+                'SELECT id, file_name, tags FROM files WHERE user_id = ?'
+            )
+            return [doc_id for doc_id, _ in index.search(query, limit=limit)]
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при нечетком поиске файлов: {e}")
+            return []
+
+    async def prefix_search_file_ids(self, user_id: int, query: str, limit: int = 50):
+        """Поиск файлов по началу слов в названии и тегах, возвращает ID (новые первыми)"""
+        try:
+            index = self._get_fuzzy_index(
+                self._files_fuzzy, user_id,
+                'SELECT id, file_name, tags FROM files WHERE user_id = ?'
+            )
+            return index.prefix_search(query, limit=limit)
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при поиске файлов по префиксу: {e}")
+            return []
+
+    async def get_recent_file_ids(self, user_id: int, limit: int = 50):
+        """Получить ID последних загруженных файлов пользователя"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id FROM files WHERE user_id = ? ORDER BY upload_date DESC LIMIT ?
+                ''', (user_id, limit))
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении последних файлов: {e}")
+            return []
+
+    async def fuzzy_search_files(self, user_id: int, query: str, limit: int = 8):
+        """Нечеткий поиск файлов по названию и тегам (устойчив к опечаткам)"""
+        record_ids = await self.fuzzy_search_file_ids(user_id, query, limit)
+        return await self.get_files_by_record_ids(user_id, record_ids)
     
     async def get_file_stats(self, user_id: int):
         """Получить статистику файлов пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT COUNT(*), SUM(file_size) FROM files WHERE user_id = ?
@@ -258,9 +599,78 @@ class Database:
                     'total_size': result[1] or 0
                 }
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении статистики: {e}")
             return {'total_files': 0, 'total_size': 0}
     
+    async def get_storage_usage(self, user_id: int) -> dict:
+        """
+        Занятое пользователем место: {'files': ..., 'bytes': ...}.
+
+        Счетчики считаются запросом к БД только при первом обращении, дальше
+        они обновляются при добавлении и удалении файлов без запросов.
+        """
+        usage = self._usage.get(user_id)
+        if usage is not None:
+            self._usage.move_to_end(user_id)
+            return {'files': usage[0], 'bytes': usage[1]}
+
+        stats = await self.get_file_stats(user_id)
+        # Пока шел запрос, счетчик мог появиться - он уже актуален
+        usage = self._usage.get(user_id)
+        if usage is None:
+            usage = self._usage[user_id] = [stats['total_files'], stats['total_size']]
+            if len(self._usage) > self.USAGE_CACHE_MAX_USERS:
+                self._usage.popitem(last=False)
+        return {'files': usage[0], 'bytes': usage[1]}
+
+    def _adjust_usage(self, user_id: int, files: int, size: int):
+        """Изменить счетчики занятого места (если их еще нет в памяти, они посчитаются при обращении)"""
+        usage = self._usage.get(user_id)
+        if usage is not None:
+            usage[0] = max(0, usage[0] + files)
+            usage[1] = max(0, usage[1] + (size or 0))
+
+    async def get_user_quota_settings(self, user_id: int) -> dict:
+        """Индивидуальные настройки квоты: {'tier', 'max_bytes', 'max_files'} (None - не задано)"""
+        settings = self._quota_settings.get(user_id)
+        if settings is not None:
+            self._quota_settings.move_to_end(user_id)
+            return settings
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT tier, max_bytes, max_files FROM user_quotas WHERE user_id = ?
+                ''', (user_id,))
+                row = cursor.fetchone() or (None, None, None)
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении квоты пользователя: {e}")
+            return {'tier': None, 'max_bytes': None, 'max_files': None}
+        settings = {'tier': row[0], 'max_bytes': row[1], 'max_files': row[2]}
+        self._quota_settings[user_id] = settings
+        if len(self._quota_settings) > self.USAGE_CACHE_MAX_USERS:
+            self._quota_settings.popitem(last=False)
+        return settings
+
+    async def set_user_quota(self, user_id: int, tier: str = None, max_bytes: int = None, max_files: int = None):
+        """Назначить пользователю тариф и/или индивидуальные лимиты"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO user_quotas (user_id, tier, max_bytes, max_files)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, tier, max_bytes, max_files))
+                conn.commit()
+            self._quota_settings.pop(user_id, None)
+            return True
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при сохранении квоты пользователя: {e}")
+            return False
+
     async def add_share_link(self, share_id: str, file_id: str, user_id: int, record_id: int):
         """Добавить ссылку на файл"""
         try:
@@ -269,7 +679,7 @@ class Database:
             # Устанавливаем срок действия ссылки (24 часа)
             expires_date = datetime.now() + timedelta(hours=24)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO share_links (share_id, file_id, user_id, record_id, expires_date)
@@ -278,6 +688,7 @@ class Database:
                 conn.commit()
                 return True
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при добавлении ссылки: {e}")
             return False
     
@@ -288,7 +699,7 @@ class Database:
             
             logger.info(f"Ищем ссылку с share_id: {share_id}")
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT sl.share_id, sl.file_id, sl.user_id, sl.record_id, sl.created_date, sl.expires_date, sl.is_active,
@@ -319,13 +730,14 @@ class Database:
                     logger.warning(f"Ссылка {share_id} не найдена")
                 return None
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении ссылки: {e}")
             return None
     
     async def deactivate_share_link(self, share_id: str):
         """Деактивировать ссылку"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE share_links SET is_active = 0 WHERE share_id = ?
@@ -333,6 +745,7 @@ class Database:
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при деактивации ссылки: {e}")
             return False
     
@@ -341,7 +754,7 @@ class Database:
         try:
             from datetime import datetime
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE share_links SET is_active = 0 
@@ -350,6 +763,7 @@ class Database:
                 conn.commit()
                 return cursor.rowcount
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при очистке истекших ссылок: {e}")
             return 0
     
@@ -357,15 +771,16 @@ class Database:
     async def check_link_exists(self, user_id: int, url: str):
         """Проверить, существует ли ссылка у пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, title, url, description, category, tags, created_date
                     FROM user_links 
-                    WHERE user_id = ? AND url = ? AND is_active = 1
-                ''', (user_id, url))
+                    WHERE user_id = ? AND url_hash = ? AND is_active = 1
+                ''', (user_id, url_hash(url)))
                 return cursor.fetchone()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при проверке существования ссылки: {e}")
             return None
 
@@ -373,22 +788,350 @@ class Database:
                            category: str = 'general', tags: str = None):
         """Добавить пользовательскую ссылку"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT INTO user_links (user_id, title, url, description, category, tags)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, title, url, description, category, tags))
+                    INSERT INTO user_links (user_id, title, url, description, category, tags, url_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, title, url, description, category, tags, url_hash(url)))
                 conn.commit()
+                index = self._links_fuzzy.get(user_id)
+                if index is not None:
+                    index.add(cursor.lastrowid, title, tags)
+                self._bump_library_version(user_id)
                 return cursor.lastrowid
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при добавлении ссылки: {e}")
             return None
     
+    async def get_existing_link_urls(self, user_id: int, urls: list) -> set:
+        """
+        Вернуть те URL из списка, которые уже сохранены у пользователя.
+
+        Сравнение идет по url_hash, поэтому дубликатом считается и та же страница
+        в другом написании (с www, слешем на конце, utm-метками).
+        """
+        existing = set()
+        if not urls:
+            return existing
+        urls_by_hash = {}
+        for url in urls:
+            urls_by_hash.setdefault(url_hash(url), []).append(url)
+        hashes = list(urls_by_hash)
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                # Делим на части, чтобы не упереться в лимит параметров SQLite
+                for start in range(0, len(hashes), 500):
+                    chunk = hashes[start:start + 500]
+                    placeholders = ', '.join('?' for _ in chunk)
+                    cursor.execute(f'''
+                        SELECT url_hash FROM user_links 
+                        WHERE user_id = ? AND is_active = 1 AND url_hash IN ({placeholders})
+                    ''', (user_id, *chunk))
+                    for row in cursor.fetchall():
+                        existing.update(urls_by_hash[row[0]])
+            return existing
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при проверке существования ссылок: {e}")
+            return existing
+
+    async def add_user_links(self, user_id: int, links: list):
+        """
+        Добавить несколько ссылок одной транзакцией.
+
+        links - список кортежей (title, url, description, category, tags).
+        Ссылки, которые уже есть у пользователя, пропускаются.
+        Возвращает количество добавленных ссылок или None при ошибке.
+        Пачка пишется в отдельном потоке, чтобы не останавливать событийный цикл.
+        """
+        if not links:
+            return 0
+        try:
+            added = await asyncio.to_thread(self._insert_user_links, user_id, links)
+            # ID вставленных строк executemany не возвращает - индекс перестроится при следующем поиске
+            self._links_fuzzy.pop(user_id, None)
+            self._bump_library_version(user_id)
+            return added
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при пакетном добавлении ссылок: {e}")
+            return None
+
+    def _insert_user_links(self, user_id: int, links: list) -> int:
+        """Вставка пачки ссылок одной транзакцией (выполняется в отдельном потоке)"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            changes_before = conn.total_changes
+            cursor.executemany('''
+                INSERT OR IGNORE INTO user_links (user_id, title, url, description, category, tags, url_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(user_id, *link, url_hash(link[1])) for link in links])
+            conn.commit()
+            return conn.total_changes - changes_before
+
+    async def update_user_link_title(self, user_id: int, url: str, title: str, old_title: str):
+        """
+        Заменить название ссылки, если оно все еще равно old_title.
+
+        Так автоматически полученное название не перезапишет название,
+        которое пользователь успел задать сам.
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, tags FROM user_links 
+                    WHERE user_id = ? AND url = ? AND title = ? AND is_active = 1
+                ''', (user_id, url, old_title))
+                rows = cursor.fetchall()
+                if not rows:
+                    return False
+                cursor.execute('''
+                    UPDATE user_links SET title = ? 
+                    WHERE user_id = ? AND url = ? AND title = ? AND is_active = 1
+                ''', (title, user_id, url, old_title))
+                conn.commit()
+                index = self._links_fuzzy.get(user_id)
+                if index is not None:
+                    for link_id, tags in rows:
+                        index.add(link_id, title, tags)
+                self._bump_library_version(user_id)
+                return cursor.rowcount > 0
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при обновлении названия ссылки: {e}")
+            return False
+
+    async def get_cached_link_title(self, url: str):
+        """Получить сохраненное название страницы по каноническому URL"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT title FROM link_titles WHERE url = ?
+                ''', (url,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении названия страницы из кэша: {e}")
+            return None
+
+    async def save_cached_link_title(self, url: str, title: str):
+        """Сохранить название страницы в кэш"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO link_titles (url, title, fetched_date)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                ''', (url, title))
+                conn.commit()
+                return True
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при сохранении названия страницы в кэш: {e}")
+            return False
+
+    async def get_links_for_check(self, after_id: int, limit: int, min_age_seconds: int):
+        """
+        Следующая пачка активных ссылок для проверки доступности.
+
+        Ссылки перебираются по возрастанию id начиная после after_id (keyset-пагинация),
+        недавно проверенные пропускаются. Возвращает список (id, url).
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, url FROM user_links 
+                    WHERE id > ? AND is_active = 1 
+                      AND (last_checked IS NULL OR last_checked < datetime('now', ?))
+                    ORDER BY id 
+                    LIMIT ?
+                ''', (after_id, f"-{int(min_age_seconds)} seconds", limit))
+                return cursor.fetchall()
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении ссылок для проверки: {e}")
+            return []
+
+    async def save_link_check_results(self, results: list):
+        """
+        Сохранить результаты проверки ссылок одной транзакцией.
+
+        results - список кортежей (link_id, status, latency_ms, ok). Для недоступных
+        ссылок увеличивается счетчик неудачных проверок подряд, для доступных - сбрасывается.
+        """
+        if not results:
+            return True
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    UPDATE user_links 
+                    SET check_status = ?, check_latency_ms = ?, last_checked = CURRENT_TIMESTAMP,
+                        check_failures = CASE WHEN ? THEN 0 ELSE COALESCE(check_failures, 0) + 1 END
+                    WHERE id = ?
+                ''', [(status, latency_ms, ok, link_id) for link_id, status, latency_ms, ok in results])
+                conn.commit()
+                return True
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при сохранении результатов проверки ссылок: {e}")
+            return False
+
+    async def get_dead_user_links(self, user_id: int, min_failures: int):
+        """Получить ссылки пользователя, которые не открылись min_failures проверок подряд"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, title, url, description, category, tags, created_date
+                    FROM user_links 
+                    WHERE user_id = ? AND check_failures >= ? AND is_active = 1 
+                    ORDER BY created_date DESC
+                ''', (user_id, min_failures))
+                return cursor.fetchall()
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении нерабочих ссылок: {e}")
+            return []
+
+    async def count_dead_user_links(self, user_id: int, min_failures: int) -> int:
+        """Количество нерабочих ссылок пользователя"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COUNT(*) FROM user_links 
+                    WHERE user_id = ? AND check_failures >= ? AND is_active = 1
+                ''', (user_id, min_failures))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при подсчете нерабочих ссылок: {e}")
+            return 0
+
+    async def get_link_check_info(self, link_id: int):
+        """Результат последней проверки ссылки: (check_status, check_latency_ms, check_failures, last_checked)"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT check_status, check_latency_ms, check_failures, last_checked
+                    FROM user_links WHERE id = ?
+                ''', (link_id,))
+                return cursor.fetchone()
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении результата проверки ссылки: {e}")
+            return None
+
+    async def get_link_category_overrides(self, user_id: int) -> dict:
+        """Правила пользователя домен -> категория (кэшируются в памяти)"""
+        overrides = self._category_overrides.get(user_id)
+        if overrides is not None:
+            self._category_overrides.move_to_end(user_id)
+            return overrides
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT domain, category FROM link_category_overrides WHERE user_id = ?
+                ''', (user_id,))
+                overrides = dict(cursor.fetchall())
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении правил категорий ссылок: {e}")
+            return {}
+        self._category_overrides[user_id] = overrides
+        if len(self._category_overrides) > self.CATEGORY_OVERRIDES_MAX_USERS:
+            self._category_overrides.popitem(last=False)
+        return overrides
+
+    async def set_link_category_override(self, user_id: int, domain: str, category: str = None):
+        """Запомнить категорию для домена пользователя (None - удалить правило)"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                if category is None:
+                    cursor.execute('''
+                        DELETE FROM link_category_overrides WHERE user_id = ? AND domain = ?
+                    ''', (user_id, domain))
+                else:
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO link_category_overrides (user_id, domain, category)
+                        VALUES (?, ?, ?)
+                    ''', (user_id, domain, category))
+                conn.commit()
+            overrides = self._category_overrides.get(user_id)
+            if overrides is not None:
+                if category is None:
+                    overrides.pop(domain, None)
+                else:
+                    overrides[domain] = category
+            return True
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при сохранении правила категории ссылок: {e}")
+            return False
+
+    async def optimize(self):
+        """
+        Обслуживание БД перед остановкой: PRAGMA optimize обновляет статистику
+        индексов для планировщика, контрольная точка переносит WAL в основной
+        файл и обрезает журнал, чтобы следующий запуск не разбирал его.
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute('PRAGMA optimize')
+                busy, _, _ = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+                if busy:
+                    logger.warning("Контрольная точка WAL не завершена: БД занята")
+                return not busy
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при обслуживании базы данных: {e}")
+            return False
+
+    async def get_service_state(self, key: str):
+        """Получить сохраненное значение состояния фонового сервиса"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT value FROM service_state WHERE key = ?
+                ''', (key,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении состояния сервиса {key}: {e}")
+            return None
+
+    async def set_service_state(self, key: str, value: str):
+        """Сохранить значение состояния фонового сервиса"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO service_state (key, value) VALUES (?, ?)
+                ''', (key, value))
+                conn.commit()
+                return True
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при сохранении состояния сервиса {key}: {e}")
+            return False
+
     async def get_user_links(self, user_id: int):
         """Получить все ссылки пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, title, url, description, category, tags, created_date
@@ -398,13 +1141,14 @@ class Database:
                 ''', (user_id,))
                 return cursor.fetchall()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении ссылок пользователя: {e}")
             return []
     
     async def get_user_links_by_category(self, user_id: int, category: str):
         """Получить ссылки пользователя по категории"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, title, url, description, category, tags, created_date
@@ -414,13 +1158,14 @@ class Database:
                 ''', (user_id, category))
                 return cursor.fetchall()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении ссылок по категории: {e}")
             return []
     
     async def get_user_link_categories(self, user_id: int):
         """Получить категории ссылок пользователя с количеством"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT category, COUNT(*) as count
@@ -431,13 +1176,14 @@ class Database:
                 ''', (user_id,))
                 return cursor.fetchall()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении категорий ссылок: {e}")
             return []
     
     async def get_user_link_by_id(self, link_id: int, user_id: int):
         """Получить ссылку по ID"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, title, url, description, category, tags, created_date
@@ -446,28 +1192,34 @@ class Database:
                 ''', (link_id, user_id))
                 return cursor.fetchone()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении ссылки: {e}")
             return None
     
     async def delete_user_link(self, link_id: int, user_id: int):
         """Удалить ссылку пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE user_links SET is_active = 0 
                     WHERE id = ? AND user_id = ?
                 ''', (link_id, user_id))
                 conn.commit()
+                index = self._links_fuzzy.get(user_id)
+                if index is not None:
+                    index.remove(link_id)
+                self._bump_library_version(user_id)
                 return cursor.rowcount > 0
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при удалении ссылки: {e}")
             return False
     
     async def search_user_links(self, user_id: int, query: str):
         """Поиск ссылок пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, title, url, description, category, tags, created_date
@@ -482,13 +1234,86 @@ class Database:
                 ''', (user_id, f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"))
                 return cursor.fetchall()
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при поиске ссылок: {e}")
             return []
+
+    async def get_user_links_by_ids(self, user_id: int, link_ids: list):
+        """Получить активные ссылки пользователя по списку ID с сохранением порядка"""
+        if not link_ids:
+            return []
+        try:
+            placeholders = ', '.join('?' for _ in link_ids)
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT id, title, url, description, category, tags, created_date
+                    FROM user_links 
+                    WHERE user_id = ? AND is_active = 1 AND id IN ({placeholders})
+                ''', (user_id, *link_ids))
+                rows = {row[0]: row for row in cursor.fetchall()}
+                return [rows[link_id] for link_id in link_ids if link_id in rows]
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при получении ссылок по списку ID: {e}")
+            return []
+
+    async def search_user_link_ids(self, user_id: int, query: str):
+        """Поиск ссылок, возвращает только ID в порядке выдачи"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id FROM user_links 
+                    WHERE user_id = ? AND is_active = 1 AND (
+                        title LIKE ? OR 
+                        description LIKE ? OR 
+                        tags LIKE ? OR 
+                        url LIKE ?
+                    )
+                    ORDER BY created_date DESC
+                ''', (user_id, f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"))
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при поиске ссылок: {e}")
+            return []
+
+    async def fuzzy_search_user_link_ids(self, user_id: int, query: str, limit: int = 10):
+        """Нечеткий поиск ссылок по названию и тегам, возвращает ID по убыванию сходства"""
+        try:
+            index = self._get_fuzzy_index(
+                self._links_fuzzy, user_id,
+                'SELECT id, title, tags FROM user_links WHERE user_id = ? AND is_active = 1'
+            )
+            return [doc_id for doc_id, _ in index.search(query, limit=limit)]
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при нечетком поиске ссылок: {e}")
+            return []
+
+    async def prefix_search_user_link_ids(self, user_id: int, query: str, limit: int = 50):
+        """Поиск ссылок по началу слов в названии и тегах, возвращает ID (новые первыми)"""
+        try:
+            index = self._get_fuzzy_index(
+                self._links_fuzzy, user_id,
+                'SELECT id, title, tags FROM user_links WHERE user_id = ? AND is_active = 1'
+            )
+            return index.prefix_search(query, limit=limit)
+        except Exception as e:
+            raise_for_db_error(e)
+            logger.error(f"Ошибка при поиске ссылок по префиксу: {e}")
+            return []
+
+    async def fuzzy_search_user_links(self, user_id: int, query: str, limit: int = 10):
+        """Нечеткий поиск ссылок по названию и тегам (устойчив к опечаткам)"""
+        link_ids = await self.fuzzy_search_user_link_ids(user_id, query, limit)
+        return await self.get_user_links_by_ids(user_id, link_ids)
     
     async def get_user_links_stats(self, user_id: int):
         """Получить статистику ссылок пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT COUNT(*) FROM user_links WHERE user_id = ? AND is_active = 1
@@ -498,5 +1323,6 @@ class Database:
                     'total_links': result[0] or 0
                 }
         except Exception as e:
+            raise_for_db_error(e)
             logger.error(f"Ошибка при получении статистики ссылок: {e}")
             return {'total_links': 0} 
\ No newline at end of file
@@ -0,0 +1,38 @@
+import sqlite3
+
+
+class DatabaseError(Exception):
+    """Сбой БД, о котором нужно сообщить пользователю (а не вернуть пустой результат)"""
+
+
+class DatabaseBusyError(DatabaseError):
+    """БД заблокирована другой записью: повторяется, пока не кончится бюджет времени"""
+
+
+class DatabaseUnavailableError(DatabaseError):
+    """БД недоступна: нет места, ошибка ввода-вывода, поврежденный файл и т.п."""
+
+
+def is_busy_error(error: Exception) -> bool:
+    """SQLITE_BUSY или SQLITE_LOCKED (в том числе расширенные коды)"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error)
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def raise_for_db_error(error: Exception):
+    """
+    Классификация ошибки в методе Database. Блокировка и отказ БД
+    пробрасываются типизированными исключениями; остальное (нарушение
+    ограничений, неверные данные) метод обрабатывает сам, как раньше.
+    """
+    if isinstance(error, DatabaseError):
+        raise error
+    if is_busy_error(error):
+        raise DatabaseBusyError(str(error)) from error
+    if type(error) in (sqlite3.OperationalError, sqlite3.DatabaseError):
+        raise DatabaseUnavailableError(str(error)) from error
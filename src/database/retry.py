@@ -0,0 +1,65 @@
+import asyncio
+import functools
+import inspect
+import logging
+import random
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from src.database.errors import DatabaseBusyError, DatabaseUnavailableError
+from src.monitoring.metrics import DB_FAILURES, DB_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Выполняется ли уже метод с повторами (вложенные вызовы повторяет внешний метод целиком)
+_retrying: ContextVar[bool] = ContextVar('db_retrying', default=False)
+
+
+def retry_on_busy(cls):
+    """
+    Декоратор класса Database: публичные асинхронные методы повторяются при
+    блокировке БД с экспоненциальной паузой со случайным разбросом, пока не
+    кончится бюджет времени BUSY_RETRY_BUDGET. Паузы идут через asyncio.sleep
+    и не блокируют событийный цикл.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.iscoroutinefunction(method):
+            continue
+        setattr(cls, name, _retry_method(name, method))
+    return cls
+
+
+def _retry_method(name: str, method: Callable) -> Callable:
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if _retrying.get():
+            return await method(self, *args, **kwargs)
+
+        token = _retrying.set(True)
+        try:
+            deadline = time.monotonic() + self.BUSY_RETRY_BUDGET
+            delay = self.BUSY_RETRY_BASE_DELAY
+            attempt = 1
+            while True:
+                try:
+                    return await method(self, *args, **kwargs)
+                except DatabaseBusyError as e:
+                    pause = random.uniform(0, delay)
+                    if time.monotonic() + pause > deadline:
+                        DB_FAILURES.labels(name, 'busy').inc()
+                        logger.error(f"БД занята, {name} не выполнен за {attempt} попыток: {e}")
+                        raise
+                    DB_RETRIES.labels(name).inc()
+                    logger.debug(f"Повтор {name} через {pause * 1000:.0f} мс (попытка {attempt}): {e}")
+                    await asyncio.sleep(pause)
+                    delay = min(delay * 2, self.BUSY_RETRY_MAX_DELAY)
+                    attempt += 1
+                except DatabaseUnavailableError as e:
+                    DB_FAILURES.labels(name, 'unavailable').inc()
+                    logger.error(f"БД недоступна, {name} не выполнен: {e}")
+                    raise
+        finally:
+            _retrying.reset(token)
+
+    return wrapper
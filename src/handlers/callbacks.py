@@ -0,0 +1,191 @@
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+from src.monitoring.metrics import observe_handler
+
+logger = logging.getLogger(__name__)
+
+# Разделитель, общий для всех фабрик таблицы (по нему отделяется префикс маршрута)
+SEPARATOR = ":"
+
+
+# Компактные callback_data: короткий префикс + значения через ":" (например, "d:123").
+# Чем короче префикс, тем больше места остается в лимите Telegram в 64 байта.
+
+class DownloadFile(CallbackData, prefix="d"):
+    record_id: int
+
+
+class SelectFile(CallbackData, prefix="s"):
+    record_id: int
+
+
+class ShareFile(CallbackData, prefix="sh"):
+    record_id: int
+
+
+class DeleteFile(CallbackData, prefix="x"):
+    record_id: int
+
+
+class ConfirmDeleteFile(CallbackData, prefix="xc"):
+    record_id: int
+
+
+class DownloadShared(CallbackData, prefix="ds"):
+    share_id: str
+
+
+class FileCategory(CallbackData, prefix="c"):
+    category: str
+
+
+class LinkCategory(CallbackData, prefix="lc"):
+    category: str
+
+
+class ChooseLinkCategory(CallbackData, prefix="lk"):
+    category: str
+
+
+class ViewLink(CallbackData, prefix="v"):
+    link_id: int
+
+
+class DeleteLink(CallbackData, prefix="xl"):
+    link_id: int
+
+
+class ConfirmDeleteLink(CallbackData, prefix="xlc"):
+    link_id: int
+
+
+class SearchPage(CallbackData, prefix="p"):
+    kind: str
+    token: int
+    page: int
+
+
+# Старый формат callback_data ("download_123") - кнопки в уже отправленных сообщениях.
+# Длинные префиксы идут раньше коротких, с которыми они начинаются одинаково.
+LEGACY_PREFIXES = [
+    ("confirm_delete_link_", ConfirmDeleteLink),
+    ("confirm_delete_", ConfirmDeleteFile),
+    ("download_shared_", DownloadShared),
+    ("download_", DownloadFile),
+    ("delete_link_", DeleteLink),
+    ("delete_", DeleteFile),
+    ("select_file_", SelectFile),
+    ("share_", ShareFile),
+    ("view_link_", ViewLink),
+    ("link_category_", LinkCategory),
+    ("link_cat_", ChooseLinkCategory),
+    ("category_", FileCategory),
+]
+
+
+class CallbackTable:
+    """
+    Таблица маршрутов для callback-запросов.
+
+    Вместо десятков фильтров F.data, которые aiogram проверяет по очереди,
+    в роутере регистрируется один обработчик: маршрут находится одним поиском
+    в словаре по точному значению или по префиксу до ":", а данные разбираются
+    соответствующей фабрикой CallbackData и передаются в обработчик как callback_data.
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Tuple[Callable, frozenset]] = {}
+        self._prefixed: Dict[str, Tuple[Type[CallbackData], Callable, frozenset]] = {}
+
+    def exact(self, data: str):
+        """Декоратор: обработчик для callback_data без параметров"""
+        def decorator(handler: Callable) -> Callable:
+            if data in self._exact:
+                raise ValueError(f"Маршрут {data!r} уже зарегистрирован")
+            self._exact[data] = (handler, self._accepted_params(handler))
+            return handler
+        return decorator
+
+    def route(self, factory: Type[CallbackData]):
+        """Декоратор: обработчик для callback_data, созданных фабрикой factory"""
+        def decorator(handler: Callable) -> Callable:
+            prefix = factory.__prefix__
+            if factory.__separator__ != SEPARATOR:
+                raise ValueError(f"Фабрика {factory.__name__} должна использовать разделитель {SEPARATOR!r}")
+            if prefix in self._prefixed:
+                raise ValueError(f"Префикс {prefix!r} уже зарегистрирован")
+            self._prefixed[prefix] = (factory, handler, self._accepted_params(handler))
+            return handler
+        return decorator
+
+    def register(self, router: Router):
+        """Подключить таблицу к роутеру единственным обработчиком callback_query"""
+        router.callback_query.register(self.dispatch)
+
+    def resolve(self, data: Optional[str]) -> Optional[Tuple[Callable, frozenset, Optional[CallbackData]]]:
+        """Найти обработчик и разобрать данные; None, если маршрут не найден"""
+        if not data:
+            return None
+
+        exact = self._exact.get(data)
+        if exact is not None:
+            handler, params = exact
+            return handler, params, None
+
+        prefix, separator, _ = data.partition(SEPARATOR)
+        if separator:
+            entry = self._prefixed.get(prefix)
+            if entry is not None:
+                factory, handler, params = entry
+                return handler, params, factory.unpack(data)
+
+        return self._resolve_legacy(data)
+
+    async def dispatch(self, callback: CallbackQuery, **kwargs: Any) -> Any:
+        """Обработчик callback_query, вызывающий найденный маршрут"""
+        try:
+            resolved = self.resolve(callback.data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Некорректные callback_data {callback.data!r}: {e}")
+            resolved = None
+
+        if resolved is None:
+            return UNHANDLED
+
+        handler, params, callback_data = resolved
+        kwargs["callback_data"] = callback_data
+        started = time.perf_counter()
+        try:
+            result = await handler(callback, **{name: value for name, value in kwargs.items() if name in params})
+        except Exception as e:
+            observe_handler(handler.__name__, started, e)
+            raise
+        observe_handler(handler.__name__, started)
+        return result
+
+    def _resolve_legacy(self, data: str):
+        for old_prefix, factory in LEGACY_PREFIXES:
+            if data.startswith(old_prefix):
+                entry = self._prefixed.get(factory.__prefix__)
+                if entry is None:
+                    return None
+                _, handler, params = entry
+                # Значения разбираются так же, как новые callback_data
+                return handler, params, factory.unpack(
+                    f"{factory.__prefix__}{SEPARATOR}{data[len(old_prefix):]}"
+                )
+        return None
+
+    @staticmethod
+    def _accepted_params(handler: Callable) -> frozenset:
+        """Имена аргументов обработчика, кроме самого callback"""
+        parameters = list(inspect.signature(handler).parameters)
+        return frozenset(parameters[1:])
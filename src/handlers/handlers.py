@@ -2,7 +2,12 @@ import asyncio
 import logging
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, FSInputFile, Document, PhotoSize, Video, Audio, Voice, BufferedInputFile
-from aiogram.filters import Command
+from aiogram.types import ErrorEvent
+from aiogram.types import (
+    InlineQuery, InlineQueryResultArticle, InlineQueryResultCachedAudio, InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto, InlineQueryResultCachedVideo, InlineQueryResultCachedVoice, InputTextMessageContent
+)
+from aiogram.filters import Command, ExceptionTypeFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -12,24 +17,96 @@ import os
 from datetime import datetime
 import io
 import csv
+import tempfile
 
 from src.config.config import Config
 from src.database.database import Database
+from src.database.errors import DatabaseError, DatabaseBusyError
 from src.utils.utils import format_file_size, get_file_extension, get_file_category, get_category_icon, get_category_name, get_link_category_icon, get_link_category_name
+from src.utils.search_cache import SearchCache, normalize_query
+from src.utils.urls import extract_urls, canonicalize_url, url_hash, is_web_url
+from src.utils.domains import LinkClassifier, get_host
+from src.utils.bookmarks import detect_format, folder_to_category, iter_bookmarks
+from src.services.title_fetcher import TitleFetcher
+from src.services.link_checker import LinkChecker
+from src.monitoring.profiler import sample_stacks, memory_growth
+from src.handlers.callbacks import (
+    CallbackTable, DownloadFile, SelectFile, ShareFile, DeleteFile, ConfirmDeleteFile, DownloadShared,
+    FileCategory, LinkCategory, ChooseLinkCategory, ViewLink, DeleteLink, ConfirmDeleteLink, SearchPage
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
+callbacks = CallbackTable()
+callbacks.register(router)
 db = None  # Will be initialized later
+title_fetcher = None  # Получение названий страниц в фоне (создается вместе с БД)
+link_checker = None  # Фоновая проверка доступности ссылок
+search_cache = SearchCache()
+link_classifier = LinkClassifier()
+
+# Категории ссылок, доступные для выбора
+LINK_CATEGORIES = ['general', 'web', 'education', 'work', 'social', 'news', 'shopping', 'tools', 'games', 'entertainment']
+
+# Размеры страниц в списках результатов поиска
+FILES_PAGE_SIZE = 8
+LINKS_PAGE_SIZE = 10
+
+# Пауза (сек), в течение которой ссылки из пересланной пачки сообщений собираются вместе
+URL_BATCH_DELAY = 1.0
+# Сколько ссылок может накопиться в одной пачке без расхода лимита запросов
+URL_BATCH_MAX_URLS = 500
+# Ссылки, ожидающие подтверждения: user_id -> {"urls": [...], "task": asyncio.Task}
+pending_url_batches = {}
+# Отложенные подтверждения пачек: при остановке бота их дожидаются вместе с обработчиками
+url_batch_tasks = set()
+
+# Импорт закладок: ссылок в одной транзакции, пауза между обновлениями прогресса (сек)
+# и максимальный размер файла (больше ботам скачать не дает Telegram)
+IMPORT_BATCH_SIZE = 5000
+IMPORT_PROGRESS_INTERVAL = 2.0
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024
+
+# Инлайн-режим: результатов в одном ответе и всего по запросу
+INLINE_PAGE_SIZE = 20
+INLINE_MAX_RESULTS = 200
+# Последний инлайн-запрос каждого пользователя (для отбрасывания устаревших)
+inline_latest_queries = {}
+
+# Одновременно выполняется только один замер профилировщика
+profiler_lock = asyncio.Lock()
 
 def init_database():
     """Initialize the database instance"""
-    global db
+    global db, title_fetcher
     import os
     # Ensure logs and data directories exist
     os.makedirs('logs', exist_ok=True)
     os.makedirs('data', exist_ok=True)
     db = Database()
+    if Config.TITLE_FETCH_ENABLED:
+        title_fetcher = TitleFetcher(db)
     logger.info("Database initialized successfully")
+    return db
+
+def start_background_services():
+    """Запустить фоновые сервисы (вызывается из работающего event loop)"""
+    global link_checker
+    if Config.LINK_CHECK_ENABLED and link_checker is None:
+        link_checker = LinkChecker(db)
+        link_checker.start()
+
+async def close_background_services(timeout: float = 0):
+    """Остановить фоновые сервисы перед завершением работы бота (очередь названий ждем не дольше timeout сек)"""
+    if link_checker is not None:
+        await link_checker.close()
+    if title_fetcher is not None:
+        await title_fetcher.close(timeout)
+
+def schedule_title_fetch(user_id: int, url: str, placeholder: str):
+    """Запросить настоящее название страницы в фоне (сохранение ссылки его не ждет)"""
+    if title_fetcher is not None:
+        title_fetcher.submit(user_id, url, placeholder)
 
 class FileUploadStates(StatesGroup):
     waiting_for_description = State()
@@ -41,6 +118,7 @@ class FileUploadStates(StatesGroup):
     waiting_for_link_category = State()
     waiting_for_link_tags = State()
     waiting_for_link_search_query = State()
+    waiting_for_import_file = State()
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
@@ -112,12 +190,16 @@ async def cmd_help(message: Message):
 • Или используйте кнопку "🔗 Ссылки" в главном меню
 • Поиск и категоризация ссылок
 • Удаление ненужных ссылок
+• /import - Импорт закладок из браузера (HTML, CSV или TXT)
 
 **Удаление файлов:**
 • Используйте кнопку "🗑️ Удалить" рядом с файлом
 • Подтверждение удаления для безопасности
 • Удаленные файлы нельзя восстановить
 
+**Инлайн-режим:**
+• Наберите @{bot_username} <запрос> в любом чате, чтобы отправить свой файл или ссылку
+
 **Ограничения:**
 • Максимальный размер файла: {max_size}MB
 
@@ -129,7 +211,8 @@ async def cmd_help(message: Message):
 • Создание ссылок для скачивания файлов
 • Автоматическое добавление ссылок из чата
     """.format(
-        max_size=Config.MAX_FILE_SIZE // (1024 * 1024)
+        max_size=Config.MAX_FILE_SIZE // (1024 * 1024),
+        bot_username=Config.BOT_USERNAME or "your_bot_username"
     )
     
     await message.answer(help_text)
@@ -139,22 +222,36 @@ async def cmd_files(message: Message):
     """Показать файлы пользователя"""
     await show_user_files(message, message.from_user.id)
 
-@router.message(Command("stats"))
-async def cmd_stats(message: Message):
-    """Показать статистику пользователя"""
-    stats = await db.get_file_stats(message.from_user.id)
+async def build_stats_text(user_id: int) -> str:
+    """Текст статистики пользователя: занятое место из счетчиков и лимиты квоты"""
+    usage = await db.get_storage_usage(user_id)
+    quota = await get_user_quota(user_id)
     
-    total_size_mb = stats['total_size'] / (1024 * 1024)
+    total_size_mb = usage['bytes'] / (1024 * 1024)
     
-    stats_text = f"""
+    if quota['max_files']:
+        files_text = f"{usage['files']} из {quota['max_files']} ({usage['files'] * 100 // quota['max_files']}%)"
+    else:
+        files_text = f"{usage['files']} (без ограничений)"
+    
+    if quota['max_bytes']:
+        size_text = f"{total_size_mb:.2f} MB из {format_file_size(quota['max_bytes'])} ({usage['bytes'] * 100 // quota['max_bytes']}%)"
+    else:
+        size_text = f"{total_size_mb:.2f} MB (без ограничений)"
+    
+    return f"""
 📊 **Ваша статистика:**
 
-📁 Всего файлов: {stats['total_files']}
-💾 Общий размер: {total_size_mb:.2f} MB
+📁 Всего файлов: {files_text}
+💾 Общий размер: {size_text}
+🎫 Тариф: {quota['tier']}
 📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}
     """
-    
-    await message.answer(stats_text)
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """Показать статистику пользователя"""
+    await message.answer(await build_stats_text(message.from_user.id))
 
 @router.message(Command("search"))
 async def cmd_search(message: Message):
@@ -165,13 +262,13 @@ async def cmd_search(message: Message):
         return
     
     query = " ".join(args[1:])
-    files = await db.search_files(message.from_user.id, query)
+    result = await run_cached_search(message.from_user.id, "f", query)
     
-    if not files:
+    if not result.ids:
         await message.answer(f"🔍 По запросу '{query}' ничего не найдено.")
         return
     
-    await show_files_list(message, files, f"🔍 Результаты поиска: '{query}'")
+    await show_search_page(message, message.from_user.id, result, 0)
 
 @router.message(Command("delete"))
 async def cmd_delete(message: Message):
@@ -199,6 +296,265 @@ async def cmd_export(message: Message):
         reply_markup=keyboard.as_markup()
     )
 
+@router.message(Command("import"))
+async def cmd_import(message: Message, state: FSMContext):
+    """Импорт ссылок из файла закладок"""
+    await ask_import_file(message, state)
+
+def is_admin(user_id: int) -> bool:
+    """Доступны ли пользователю команды диагностики"""
+    return user_id in Config.ADMIN_IDS
+
+def parse_profile_seconds(message: Message) -> int:
+    """Длительность замера из аргумента команды (/profile 60)"""
+    parts = (message.text or '').split(maxsplit=1)
+    try:
+        seconds = int(parts[1]) if len(parts) > 1 else Config.PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        seconds = Config.PROFILE_DEFAULT_SECONDS
+    return max(1, min(seconds, Config.PROFILE_MAX_SECONDS))
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message):
+    """Семплирующий профилировщик событийного цикла (только для администраторов)"""
+    if not is_admin(message.from_user.id):
+        return
+    if profiler_lock.locked():
+        await message.answer("⏳ Замер уже выполняется, дождитесь его окончания.")
+        return
+    
+    seconds = parse_profile_seconds(message)
+    async with profiler_lock:
+        await message.answer(f"🔬 Профилирование {seconds} сек...")
+        sampler = await sample_stacks(seconds, Config.PROFILE_SAMPLE_INTERVAL)
+        
+        filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded"
+        await message.answer_document(
+            document=BufferedInputFile(sampler.collapsed().encode('utf-8'), filename=filename),
+            caption=f"🔬 Снимков стека: {sampler.samples}, уникальных стеков: {len(sampler.stacks)}\n"
+                    f"Формат свернутых стеков - для flamegraph.pl или speedscope.app"
+        )
+
+@router.message(Command("memprofile"))
+async def cmd_memprofile(message: Message):
+    """Рост памяти по разнице снимков tracemalloc (только для администраторов)"""
+    if not is_admin(message.from_user.id):
+        return
+    if profiler_lock.locked():
+        await message.answer("⏳ Замер уже выполняется, дождитесь его окончания.")
+        return
+    
+    seconds = parse_profile_seconds(message)
+    async with profiler_lock:
+        await message.answer(f"🧠 Замер памяти {seconds} сек...")
+        report = await memory_growth(seconds)
+        
+        filename = f"memory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        await message.answer_document(
+            document=BufferedInputFile(report.encode('utf-8'), filename=filename),
+            caption="🧠 Места, где больше всего выросла занятая память"
+        )
+
+def parse_quota_limit(value: str, scale: int = 1):
+    """Лимит из аргумента /quota: "-" - брать из тарифа (None), 0 - без ограничения"""
+    if value == "-":
+        return None
+    limit = float(value) * scale
+    if limit < 0:
+        raise ValueError(value)
+    return int(limit)
+
+@router.message(Command("quota"))
+async def cmd_quota(message: Message):
+    """
+    Просмотр и назначение квоты пользователя (только для администраторов):
+    /quota <user_id> - текущее место и лимиты;
+    /quota <user_id> <тариф> [MB|-] [файлов|-] - назначить тариф и индивидуальные лимиты.
+    """
+    if not is_admin(message.from_user.id):
+        return
+    
+    args = (message.text or '').split()[1:]
+    usage_text = (
+        "🎫 **Использование:** /quota <user_id> [тариф] [MB|-] [файлов|-]\n\n"
+        f"Тарифы: {', '.join(Config.QUOTA_TIERS)}\n"
+        "Лимиты: 0 - без ограничения, \"-\" - как в тарифе"
+    )
+    if not 1 <= len(args) <= 4:
+        await message.answer(usage_text)
+        return
+    
+    try:
+        user_id = int(args[0])
+        max_bytes = parse_quota_limit(args[2], 1024 * 1024) if len(args) > 2 else None
+        max_files = parse_quota_limit(args[3]) if len(args) > 3 else None
+    except ValueError:
+        await message.answer(usage_text)
+        return
+    
+    if len(args) > 1:
+        tier = args[1]
+        if tier not in Config.QUOTA_TIERS:
+            await message.answer(f"❌ Неизвестный тариф: {tier}\n\nТарифы: {', '.join(Config.QUOTA_TIERS)}")
+            return
+        if not await db.set_user_quota(user_id, tier, max_bytes, max_files):
+            await message.answer("❌ Не удалось сохранить квоту.")
+            return
+        logger.info(f"Администратор {message.from_user.id} назначил пользователю {user_id} квоту {args[1:]}")
+    
+    stats_text = await build_stats_text(user_id)
+    await message.answer(f"👤 Пользователь {user_id}\n{stats_text}")
+
+@callbacks.exact("import_links")
+async def callback_import_links(callback: CallbackQuery, state: FSMContext):
+    """Кнопка импорта ссылок"""
+    await ask_import_file(callback.message, state)
+    await callback.answer()
+
+async def ask_import_file(message: Message, state: FSMContext):
+    """Попросить прислать файл с закладками"""
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отменить", callback_data="cancel_import_links")
+    
+    await message.answer(
+        "📥 **Импорт ссылок**\n\n"
+        "Отправьте файл с закладками:\n"
+        "• HTML - экспорт закладок из браузера (Chrome, Firefox, Safari, Edge)\n"
+        "• CSV - с колонками url, title, category, tags (или Ссылка, Название, Категория, Теги)\n"
+        "• TXT - любой текст со ссылками\n\n"
+        "Папки закладок станут категориями, дубликаты будут пропущены.",
+        reply_markup=keyboard.as_markup()
+    )
+    await state.set_state(FileUploadStates.waiting_for_import_file)
+
+@callbacks.exact("cancel_import_links")
+async def callback_cancel_import_links(callback: CallbackQuery, state: FSMContext):
+    """Отменить импорт ссылок"""
+    await state.clear()
+    await show_link_categories(callback.message, callback.from_user.id)
+    await callback.answer()
+
+@router.message(FileUploadStates.waiting_for_import_file, F.document)
+async def handle_import_file(message: Message, state: FSMContext):
+    """Импорт ссылок из присланного файла"""
+    await state.clear()
+    user_id = message.from_user.id
+    document = message.document
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="🔗 Мои ссылки", callback_data="show_links")
+    keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
+    keyboard.adjust(1)
+    
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await message.answer(
+            f"❌ Файл слишком большой для импорта. Максимальный размер: {IMPORT_MAX_FILE_SIZE // (1024 * 1024)}MB",
+            reply_markup=keyboard.as_markup()
+        )
+        return
+    
+    progress_message = await message.answer("📥 Загружаю файл...")
+    try:
+        with tempfile.TemporaryDirectory(prefix="import_") as temp_dir:
+            temp_file_path = os.path.join(temp_dir, "bookmarks")
+            await message.bot.download(document, destination=temp_file_path)
+            stats = await import_bookmarks_file(user_id, temp_file_path, document.file_name, progress_message)
+    except Exception as e:
+        logger.error(f"Ошибка при импорте ссылок пользователя {user_id}: {e}")
+        await message.answer("❌ Ошибка при импорте файла. Попробуйте еще раз.", reply_markup=keyboard.as_markup())
+        return
+    
+    logger.info(f"Пользователь {user_id} импортировал ссылки: {stats}")
+    
+    if not stats['total']:
+        await message.answer("⚠️ В файле не найдено ни одной ссылки.", reply_markup=keyboard.as_markup())
+        return
+    
+    result_text = f"""
+✅ **Импорт завершен!**
+
+🔗 Найдено ссылок: {stats['total']}
+➕ Добавлено: {stats['added']}
+♻️ Дубликатов пропущено: {stats['duplicates']}
+    """
+    if stats['skipped']:
+        result_text += f"\n⚠️ Пропущено некорректных ссылок: {stats['skipped']}"
+    if stats['errors']:
+        result_text += f"\n❌ Не удалось сохранить: {stats['errors']}"
+    await message.answer(result_text, reply_markup=keyboard.as_markup())
+
+def iter_bookmark_batches(path: str, filename: str, overrides: dict, stats: dict, batch_size: int):
+    """
+    Читать файл закладок пачками по batch_size строк для db.add_user_links.
+
+    Файл читается потоково, и в памяти держится только текущая пачка: каждый
+    next() выполняется в отдельном потоке, а следующая пачка читается, только
+    когда предыдущая сохранена. Ссылки приводятся к каноническому виду; повторы,
+    в том числе внутри файла, отсекает уникальный индекс по url_hash при вставке.
+    Статистика разбора (total, skipped) накапливается в stats.
+    """
+    category_names = {get_link_category_name(category).lower(): category for category in LINK_CATEGORIES}
+    batch = []
+    
+    with open(path, encoding='utf-8-sig', errors='replace', newline='') as stream:
+        file_format = detect_format(filename, stream.read(1024))
+        stream.seek(0)
+        
+        for bookmark in iter_bookmarks(stream, file_format):
+            stats['total'] += 1
+            url = canonicalize_url(bookmark.url)
+            if not is_web_url(url):
+                stats['skipped'] += 1
+                continue
+            
+            category = folder_to_category(bookmark.folders, category_names) or link_classifier.classify(url, overrides)
+            title = (bookmark.title or extract_title_from_url(url))[:200]
+            batch.append((title, url, bookmark.description, category, bookmark.tags))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    
+    if batch:
+        yield batch
+
+async def import_bookmarks_file(user_id: int, path: str, filename: str, progress_message: Message = None) -> dict:
+    """
+    Импортировать ссылки из файла закладок.
+
+    Разбор файла идет в отдельном потоке, сохранение - пачками по IMPORT_BATCH_SIZE
+    по мере чтения (одна транзакция на пачку, уже сохраненные ссылки пропускает
+    уникальный индекс), поэтому большой файл не занимает память целиком и не
+    останавливает обработку сообщений других пользователей.
+    """
+    stats = {'total': 0, 'added': 0, 'duplicates': 0, 'skipped': 0, 'errors': 0}
+    overrides = await db.get_link_category_overrides(user_id)
+    # Копия: правила пользователя могут поменяться, пока поток читает файл
+    batches = iter_bookmark_batches(path, filename, dict(overrides or {}), stats, IMPORT_BATCH_SIZE)
+    loop = asyncio.get_running_loop()
+    last_progress = loop.time()
+    
+    while True:
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            break
+        added = await db.add_user_links(user_id, batch)
+        if added is None:
+            stats['errors'] += len(batch)
+        else:
+            stats['added'] += added
+            stats['duplicates'] += len(batch) - added
+        
+        if progress_message and loop.time() - last_progress >= IMPORT_PROGRESS_INTERVAL:
+            last_progress = loop.time()
+            try:
+                await progress_message.edit_text(
+                    f"📥 Импорт ссылок...\n\n🔗 Обработано: {stats['total']}\n➕ Добавлено: {stats['added']}"
+                )
+            except Exception as e:
+                logger.debug(f"Не удалось обновить прогресс импорта: {e}")
+    
+    return stats
+
 @router.message(F.document)
 async def handle_document(message: Message, state: FSMContext):
     """Обработчик загрузки документов"""
@@ -231,6 +587,36 @@ async def handle_voice(message: Message, state: FSMContext):
     logger.info(f"Получено голосовое сообщение от пользователя {message.from_user.id}")
     await handle_file_upload(message, state, message.voice)
 
+async def get_user_quota(user_id: int) -> dict:
+    """Лимиты пользователя: тариф и индивидуальные настройки (0 - без ограничения)"""
+    settings = await db.get_user_quota_settings(user_id)
+    tier = settings['tier'] or Config.QUOTA_DEFAULT_TIER
+    limits = Config.QUOTA_TIERS.get(tier) or Config.QUOTA_TIERS.get(Config.QUOTA_DEFAULT_TIER) or {}
+    
+    return {
+        'tier': tier,
+        'max_bytes': settings['max_bytes'] if settings['max_bytes'] is not None else limits.get('max_bytes', 0),
+        'max_files': settings['max_files'] if settings['max_files'] is not None else limits.get('max_files', 0)
+    }
+
+async def check_storage_quota(user_id: int, file_size: int):
+    """Проверить, поместится ли файл в квоту; возвращает текст ошибки или None"""
+    quota = await get_user_quota(user_id)
+    usage = await db.get_storage_usage(user_id)
+    
+    if quota['max_files'] and usage['files'] >= quota['max_files']:
+        return (f"❌ Достигнут лимит количества файлов: {quota['max_files']}\n\n"
+                f"Удалите ненужные файлы, чтобы загрузить новые. Статистика: /stats")
+    
+    if quota['max_bytes'] and usage['bytes'] + (file_size or 0) > quota['max_bytes']:
+        free_bytes = max(0, quota['max_bytes'] - usage['bytes'])
+        return (f"❌ Недостаточно места в хранилище!\n\n"
+                f"📏 Размер файла: {format_file_size(file_size)}\n"
+                f"💾 Свободно: {format_file_size(free_bytes)} из {format_file_size(quota['max_bytes'])}\n\n"
+                f"Удалите ненужные файлы, чтобы освободить место. Статистика: /stats")
+    
+    return None
+
 async def handle_file_upload(message: Message, state: FSMContext, file_obj):
     """Общий обработчик загрузки файлов"""
     user_id = message.from_user.id
@@ -273,6 +659,12 @@ async def handle_file_upload(message: Message, state: FSMContext, file_obj):
         await message.answer(f"❌ Файл слишком большой! Максимальный размер: {max_size_mb}MB")
         return
     
+    # Проверяем квоту пользователя
+    quota_error = await check_storage_quota(user_id, file_size)
+    if quota_error:
+        await message.answer(quota_error)
+        return
+    
     # Получаем расширение файла
     file_ext = get_file_extension(file_obj)
     
@@ -302,6 +694,18 @@ async def handle_file_upload(message: Message, state: FSMContext, file_obj):
     # Определяем категорию файла
     category = get_file_category(file_ext)
     
+    # Вид медиа в Telegram: по нему file_id отправляется обратно (например, в инлайн-режиме)
+    if isinstance(file_obj, PhotoSize):
+        media_kind = "photo"
+    elif isinstance(file_obj, Video):
+        media_kind = "video"
+    elif isinstance(file_obj, Audio):
+        media_kind = "audio"
+    elif isinstance(file_obj, Voice):
+        media_kind = "voice"
+    else:
+        media_kind = "document"
+    
     # Сохраняем информацию о файле в состоянии
     await state.update_data(
         file_id=file_id,
@@ -309,6 +713,7 @@ async def handle_file_upload(message: Message, state: FSMContext, file_obj):
         file_size=file_size,
         file_type=file_ext,
         category=category,
+        media_kind=media_kind,
         message_id=message.message_id,
         chat_id=message.chat.id
     )
@@ -352,6 +757,13 @@ async def handle_tags(message: Message, state: FSMContext):
     # Получаем данные из состояния
     data = await state.get_data()
     
+    # Квоту проверяем еще раз: пока заполнялось описание, могли загрузиться другие файлы
+    quota_error = await check_storage_quota(message.from_user.id, data['file_size'])
+    if quota_error:
+        await state.clear()
+        await message.answer(quota_error)
+        return
+    
     # Сохраняем файл в базу данных
     result = await db.add_file(
         file_id=data['file_id'],
@@ -363,7 +775,8 @@ async def handle_tags(message: Message, state: FSMContext):
         description=data['description'],
         tags=tags,
         message_id=data['message_id'],
-        chat_id=data['chat_id']
+        chat_id=data['chat_id'],
+        media_kind=data.get('media_kind')
     )
     
     # Создаем клавиатуру с кнопками навигации
@@ -414,7 +827,7 @@ async def handle_search_query(message: Message, state: FSMContext):
         return
     
     # Выполняем поиск
-    files = await db.search_files(message.from_user.id, query)
+    result = await run_cached_search(message.from_user.id, "f", query)
     
     # Создаем клавиатуру с кнопками навигации
     keyboard = InlineKeyboardBuilder()
@@ -423,17 +836,17 @@ async def handle_search_query(message: Message, state: FSMContext):
     keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
     keyboard.adjust(2)
     
-    if not files:
+    if not result.ids:
         await message.answer(
             f"🔍 По запросу '{query}' ничего не найдено.\n\nПопробуйте другой запрос или проверьте правильность написания.",
             reply_markup=keyboard.as_markup()
         )
     else:
-        await show_files_list(message, files, f"🔍 Результаты поиска: '{query}'")
+        await show_search_page(message, message.from_user.id, result, 0)
     
     await state.clear()
 
-@router.callback_query(F.data == "show_files")
+@callbacks.exact("show_files")
 async def callback_show_files(callback: CallbackQuery):
     """Callback для показа файлов"""
     await show_categories(callback.message, callback.from_user.id)
@@ -457,7 +870,7 @@ async def show_categories(message: Message, user_id: int):
         size_mb = total_size / (1024 * 1024) if total_size else 0
         
         categories_text += f"{icon} **{name}** - {count} файлов ({size_mb:.1f} MB)\n"
-        keyboard.button(text=f"{icon} {name} ({count})", callback_data=f"category_{category}")
+        keyboard.button(text=f"{icon} {name} ({count})", callback_data=FileCategory(category=category).pack())
     
     # Добавляем кнопку "Все файлы"
     keyboard.button(text="📋 Все файлы", callback_data="all_files")
@@ -466,20 +879,19 @@ async def show_categories(message: Message, user_id: int):
     
     await message.answer(categories_text, reply_markup=keyboard.as_markup())
 
-@router.callback_query(F.data == "upload_file")
+@callbacks.exact("upload_file")
 async def callback_upload_file(callback: CallbackQuery):
     """Callback для загрузки файла"""
     await callback.message.answer("📤 Отправьте файл, который хотите сохранить:")
     await callback.answer()
 
-@router.callback_query(F.data.startswith("category_"))
-async def callback_show_category(callback: CallbackQuery):
+@callbacks.route(FileCategory)
+async def callback_show_category(callback: CallbackQuery, callback_data: FileCategory):
     """Callback для показа файлов определенной категории"""
-    category = callback.data.replace("category_", "")
-    await show_user_files_by_category(callback.message, callback.from_user.id, category)
+    await show_user_files_by_category(callback.message, callback.from_user.id, callback_data.category)
     await callback.answer()
 
-@router.callback_query(F.data == "all_files")
+@callbacks.exact("all_files")
 async def callback_show_all_files(callback: CallbackQuery):
     """Callback для показа всех файлов"""
     await show_user_files(callback.message, callback.from_user.id)
@@ -497,7 +909,7 @@ async def show_user_files_by_category(message: Message, user_id: int, category:
     category_name = get_category_name(category)
     await show_files_list(message, files, f"📁 {category_name}:")
 
-@router.callback_query(F.data == "search_files")
+@callbacks.exact("search_files")
 async def callback_search_files(callback: CallbackQuery, state: FSMContext):
     """Callback для поиска файлов"""
     keyboard = InlineKeyboardBuilder()
@@ -509,7 +921,7 @@ async def callback_search_files(callback: CallbackQuery, state: FSMContext):
     await state.set_state(FileUploadStates.waiting_for_search_query)
     await callback.answer()
 
-@router.callback_query(F.data == "cancel_search")
+@callbacks.exact("cancel_search")
 async def callback_cancel_search(callback: CallbackQuery, state: FSMContext):
     """Callback для отмены поиска"""
     await state.clear()
@@ -522,20 +934,10 @@ async def callback_cancel_search(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer("❌ Поиск отменен.", reply_markup=keyboard.as_markup())
     await callback.answer()
 
-@router.callback_query(F.data == "show_stats")
+@callbacks.exact("show_stats")
 async def callback_show_stats(callback: CallbackQuery):
     """Callback для показа статистики"""
-    stats = await db.get_file_stats(callback.from_user.id)
-    
-    total_size_mb = stats['total_size'] / (1024 * 1024)
-    
-    stats_text = f"""
-📊 **Ваша статистика:**
-
-📁 Всего файлов: {stats['total_files']}
-💾 Общий размер: {total_size_mb:.2f} MB
-📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}
-    """
+    stats_text = await build_stats_text(callback.from_user.id)
     
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
@@ -543,7 +945,7 @@ async def callback_show_stats(callback: CallbackQuery):
     await callback.message.answer(stats_text, reply_markup=keyboard.as_markup())
     await callback.answer()
 
-@router.callback_query(F.data == "main_menu")
+@callbacks.exact("main_menu")
 async def callback_main_menu(callback: CallbackQuery):
     """Callback для возврата в главное меню"""
     welcome_text = """
@@ -572,7 +974,7 @@ async def callback_main_menu(callback: CallbackQuery):
     await callback.message.answer(welcome_text, reply_markup=keyboard.as_markup())
     await callback.answer()
 
-@router.callback_query(F.data == "cancel_upload")
+@callbacks.exact("cancel_upload")
 async def callback_cancel_upload(callback: CallbackQuery, state: FSMContext):
     """Callback для отмены загрузки файла"""
     await state.clear()
@@ -586,7 +988,7 @@ async def callback_cancel_upload(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer("❌ Загрузка файла отменена.", reply_markup=keyboard.as_markup())
     await callback.answer()
 
-@router.callback_query(F.data == "skip_description")
+@callbacks.exact("skip_description")
 async def callback_skip_description(callback: CallbackQuery, state: FSMContext):
     """Callback для пропуска описания"""
     await state.update_data(description=None)
@@ -600,7 +1002,7 @@ async def callback_skip_description(callback: CallbackQuery, state: FSMContext):
     await state.set_state(FileUploadStates.waiting_for_tags)
     await callback.answer()
 
-@router.callback_query(F.data == "skip_tags")
+@callbacks.exact("skip_tags")
 async def callback_skip_tags(callback: CallbackQuery, state: FSMContext):
     """Callback для пропуска тегов"""
     await state.update_data(tags=None)
@@ -608,6 +1010,13 @@ async def callback_skip_tags(callback: CallbackQuery, state: FSMContext):
     # Получаем данные из состояния и сохраняем файл
     data = await state.get_data()
     
+    quota_error = await check_storage_quota(callback.from_user.id, data['file_size'])
+    if quota_error:
+        await state.clear()
+        await callback.message.answer(quota_error)
+        await callback.answer()
+        return
+    
     # Сохраняем файл в базу данных
     result = await db.add_file(
         file_id=data['file_id'],
@@ -619,7 +1028,8 @@ async def callback_skip_tags(callback: CallbackQuery, state: FSMContext):
         description=data['description'],
         tags=None,
         message_id=data['message_id'],
-        chat_id=data['chat_id']
+        chat_id=data['chat_id'],
+        media_kind=data.get('media_kind')
     )
     
     # Создаем клавиатуру с кнопками навигации
@@ -658,18 +1068,10 @@ async def callback_skip_tags(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await callback.answer()
 
-@router.callback_query(F.data.startswith("download_"))
-async def callback_download_file(callback: CallbackQuery):
+@callbacks.route(DownloadFile)
+async def callback_download_file(callback: CallbackQuery, callback_data: DownloadFile):
     """Callback для скачивания файла"""
-    record_id = callback.data.replace("download_", "")
-    
-    # Проверяем, не является ли это ссылкой на общий файл
-    if record_id.startswith("shared_"):
-        logger.info(f"Обнаружен callback для скачивания общего файла: {record_id}")
-        # Обрабатываем как общий файл
-        share_id = record_id.replace("shared_", "")
-        await callback_download_shared_file(callback, share_id)
-        return
+    record_id = callback_data.record_id
     
     # Добавляем отладочную информацию
     logger.info(f"Попытка скачивания файла с record_id: {record_id}")
@@ -711,10 +1113,10 @@ async def callback_download_file(callback: CallbackQuery):
         logger.error(f"Ошибка при отправке файла: {e}")
         await callback.answer("❌ Ошибка при отправке файла!")
 
-@router.callback_query(F.data.startswith("delete_") & ~F.data.startswith("delete_link_"))
-async def callback_delete_file(callback: CallbackQuery):
+@callbacks.route(DeleteFile)
+async def callback_delete_file(callback: CallbackQuery, callback_data: DeleteFile):
     """Callback для удаления файла"""
-    record_id = callback.data.replace("delete_", "")
+    record_id = callback_data.record_id
     
     # Получаем информацию о файле
     file_data = await db.get_file_by_record_id(record_id)
@@ -732,7 +1134,7 @@ async def callback_delete_file(callback: CallbackQuery):
     
     # Создаем клавиатуру подтверждения
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="✅ Да, удалить", callback_data=f"confirm_delete_{record_id}")
+    keyboard.button(text="✅ Да, удалить", callback_data=ConfirmDeleteFile(record_id=record_id).pack())
     keyboard.button(text="❌ Отмена", callback_data="cancel_delete")
     keyboard.adjust(2)
     
@@ -750,10 +1152,10 @@ async def callback_delete_file(callback: CallbackQuery):
     await callback.message.answer(confirm_text, reply_markup=keyboard.as_markup())
     await callback.answer()
 
-@router.callback_query(F.data.startswith("confirm_delete_") & ~F.data.startswith("confirm_delete_link_"))
-async def callback_confirm_delete(callback: CallbackQuery):
+@callbacks.route(ConfirmDeleteFile)
+async def callback_confirm_delete(callback: CallbackQuery, callback_data: ConfirmDeleteFile):
     """Callback для подтверждения удаления файла"""
-    record_id = callback.data.replace("confirm_delete_", "")
+    record_id = callback_data.record_id
     
     # Получаем информацию о файле
     file_data = await db.get_file_by_record_id(record_id)
@@ -795,10 +1197,10 @@ async def callback_confirm_delete(callback: CallbackQuery):
     else:
         await callback.answer("❌ Ошибка при удалении файла!")
 
-@router.callback_query(F.data.startswith("share_"))
-async def callback_share_file(callback: CallbackQuery):
+@callbacks.route(ShareFile)
+async def callback_share_file(callback: CallbackQuery, callback_data: ShareFile):
     """Callback для генерации ссылки на файл"""
-    record_id = callback.data.replace("share_", "")
+    record_id = callback_data.record_id
     
     # Получаем информацию о файле
     file_data = await db.get_file_by_record_id(record_id)
@@ -864,10 +1266,10 @@ async def callback_share_file(callback: CallbackQuery):
         await callback.answer("❌ Ошибка при создании ссылки!")
 
 
-@router.callback_query(F.data.startswith("select_file_"))
-async def callback_select_file(callback: CallbackQuery):
+@callbacks.route(SelectFile)
+async def callback_select_file(callback: CallbackQuery, callback_data: SelectFile):
     """Callback для выбора файла и отображения действий"""
-    record_id = callback.data.replace("select_file_", "")
+    record_id = callback_data.record_id
     
     # Получаем информацию о файле
     file_data = await db.get_file_by_record_id(record_id)
@@ -905,9 +1307,9 @@ async def callback_select_file(callback: CallbackQuery):
     
     # Создаем клавиатуру с действиями для выбранного файла
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="📥 Скачать", callback_data=f"download_{record_id}")
-    keyboard.button(text="🔗 Поделиться", callback_data=f"share_{record_id}")
-    keyboard.button(text="🗑️ Удалить", callback_data=f"delete_{record_id}")
+    keyboard.button(text="📥 Скачать", callback_data=DownloadFile(record_id=record_id).pack())
+    keyboard.button(text="🔗 Поделиться", callback_data=ShareFile(record_id=record_id).pack())
+    keyboard.button(text="🗑️ Удалить", callback_data=DeleteFile(record_id=record_id).pack())
     keyboard.button(text="🔙 Назад к списку", callback_data="show_files")
     keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
     keyboard.adjust(2)  # По две кнопки в строке
@@ -916,7 +1318,7 @@ async def callback_select_file(callback: CallbackQuery):
     await callback.answer("✅ Файл выбран!")
 
 
-@router.callback_query(F.data == "cancel_delete")
+@callbacks.exact("cancel_delete")
 async def callback_cancel_delete(callback: CallbackQuery):
     """Callback для отмены удаления файла"""
     await callback.answer("❌ Удаление отменено!")
@@ -998,7 +1400,7 @@ async def create_files_export(user_id: int, files: list) -> tuple[str, io.BytesI
     
     return filename, csv_bytes
 
-@router.callback_query(F.data == "export_files")
+@callbacks.exact("export_files")
 async def callback_export_files(callback: CallbackQuery):
     """Callback для экспорта файлов"""
     user_id = callback.from_user.id
@@ -1037,6 +1439,180 @@ async def callback_export_files(callback: CallbackQuery):
         logger.error(f"Ошибка при создании экспорта: {e}")
         await callback.answer("❌ Ошибка при создании экспорта!")
 
+async def run_cached_search(user_id: int, kind: str, query: str):
+    """
+    Выполнить поиск файлов ("f") или ссылок ("l") с кэшированием списка ID.
+
+    Если точный поиск ничего не нашел, используется нечеткий поиск с учетом опечаток.
+    """
+    query = normalize_query(query)
+    version = db.get_library_version(user_id)
+    cached = search_cache.get(user_id, kind, query, version)
+    if cached is not None:
+        return cached
+    
+    if kind == "f":
+        ids = await db.search_file_ids(user_id, query)
+        fuzzy = not ids
+        if fuzzy:
+            ids = await db.fuzzy_search_file_ids(user_id, query)
+    else:
+        ids = await db.search_user_link_ids(user_id, query)
+        fuzzy = not ids
+        if fuzzy:
+            ids = await db.fuzzy_search_user_link_ids(user_id, query)
+    
+    return search_cache.put(user_id, kind, query, ids, fuzzy, version)
+
+async def show_search_page(message: Message, user_id: int, result, page: int, edit: bool = False):
+    """Показать страницу закэшированных результатов поиска, загружая из БД только ее записи"""
+    page_size = FILES_PAGE_SIZE if result.kind == "f" else LINKS_PAGE_SIZE
+    page_count = result.page_count(page_size)
+    page = max(0, min(page, page_count - 1))
+    
+    if result.fuzzy:
+        title = f"🔍 Возможно, вы искали: '{result.query}'"
+    else:
+        title = f"🔍 Результаты поиска: '{result.query}'"
+    if page_count > 1:
+        title += f" (стр. {page + 1}/{page_count})"
+    
+    pagination = (result.token, page, page_count)
+    if result.kind == "f":
+        files = await db.get_files_by_record_ids(user_id, result.page_ids(page, page_size))
+        await show_files_list(message, files, title, pagination, edit)
+    else:
+        links = await db.get_user_links_by_ids(user_id, result.page_ids(page, page_size))
+        await show_links_list(message, links, title, pagination, edit)
+
+def add_pagination_buttons(keyboard: InlineKeyboardBuilder, kind: str, token: int, page: int, page_count: int):
+    """Добавить кнопки перехода между страницами результатов поиска"""
+    if page > 0:
+        keyboard.button(text="⬅️ Назад", callback_data=SearchPage(kind=kind, token=token, page=page - 1).pack())
+    if page < page_count - 1:
+        keyboard.button(text="Вперед ➡️", callback_data=SearchPage(kind=kind, token=token, page=page + 1).pack())
+
+@callbacks.route(SearchPage)
+async def callback_search_page(callback: CallbackQuery, callback_data: SearchPage):
+    """Callback для перехода между страницами результатов поиска"""
+    user_id = callback.from_user.id
+    
+    result = search_cache.get_by_token(callback_data.token, user_id)
+    if result is None:
+        await callback.answer("⚠️ Результаты поиска устарели, повторите поиск")
+        return
+    
+    if result.version != db.get_library_version(user_id):
+        # Библиотека изменилась - повторяем поиск по тому же запросу
+        result = await run_cached_search(user_id, result.kind, result.query)
+    
+    if not result.ids:
+        await callback.answer("🔍 По этому запросу больше ничего не найдено")
+        return
+    
+    await show_search_page(callback.message, user_id, result, callback_data.page, edit=True)
+    await callback.answer()
+
+@router.inline_query()
+async def handle_inline_query(inline_query: InlineQuery):
+    """Инлайн-поиск по файлам и ссылкам пользователя из любого чата"""
+    user_id = inline_query.from_user.id
+    query = normalize_query(inline_query.query)
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    version = db.get_library_version(user_id)
+    
+    result = search_cache.get(user_id, "i", query, version)
+    if result is None:
+        if offset == 0:
+            # Запросы приходят на каждое нажатие клавиши - ждем паузу в наборе
+            # и не отвечаем на запрос, если за это время пришел более новый
+            inline_latest_queries[user_id] = inline_query.id
+            await asyncio.sleep(Config.INLINE_DEBOUNCE_MS / 1000)
+            if inline_latest_queries.get(user_id) != inline_query.id:
+                return
+            del inline_latest_queries[user_id]
+        
+        if query:
+            file_ids = await db.prefix_search_file_ids(user_id, query, INLINE_MAX_RESULTS)
+            link_ids = await db.prefix_search_user_link_ids(user_id, query, INLINE_MAX_RESULTS)
+        else:
+            file_ids = await db.get_recent_file_ids(user_id, INLINE_PAGE_SIZE)
+            link_ids = []
+        ids = ([("f", record_id) for record_id in file_ids] + [("l", link_id) for link_id in link_ids])[:INLINE_MAX_RESULTS]
+        result = search_cache.put(user_id, "i", query, ids, False, version)
+    
+    page_ids = result.ids[offset:offset + INLINE_PAGE_SIZE]
+    files = await db.get_files_by_record_ids(user_id, [item_id for kind, item_id in page_ids if kind == "f"])
+    links = await db.get_user_links_by_ids(user_id, [item_id for kind, item_id in page_ids if kind == "l"])
+    media_kinds = await db.get_file_media_kinds(user_id, [row[0] for row in files])
+    rows = {("f", row[0]): row for row in files}
+    rows.update({("l", row[0]): row for row in links})
+    
+    results = []
+    for key in page_ids:
+        row = rows.get(key)
+        if row is None:
+            continue
+        if key[0] == "f":
+            media_kind = media_kinds.get(key[1])
+            if media_kind == "unknown":
+                # Старый файл, про который неизвестно, отправлять его документом или медиа
+                continue
+            results.append(build_inline_file_result(row, media_kind))
+        else:
+            results.append(build_inline_link_result(row))
+    
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(result.ids) else ""
+    await inline_query.answer(
+        results,
+        cache_time=Config.INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=next_offset
+    )
+
+def build_inline_file_result(file_data, media_kind: str = None):
+    """
+    Создать инлайн-результат для сохраненного файла (отправляется по file_id без загрузки).
+
+    Вид результата выбирается по виду медиа, с которым файл был получен, а не по
+    расширению: .jpg, загруженный документом, нельзя отправить как фото, а
+    Telegram отклоняет весь ответ из-за одного неверного результата.
+    """
+    record_id, file_id, file_name, file_size, file_type, category, _, upload_date, description, tags, message_id, chat_id = file_data
+    result_id = f"f{record_id}"
+    caption = f"📄 {file_name}"
+    
+    if media_kind == "photo":
+        return InlineQueryResultCachedPhoto(id=result_id, photo_file_id=file_id, title=file_name, caption=caption)
+    elif media_kind == "video":
+        return InlineQueryResultCachedVideo(id=result_id, video_file_id=file_id, title=file_name, caption=caption)
+    elif media_kind == "audio":
+        return InlineQueryResultCachedAudio(id=result_id, audio_file_id=file_id, caption=caption)
+    elif media_kind == "voice":
+        return InlineQueryResultCachedVoice(id=result_id, voice_file_id=file_id, title=file_name, caption=caption)
+    
+    details = format_file_size(file_size)
+    if tags:
+        details += f" | 🏷️ {tags}"
+    return InlineQueryResultCachedDocument(
+        id=result_id,
+        title=file_name,
+        document_file_id=file_id,
+        description=details,
+        caption=caption
+    )
+
+def build_inline_link_result(link):
+    """Создать инлайн-результат для сохраненной ссылки"""
+    link_id, title, url, description, category, tags, created_date = link
+    return InlineQueryResultArticle(
+        id=f"l{link_id}",
+        title=f"{get_link_category_icon(category)} {title}",
+        description=url,
+        url=url,
+        input_message_content=InputTextMessageContent(message_text=f"🔗 {title}\n{url}")
+    )
+
 async def show_user_files(message: Message, user_id: int):
     """Показать файлы пользователя"""
     files = await db.get_user_files(user_id)
@@ -1047,13 +1623,14 @@ async def show_user_files(message: Message, user_id: int):
     
     await show_files_list(message, files, "📁 Ваши файлы:")
 
-async def show_files_list(message: Message, files: list, title: str):
-    """Показать список файлов"""
+async def show_files_list(message: Message, files: list, title: str, pagination: tuple = None, edit: bool = False):
+    """Показать список файлов (pagination - (токен, страница, всего страниц) для результатов поиска)"""
     files_text = title + "\n\n"
     
     keyboard = InlineKeyboardBuilder()
+    first_number = pagination[1] * FILES_PAGE_SIZE + 1 if pagination else 1
     
-    for i, file_data in enumerate(files[:8], 1):  # Показываем первые 8 файлов (лимит кнопок)
+    for i, file_data in enumerate(files[:8], first_number):  # Показываем первые 8 файлов (лимит кнопок)
         record_id, file_id, file_name, file_size, file_type, category, _, upload_date, description, tags, message_id, chat_id = file_data
         
         file_size_mb = file_size / (1024 * 1024)
@@ -1072,18 +1649,24 @@ async def show_files_list(message: Message, files: list, title: str):
         
         # Добавляем только кнопку "Выбрать" для каждого файла
         short_name = file_name[:12] if len(file_name) > 12 else file_name
-        keyboard.button(text=f"📥 {short_name}", callback_data=f"download_{record_id}")
-        keyboard.button(text=f"👆 Выбрать", callback_data=f"select_file_{record_id}")
+        keyboard.button(text=f"📥 {short_name}", callback_data=DownloadFile(record_id=record_id).pack())
+        keyboard.button(text=f"👆 Выбрать", callback_data=SelectFile(record_id=record_id).pack())
     
     if len(files) > 8:
         files_text += f"... и еще {len(files) - 8} файлов"
     
+    if pagination:
+        add_pagination_buttons(keyboard, "f", *pagination)
+    
     # Добавляем общие кнопки
     keyboard.button(text="🔙 Назад к категориям", callback_data="show_files")
     keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
     keyboard.adjust(2)  # По две кнопки в строке
     
-    await message.answer(files_text, reply_markup=keyboard.as_markup())
+    if edit:
+        await message.edit_text(files_text, reply_markup=keyboard.as_markup())
+    else:
+        await message.answer(files_text, reply_markup=keyboard.as_markup())
 
 async def handle_shared_file_download(message: Message, share_id: str):
     """Обработчик скачивания файла по ссылке"""
@@ -1125,7 +1708,7 @@ async def handle_shared_file_download(message: Message, share_id: str):
         
         # Создаем клавиатуру для скачивания
         keyboard = InlineKeyboardBuilder()
-        keyboard.button(text="📥 Скачать файл", callback_data=f"download_shared_{share_id}")
+        keyboard.button(text="📥 Скачать файл", callback_data=DownloadShared(share_id=share_id).pack())
         keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
         keyboard.adjust(1)
         
@@ -1197,11 +1780,8 @@ async def get_direct_file_url(file_id: str) -> str:
     
     return None
 
-async def callback_download_shared_file(callback: CallbackQuery, share_id: str = None):
+async def callback_download_shared_file(callback: CallbackQuery, share_id: str):
     """Callback для скачивания файла по ссылке"""
-    if share_id is None:
-        share_id = callback.data.replace("download_shared_", "")
-    
     logger.info(f"Попытка скачивания файла по ссылке с share_id: {share_id}")
     
     try:
@@ -1247,14 +1827,13 @@ async def callback_download_shared_file(callback: CallbackQuery, share_id: str =
         logger.error(f"Ошибка при скачивании файла по ссылке: {e}")
         await callback.answer("❌ Ошибка при скачивании файла!")
 
-@router.callback_query(F.data.startswith("download_shared_"))
-async def callback_download_shared_file_handler(callback: CallbackQuery):
+@callbacks.route(DownloadShared)
+async def callback_download_shared_file_handler(callback: CallbackQuery, callback_data: DownloadShared):
     """Обработчик для скачивания файла по общей ссылке"""
-    share_id = callback.data.replace("download_shared_", "")
-    await callback_download_shared_file(callback, share_id)
+    await callback_download_shared_file(callback, callback_data.share_id)
 
 # Обработчики для работы со ссылками
-@router.callback_query(F.data == "show_links")
+@callbacks.exact("show_links")
 async def callback_show_links(callback: CallbackQuery):
     """Показать меню ссылок"""
     await show_link_categories(callback.message, callback.from_user.id)
@@ -1266,10 +1845,11 @@ async def show_link_categories(message: Message, user_id: int):
     
     if not categories:
         keyboard = InlineKeyboardBuilder()
+        keyboard.button(text="📥 Импорт закладок", callback_data="import_links")
         keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
         keyboard.adjust(1)
         
-        await message.answer("📝 У вас пока нет сохраненных ссылок.\n\n🔗 Чтобы добавить ссылку, просто отправьте ее в чат!", reply_markup=keyboard.as_markup())
+        await message.answer("📝 У вас пока нет сохраненных ссылок.\n\n🔗 Чтобы добавить ссылку, просто отправьте ее в чат или импортируйте закладки из браузера!", reply_markup=keyboard.as_markup())
         return
     
     text = "🔗 **Ваши ссылки по категориям:**\n\n"
@@ -1280,25 +1860,84 @@ async def show_link_categories(message: Message, user_id: int):
     for category, count in categories:
         category_name = get_link_category_name(category)
         icon = get_link_category_icon(category)
-        keyboard.button(text=f"{icon} {category_name} ({count})", callback_data=f"link_category_{category}")
+        keyboard.button(text=f"{icon} {category_name} ({count})", callback_data=LinkCategory(category=category).pack())
+    
+    dead_count = await db.count_dead_user_links(user_id, Config.LINK_CHECK_DEAD_AFTER)
+    if dead_count:
+        keyboard.button(text=f"💀 Нерабочие ссылки ({dead_count})", callback_data="dead_links")
     
     keyboard.button(text="🔍 Поиск ссылок", callback_data="search_links")
+    keyboard.button(text="📥 Импорт закладок", callback_data="import_links")
+    keyboard.button(text="📤 Экспорт ссылок", callback_data="export_links")
     keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
     keyboard.adjust(1)
     
     await message.answer(text, reply_markup=keyboard.as_markup())
 
-@router.callback_query(F.data == "all_links")
+def create_links_export(links: list) -> tuple[str, bytes]:
+    """
+    Создает экспорт ссылок в формате CSV.
+
+    Колонки совпадают с теми, что понимает импорт, поэтому файл можно загрузить
+    обратно через /import: категория восстановится по названию.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Название', 'Ссылка', 'Категория', 'Описание', 'Теги', 'Дата добавления'])
+    
+    for link_id, title, url, description, category, tags, created_date in links:
+        writer.writerow([
+            title,
+            url,
+            get_link_category_name(category),
+            description or '',
+            tags or '',
+            datetime.fromisoformat(created_date).strftime('%d.%m.%Y %H:%M')
+        ])
+    
+    filename = f"links_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return filename, output.getvalue().encode('utf-8')
+
+@callbacks.exact("export_links")
+async def callback_export_links(callback: CallbackQuery):
+    """Экспорт всех ссылок пользователя в CSV"""
+    user_id = callback.from_user.id
+    links = await db.get_user_links(user_id)
+    
+    if not links:
+        await callback.answer("🔗 У вас нет ссылок для экспорта!")
+        return
+    
+    filename, csv_bytes = create_links_export(links)
+    await callback.message.answer_document(
+        document=BufferedInputFile(csv_bytes, filename=filename),
+        caption=f"📤 **Экспорт ссылок**\n\n🔗 Всего ссылок: {len(links)}\n\nФайл можно загрузить обратно командой /import"
+    )
+    await callback.answer()
+    logger.info(f"Пользователь {user_id} экспортировал {len(links)} ссылок")
+
+@callbacks.exact("all_links")
 async def callback_show_all_links(callback: CallbackQuery):
     """Показать все ссылки пользователя"""
     await show_user_links_by_category(callback.message, callback.from_user.id, None)
     await callback.answer()
 
-@router.callback_query(F.data.startswith("link_category_"))
-async def callback_show_link_category(callback: CallbackQuery):
+@callbacks.exact("dead_links")
+async def callback_show_dead_links(callback: CallbackQuery):
+    """Показать ссылки, которые перестали открываться"""
+    links = await db.get_dead_user_links(callback.from_user.id, Config.LINK_CHECK_DEAD_AFTER)
+    
+    if not links:
+        await callback.answer("✅ Нерабочих ссылок нет")
+        return
+    
+    await show_links_list(callback.message, links, "💀 Нерабочие ссылки")
+    await callback.answer()
+
+@callbacks.route(LinkCategory)
+async def callback_show_link_category(callback: CallbackQuery, callback_data: LinkCategory):
     """Показать ссылки определенной категории"""
-    category = callback.data.replace("link_category_", "")
-    await show_user_links_by_category(callback.message, callback.from_user.id, category)
+    await show_user_links_by_category(callback.message, callback.from_user.id, callback_data.category)
     await callback.answer()
 
 async def show_user_links_by_category(message: Message, user_id: int, category: str = None):
@@ -1322,11 +1961,12 @@ async def show_user_links_by_category(message: Message, user_id: int, category:
     
     await show_links_list(message, links, title)
 
-async def show_links_list(message: Message, links: list, title: str):
-    """Показать список ссылок"""
+async def show_links_list(message: Message, links: list, title: str, pagination: tuple = None, edit: bool = False):
+    """Показать список ссылок (pagination - (токен, страница, всего страниц) для результатов поиска)"""
     text = f"{title}\n\n"
+    first_number = pagination[1] * LINKS_PAGE_SIZE + 1 if pagination else 1
     
-    for i, link in enumerate(links[:10], 1):  # Показываем первые 10 ссылок
+    for i, link in enumerate(links[:10], first_number):  # Показываем первые 10 ссылок
         link_id, title, url, description, category, tags, created_date = link
         
         # Обрезаем длинные URL для отображения
@@ -1346,29 +1986,48 @@ async def show_links_list(message: Message, links: list, title: str):
     keyboard = InlineKeyboardBuilder()
     
     # Добавляем кнопки для каждой ссылки (первые 5)
-    for i, link in enumerate(links[:5], 1):
+    for i, link in enumerate(links[:5], first_number):
         link_id = link[0]
-        keyboard.button(text=f"🔗 {i}. {link[1][:20]}...", callback_data=f"view_link_{link_id}")
+        keyboard.button(text=f"🔗 {i}. {link[1][:20]}...", callback_data=ViewLink(link_id=link_id).pack())
+    
+    if pagination:
+        add_pagination_buttons(keyboard, "l", *pagination)
     
     keyboard.button(text="🔙 Назад к категориям", callback_data="show_links")
     keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
     keyboard.adjust(1)
     
-    await message.answer(text, reply_markup=keyboard.as_markup())
+    if edit:
+        await message.edit_text(text, reply_markup=keyboard.as_markup())
+    else:
+        await message.answer(text, reply_markup=keyboard.as_markup())
 
-@router.callback_query(F.data == "add_link")
+@callbacks.exact("add_link")
 async def callback_add_link(callback: CallbackQuery, state: FSMContext):
     """Начать добавление ссылки"""
     await state.clear()
     
     keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="⏭️ Пропустить", callback_data="skip_link_title")
     keyboard.button(text="❌ Отменить", callback_data="cancel_add_link")
     
-    await callback.message.answer("🔗 **Добавление новой ссылки**\n\n📝 Введите название ссылки:", reply_markup=keyboard.as_markup())
+    await callback.message.answer("🔗 **Добавление новой ссылки**\n\n📝 Введите название ссылки (или пропустите - название будет взято со страницы):", reply_markup=keyboard.as_markup())
     await state.set_state(FileUploadStates.waiting_for_link_title)
     await callback.answer()
 
-@router.callback_query(F.data == "cancel_add_link")
+@callbacks.exact("skip_link_title")
+async def callback_skip_link_title(callback: CallbackQuery, state: FSMContext):
+    """Пропустить название ссылки - оно будет получено со страницы"""
+    await state.update_data(title=None)
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отменить", callback_data="cancel_add_link")
+    
+    await callback.message.answer("🔗 Теперь введите URL ссылки:", reply_markup=keyboard.as_markup())
+    await state.set_state(FileUploadStates.waiting_for_link_url)
+    await callback.answer()
+
+@callbacks.exact("cancel_add_link")
 async def callback_cancel_add_link(callback: CallbackQuery, state: FSMContext):
     """Отменить добавление ссылки"""
     await state.clear()
@@ -1396,7 +2055,7 @@ async def handle_link_url(message: Message, state: FSMContext):
         await message.answer("❌ Пожалуйста, введите корректный URL (начинающийся с http:// или https://)")
         return
     
-    await state.update_data(url=url)
+    await state.update_data(url=canonicalize_url(url))
     
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="⏭️ Пропустить", callback_data="skip_link_description")
@@ -1405,24 +2064,13 @@ async def handle_link_url(message: Message, state: FSMContext):
     await message.answer("📝 Добавьте описание ссылки (или отправьте пустое сообщение для пропуска):", reply_markup=keyboard.as_markup())
     await state.set_state(FileUploadStates.waiting_for_link_description)
 
-@router.callback_query(F.data == "skip_link_description")
+@callbacks.exact("skip_link_description")
 async def callback_skip_link_description(callback: CallbackQuery, state: FSMContext):
     """Пропустить описание ссылки"""
     await state.update_data(description=None)
     
     # Показываем выбор категории
-    keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="📁 Общие", callback_data="link_cat_general")
-    keyboard.button(text="🌐 Веб-сайты", callback_data="link_cat_web")
-    keyboard.button(text="📚 Образование", callback_data="link_cat_education")
-    keyboard.button(text="💼 Работа", callback_data="link_cat_work")
-    keyboard.button(text="🎵 Развлечения", callback_data="link_cat_entertainment")
-    keyboard.button(text="🛒 Покупки", callback_data="link_cat_shopping")
-    keyboard.button(text="❌ Отменить", callback_data="cancel_add_link")
-    keyboard.adjust(2)
-    
-    await callback.message.answer("📂 Выберите категорию для ссылки:", reply_markup=keyboard.as_markup())
-    await state.set_state(FileUploadStates.waiting_for_link_category)
+    await ask_link_category(callback.message, state, callback.from_user.id)
     await callback.answer()
 
 @router.message(FileUploadStates.waiting_for_link_description)
@@ -1432,24 +2080,47 @@ async def handle_link_description(message: Message, state: FSMContext):
     await state.update_data(description=description)
     
     # Показываем выбор категории
+    await ask_link_category(message, state, message.from_user.id)
+
+async def ask_link_category(message: Message, state: FSMContext, user_id: int):
+    """Предложить выбрать категорию ссылки (категория, определенная по домену, идет первой)"""
+    data = await state.get_data()
+    overrides = await db.get_link_category_overrides(user_id)
+    suggested = link_classifier.classify(data.get('url', ''), overrides)
+    
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="📁 Общие", callback_data="link_cat_general")
-    keyboard.button(text="🌐 Веб-сайты", callback_data="link_cat_web")
-    keyboard.button(text="📚 Образование", callback_data="link_cat_education")
-    keyboard.button(text="💼 Работа", callback_data="link_cat_work")
-    keyboard.button(text="🎵 Развлечения", callback_data="link_cat_entertainment")
-    keyboard.button(text="🛒 Покупки", callback_data="link_cat_shopping")
+    for category in sorted(LINK_CATEGORIES, key=lambda category: category != suggested):
+        mark = "✨ " if category == suggested else ""
+        keyboard.button(
+            text=f"{mark}{get_link_category_icon(category)} {get_link_category_name(category)}",
+            callback_data=ChooseLinkCategory(category=category).pack()
+        )
     keyboard.button(text="❌ Отменить", callback_data="cancel_add_link")
     keyboard.adjust(2)
     
     await message.answer("📂 Выберите категорию для ссылки:", reply_markup=keyboard.as_markup())
     await state.set_state(FileUploadStates.waiting_for_link_category)
 
-@router.callback_query(F.data.startswith("link_cat_"))
-async def callback_link_category(callback: CallbackQuery, state: FSMContext):
+async def learn_link_category(user_id: int, url: str, category: str):
+    """Запомнить категорию, которую пользователь выбрал для домена ссылки"""
+    host = get_host(url)
+    if not host:
+        return
+    overrides = await db.get_link_category_overrides(user_id)
+    if link_classifier.classify(url, overrides) == category:
+        return
+    
+    # Если без личного правила для домена категория угадывается, достаточно его удалить
+    if host in overrides:
+        await db.set_link_category_override(user_id, host, None)
+        if link_classifier.classify(url, overrides) == category:
+            return
+    await db.set_link_category_override(user_id, host, category)
+
+@callbacks.route(ChooseLinkCategory)
+async def callback_link_category(callback: CallbackQuery, callback_data: ChooseLinkCategory, state: FSMContext):
     """Обработка выбора категории ссылки"""
-    category = callback.data.replace("link_cat_", "")
-    await state.update_data(category=category)
+    await state.update_data(category=callback_data.category)
     
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="⏭️ Пропустить", callback_data="skip_link_tags")
@@ -1459,7 +2130,7 @@ async def callback_link_category(callback: CallbackQuery, state: FSMContext):
     await state.set_state(FileUploadStates.waiting_for_link_tags)
     await callback.answer()
 
-@router.callback_query(F.data == "skip_link_tags")
+@callbacks.exact("skip_link_tags")
 async def callback_skip_link_tags(callback: CallbackQuery, state: FSMContext):
     """Пропустить теги ссылки"""
     await state.update_data(tags=None)
@@ -1513,9 +2184,12 @@ async def save_link(callback, state: FSMContext):
         await callback.message.answer(duplicate_text, reply_markup=keyboard.as_markup())
         return
     
+    # Без названия сохраняем временное из URL, настоящее подставится в фоне
+    title = data.get('title') or extract_title_from_url(data['url'])
+    
     result = await db.add_user_link(
         user_id=callback.from_user.id,
-        title=data['title'],
+        title=title,
         url=data['url'],
         description=data.get('description'),
         category=data.get('category', 'general'),
@@ -1530,10 +2204,15 @@ async def save_link(callback, state: FSMContext):
     keyboard.adjust(1)
     
     if result:
+        if not data.get('title'):
+            schedule_title_fetch(callback.from_user.id, data['url'], title)
+        if data.get('category'):
+            await learn_link_category(callback.from_user.id, data['url'], data['category'])
+        
         success_text = f"""
 ✅ **Ссылка успешно сохранена!**
 
-📝 Название: {data['title']}
+📝 Название: {title}
 🔗 URL: {data['url']}
 📂 Категория: {get_link_category_name(data.get('category', 'general'))}
 📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}
@@ -1542,10 +2221,10 @@ async def save_link(callback, state: FSMContext):
     else:
         await callback.message.answer("❌ Ошибка при сохранении ссылки. Попробуйте еще раз.", reply_markup=keyboard.as_markup())
 
-@router.callback_query(F.data.startswith("view_link_"))
-async def callback_view_link(callback: CallbackQuery):
+@callbacks.route(ViewLink)
+async def callback_view_link(callback: CallbackQuery, callback_data: ViewLink):
     """Просмотр конкретной ссылки"""
-    link_id = int(callback.data.replace("view_link_", ""))
+    link_id = callback_data.link_id
     
     link = await db.get_user_link_by_id(link_id, callback.from_user.id)
     
@@ -1570,9 +2249,20 @@ async def callback_view_link(callback: CallbackQuery):
     if tags:
         text += f"🏷️ Теги: {tags}\n\n"
     
+    check_info = await db.get_link_check_info(link_id)
+    if check_info and check_info[3]:
+        status, latency_ms, failures, last_checked = check_info
+        if failures and failures >= Config.LINK_CHECK_DEAD_AFTER:
+            state_text = f"💀 не открывается ({status or 'нет ответа'})"
+        elif failures:
+            state_text = f"⚠️ не открылась при последней проверке ({status or 'нет ответа'})"
+        else:
+            state_text = f"✅ доступна ({status}, {latency_ms} мс)"
+        text += f"🩺 Проверка {last_checked[:10]}: {state_text}\n\n"
+    
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="🔗 Открыть ссылку", url=url)
-    keyboard.button(text="🗑️ Удалить", callback_data=f"delete_link_{link_id}")
+    keyboard.button(text="🗑️ Удалить", callback_data=DeleteLink(link_id=link_id).pack())
     keyboard.button(text="🔙 Назад", callback_data="show_links")
     keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
     keyboard.adjust(1)
@@ -1580,10 +2270,10 @@ async def callback_view_link(callback: CallbackQuery):
     await callback.message.answer(text, reply_markup=keyboard.as_markup())
     await callback.answer()
 
-@router.callback_query(F.data.startswith("delete_link_"))
-async def callback_delete_link(callback: CallbackQuery):
+@callbacks.route(DeleteLink)
+async def callback_delete_link(callback: CallbackQuery, callback_data: DeleteLink):
     """Удаление ссылки"""
-    link_id = int(callback.data.replace("delete_link_", ""))
+    link_id = callback_data.link_id
     
     link = await db.get_user_link_by_id(link_id, callback.from_user.id)
     
@@ -1592,17 +2282,17 @@ async def callback_delete_link(callback: CallbackQuery):
         return
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="✅ Да, удалить", callback_data=f"confirm_delete_link_{link_id}")
+    keyboard.button(text="✅ Да, удалить", callback_data=ConfirmDeleteLink(link_id=link_id).pack())
     keyboard.button(text="❌ Отменить", callback_data="show_links")
     keyboard.adjust(1)
     
     await callback.message.answer(f"🗑️ Вы уверены, что хотите удалить ссылку **{link[1]}**?", reply_markup=keyboard.as_markup())
     await callback.answer()
 
-@router.callback_query(F.data.startswith("confirm_delete_link_"))
-async def callback_confirm_delete_link(callback: CallbackQuery):
+@callbacks.route(ConfirmDeleteLink)
+async def callback_confirm_delete_link(callback: CallbackQuery, callback_data: ConfirmDeleteLink):
     """Подтверждение удаления ссылки"""
-    link_id = int(callback.data.replace("confirm_delete_link_", ""))
+    link_id = callback_data.link_id
     
     success = await db.delete_user_link(link_id, callback.from_user.id)
     
@@ -1618,7 +2308,7 @@ async def callback_confirm_delete_link(callback: CallbackQuery):
     
     await callback.answer()
 
-@router.callback_query(F.data == "search_links")
+@callbacks.exact("search_links")
 async def callback_search_links(callback: CallbackQuery, state: FSMContext):
     """Поиск ссылок"""
     keyboard = InlineKeyboardBuilder()
@@ -1638,9 +2328,9 @@ async def handle_link_search_query(message: Message, state: FSMContext):
         await message.answer("❌ Поисковый запрос не может быть пустым")
         return
     
-    links = await db.search_user_links(message.from_user.id, query)
+    result = await run_cached_search(message.from_user.id, "l", query)
     
-    if not links:
+    if not result.ids:
         keyboard = InlineKeyboardBuilder()
         keyboard.button(text="🔗 Мои ссылки", callback_data="show_links")
         keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
@@ -1649,7 +2339,7 @@ async def handle_link_search_query(message: Message, state: FSMContext):
         await message.answer(f"🔍 По запросу '{query}' ничего не найдено.", reply_markup=keyboard.as_markup())
         return
     
-    await show_links_list(message, links, f"🔍 Результаты поиска: '{query}'")
+    await show_search_page(message, message.from_user.id, result, 0)
 
 @router.message()
 async def handle_all_messages(message: Message, state: FSMContext):
@@ -1669,10 +2359,11 @@ async def handle_all_messages(message: Message, state: FSMContext):
             await handle_shared_file_download(message, share_id)
             return
     
-    # Проверяем, является ли сообщение URL
-    if message.text and is_valid_url(message.text.strip()):
-        logger.info(f"Обнаружен URL в сообщении: {message.text}")
-        await handle_url_message(message, state)
+    # Ищем ссылки по сущностям, которые разметил Telegram (в тексте или подписи)
+    urls = extract_urls(message)
+    if urls:
+        logger.info(f"Обнаружено ссылок в сообщении: {len(urls)}")
+        await handle_url_message(message, state, urls)
         return
     
     # Если сообщение пустое или None, просто логируем
@@ -1680,31 +2371,77 @@ async def handle_all_messages(message: Message, state: FSMContext):
         logger.info("Получено пустое сообщение (не текстовое), не обрабатываем")
         return
 
-def is_valid_url(url: str) -> bool:
-    """Проверяет, является ли строка валидным URL"""
-    import re
-    # Простая проверка URL
-    url_pattern = re.compile(
-        r'^https?://'  # http:// или https://
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # домен
-        r'localhost|'  # localhost
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # IP
-        r'(?::\d+)?'  # порт
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-    return bool(url_pattern.match(url))
-
-async def handle_url_message(message: Message, state: FSMContext):
-    """Обработчик сообщений с URL"""
-    url = message.text.strip()
-    
+def joins_url_batch(message: Message) -> bool:
+    """
+    Дополняет ли сообщение уже начатую пачку ссылок. Такие сообщения не
+    расходуют лимит запросов: пересланная пачка из сотен ссылок приходит
+    сотнями обновлений, а обработка каждого - только добавление в список.
+    """
+    batch = pending_url_batches.get(message.from_user.id)
+    return batch is not None and len(batch["urls"]) < URL_BATCH_MAX_URLS and bool(extract_urls(message))
+
+async def handle_url_message(message: Message, state: FSMContext, urls: list):
+    """Обработчик сообщений с URL: копит ссылки из пачки сообщений и предлагает добавить их разом"""
     # Проверяем, не находимся ли мы в состоянии ожидания ввода
     current_state = await state.get_state()
     if current_state:
         logger.info(f"Пользователь в состоянии {current_state}, пропускаем обработку URL")
         return
     
-    # Извлекаем название из URL
-    title = extract_title_from_url(url)
+    user_id = message.from_user.id
+    batch = pending_url_batches.get(user_id)
+    if batch is None:
+        batch = pending_url_batches[user_id] = {"urls": [], "task": None}
+    
+    for url in urls:
+        if url not in batch["urls"]:
+            batch["urls"].append(url)
+    
+    # Пересланные пачкой сообщения приходят отдельными обновлениями -
+    # показываем одно подтверждение, когда они перестанут поступать
+    if batch["task"] is not None:
+        batch["task"].cancel()
+    batch["task"] = task = asyncio.create_task(confirm_url_batch(message, state, user_id))
+    url_batch_tasks.add(task)
+    task.add_done_callback(url_batch_tasks.discard)
+
+async def confirm_url_batch(message: Message, state: FSMContext, user_id: int):
+    """Предложить добавить накопленные ссылки (один запрос к БД на всю пачку)"""
+    await asyncio.sleep(URL_BATCH_DELAY)
+    batch = pending_url_batches.pop(user_id, None)
+    if not batch:
+        return
+    
+    try:
+        await send_url_batch_confirmation(message, state, user_id, batch["urls"])
+    except Exception as e:
+        logger.error(f"Ошибка при обработке ссылок пользователя {user_id}: {e}")
+
+async def send_url_batch_confirmation(message: Message, state: FSMContext, user_id: int, urls: list):
+    """Отправить подтверждение добавления новых ссылок из пачки"""
+    
+    existing = await db.get_existing_link_urls(user_id, urls)
+    new_urls = []
+    seen_hashes = set()
+    for url in urls:
+        # Ссылки из разных сообщений пачки могут вести на одну страницу
+        key = url_hash(url)
+        if url not in existing and key not in seen_hashes:
+            seen_hashes.add(key)
+            new_urls.append(url)
+    
+    if not new_urls:
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text="🔗 Мои ссылки", callback_data="show_links")
+        keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
+        keyboard.adjust(1)
+        
+        text = "⚠️ **Ссылка уже существует!**" if len(urls) == 1 else f"⚠️ **Все ссылки ({len(urls)}) уже есть в вашей коллекции!**"
+        await message.answer(text, reply_markup=keyboard.as_markup())
+        return
+    
+    overrides = await db.get_link_category_overrides(user_id)
+    pending = [(url, extract_title_from_url(url), link_classifier.classify(url, overrides)) for url in new_urls]
     
     # Создаем клавиатуру для подтверждения
     keyboard = InlineKeyboardBuilder()
@@ -1712,62 +2449,76 @@ async def handle_url_message(message: Message, state: FSMContext):
     keyboard.button(text="❌ Нет, отменить", callback_data="cancel_add_url")
     keyboard.adjust(2)
     
-    # Сохраняем URL в состоянии
-    await state.update_data(
-        url=url,
-        title=title,
-        description=None,
-        category='general',
-        tags=None
-    )
+    # Сохраняем ссылки в состоянии
+    await state.update_data(pending_urls=pending)
     
-    confirm_text = f"""
+    if len(pending) == 1:
+        url, title, category = pending[0]
+        confirm_text = f"""
 🔗 **Обнаружена ссылка!**
 
 📝 Название: {title}
 🔗 URL: {url}
+📂 Категория: {get_link_category_name(category)}
 
 Хотите добавить эту ссылку в вашу коллекцию?
-    """
+        """
+    else:
+        confirm_text = f"🔗 **Обнаружено новых ссылок: {len(pending)}**\n\n"
+        for i, (url, title, category) in enumerate(pending[:10], 1):
+            display_url = url[:50] + "..." if len(url) > 50 else url
+            confirm_text += f"{i}. {get_link_category_icon(category)} {title} - {display_url}\n"
+        if len(pending) > 10:
+            confirm_text += f"... и еще {len(pending) - 10}\n"
+        if existing:
+            confirm_text += f"\n⚠️ Уже сохранено ранее: {len(existing)}\n"
+        confirm_text += "\nХотите добавить эти ссылки в вашу коллекцию?"
     
     await message.answer(confirm_text, reply_markup=keyboard.as_markup())
 
 def extract_title_from_url(url: str) -> str:
-    """Извлекает название из URL"""
+    """
+    Временное название из URL (домен и путь), пока в фоне не получено
+    настоящее название страницы
+    """
     try:
         from urllib.parse import urlparse
         parsed = urlparse(url)
-        domain = parsed.netloc
+        domain = parsed.hostname or ''
         
         # Убираем www. если есть
         if domain.startswith('www.'):
             domain = domain[4:]
         
-        # Убираем порт если есть
-        if ':' in domain:
-            domain = domain.split(':')[0]
-        
-        # Убираем .com, .ru и другие домены
-        domain = domain.split('.')[0]
+        if not domain:
+            return "Ссылка"
         
-        # Делаем первую букву заглавной
-        title = domain.capitalize()
+        # Путь помогает отличать ссылки одного сайта (github.com/owner/repo)
+        title = domain + parsed.path.rstrip('/')
         
-        return title
+        return title[:60] + "..." if len(title) > 60 else title
     except:
         return "Ссылка"
 
-@router.callback_query(F.data == "confirm_add_url")
+@callbacks.exact("confirm_add_url")
 async def callback_confirm_add_url(callback: CallbackQuery, state: FSMContext):
     """Подтверждение добавления URL"""
     data = await state.get_data()
+    pending = data.get('pending_urls') or []
     
-    # Проверяем, существует ли уже такая ссылка
-    existing_link = await db.check_link_exists(callback.from_user.id, data['url'])
+    if not pending:
+        await callback.answer("⚠️ Ссылки не найдены, отправьте их еще раз")
+        return
     
-    if existing_link:
-        # Ссылка уже существует
-        link_id, title, url, description, category, tags, created_date = existing_link
+    # Проверяем, не были ли ссылки добавлены, пока ждали подтверждения
+    existing = await db.get_existing_link_urls(callback.from_user.id, [url for url, *_ in pending])
+    new_links = [(title, url, None, category, None) for url, title, category in pending if url not in existing]
+    if not new_links:
+        # Ссылки уже существуют - показываем первую из них
+        existing_link = await db.check_link_exists(callback.from_user.id, pending[0][0])
+        link_id, title, url, description, category, tags, created_date = existing_link or (
+            None, pending[0][1], pending[0][0], None, pending[0][2], None, ''
+        )
         
         await state.clear()
         
@@ -1811,33 +2562,49 @@ async def callback_confirm_add_url(callback: CallbackQuery, state: FSMContext):
         await callback.answer("⚠️ Ссылка уже существует!")
         return
     
-    # Сохраняем ссылку в базу данных
-    result = await db.add_user_link(
-        user_id=callback.from_user.id,
-        title=data['title'],
-        url=data['url'],
-        description=data.get('description'),
-        category=data.get('category', 'general'),
-        tags=data.get('tags')
-    )
+    # Сохраняем все новые ссылки одной транзакцией
+    result = await db.add_user_links(callback.from_user.id, new_links)
     
     await state.clear()
     
+    if result:
+        for title, url, *_ in new_links:
+            schedule_title_fetch(callback.from_user.id, url, title)
+    
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="🔗 Мои ссылки", callback_data="show_links")
     keyboard.button(text="🏠 Главное меню", callback_data="main_menu")
     keyboard.adjust(1)
     
-    if result:
+    if result and len(new_links) == 1:
+        title, url, _, category, _ = new_links[0]
         success_text = f"""
 ✅ **Ссылка успешно добавлена!**
 
-📝 Название: {data['title']}
-🔗 URL: {data['url']}
-📂 Категория: {get_link_category_name(data.get('category', 'general'))}
+📝 Название: {title}
+🔗 URL: {url}
+📂 Категория: {get_link_category_name(category)}
 📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}
         """
         await callback.message.answer(success_text, reply_markup=keyboard.as_markup())
+    elif result:
+        category_counts = {}
+        for link in new_links:
+            category_counts[link[3]] = category_counts.get(link[3], 0) + 1
+        categories_text = ", ".join(
+            f"{get_link_category_icon(category)} {get_link_category_name(category)} ({count})"
+            for category, count in sorted(category_counts.items(), key=lambda item: -item[1])
+        )
+        success_text = f"""
+✅ **Ссылки успешно добавлены!**
+
+🔗 Добавлено: {result}
+📂 Категории: {categories_text}
+📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}
+        """
+        if len(new_links) < len(pending):
+            success_text += f"\n⚠️ Пропущено дубликатов: {len(pending) - len(new_links)}"
+        await callback.message.answer(success_text, reply_markup=keyboard.as_markup())
     else:
         await callback.message.answer("❌ Ошибка при сохранении ссылки. Попробуйте еще раз.", reply_markup=keyboard.as_markup())
     
@@ -1870,7 +2637,7 @@ async def callback_confirm_add_url(callback: CallbackQuery, state: FSMContext):
     
     await callback.answer()
 
-@router.callback_query(F.data == "cancel_add_url")
+@callbacks.exact("cancel_add_url")
 async def callback_cancel_add_url(callback: CallbackQuery, state: FSMContext):
     """Отмена добавления URL"""
     await state.clear()
@@ -1901,4 +2668,19 @@ async def callback_cancel_add_url(callback: CallbackQuery, state: FSMContext):
     keyboard.adjust(2)
     
     await callback.message.answer(welcome_text, reply_markup=keyboard.as_markup())
-    await callback.answer("❌ Добавление ссылки отменено") 
\ No newline at end of file
+    await callback.answer("❌ Добавление ссылки отменено") 
+
+@router.errors(ExceptionTypeFilter(DatabaseError))
+async def handle_database_error(event: ErrorEvent):
+    """Сбой БД после всех повторов: сообщаем пользователю вместо молчания или неверного ответа"""
+    if isinstance(event.exception, DatabaseBusyError):
+        text = "⏳ Бот сейчас перегружен, попробуйте еще раз через несколько секунд"
+    else:
+        text = "⚠️ Хранилище временно недоступно, попробуйте позже"
+    update = event.update
+    if update.callback_query:
+        await update.callback_query.answer(text, show_alert=True)
+    elif update.message:
+        await update.message.answer(text)
+    elif update.inline_query:
+        await update.inline_query.answer([], cache_time=1, is_personal=True)
@@ -0,0 +1,3 @@
+"""
+Middleware бота
+""" 
\ No newline at end of file
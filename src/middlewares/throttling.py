@@ -0,0 +1,282 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, InlineQuery, Message, TelegramObject
+
+from src.config.config import Config
+from src.handlers.callbacks import SearchPage, ShareFile
+
+logger = logging.getLogger(__name__)
+
+# Тяжелые действия расходуют отдельный, более строгий бюджет
+HEAVY_CALLBACKS = {"export_files"}
+HEAVY_CALLBACK_PREFIXES = {ShareFile.__prefix__, SearchPage.__prefix__}
+HEAVY_LEGACY_CALLBACK_PREFIXES = ("share_",)
+HEAVY_COMMANDS = {"/export", "/search", "/import"}
+HEAVY_STATES = {
+    "FileUploadStates:waiting_for_search_query",
+    "FileUploadStates:waiting_for_link_search_query",
+    "FileUploadStates:waiting_for_import_file",
+}
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated', 'warned')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.warned = False
+
+
+class MemoryTokenBuckets:
+    """
+    Корзины токенов в памяти процесса.
+
+    Корзины лежат в OrderedDict в порядке последнего обращения. Корзина, которая
+    простаивала дольше времени полного пополнения (idle_ttl), ничем не отличается
+    от новой, поэтому такие корзины удаляются с начала словаря без потери точности.
+    """
+
+    def __init__(self, idle_ttl: float = 3600, max_size: int = 100000):
+        self.idle_ttl = idle_ttl
+        self.max_size = max_size
+        self._buckets: "OrderedDict[Tuple, _Bucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def consume(self, key: Tuple, rate: float, burst: int) -> Tuple[float, bool]:
+        """
+        Взять токен из корзины key.
+
+        Возвращает (сколько секунд ждать, первый ли это отказ подряд);
+        0 секунд - действие разрешено.
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(burst, now)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+
+        self._evict_idle(now)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.warned = False
+            return 0.0, False
+
+        first_refusal = not bucket.warned
+        bucket.warned = True
+        return (1 - bucket.tokens) / rate if rate else 1.0, first_refusal
+
+    def _evict_idle(self, now: float):
+        while self._buckets:
+            key, oldest = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_size and now - oldest.updated < self.idle_ttl:
+                break
+            del self._buckets[key]
+
+    async def close(self):
+        pass
+
+
+# Атомарное пополнение и списание токена на стороне Redis.
+# KEYS[1] - ключ корзины; ARGV - скорость, емкость, текущее время (мс).
+# Возвращает {разрешено, ожидание в мс, первый отказ}.
+_REDIS_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 't', 'u', 'w')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+local warned = tonumber(state[3]) or 0
+tokens = math.min(burst, tokens + math.max(0, now - updated) / 1000 * rate)
+local allowed = 0
+local wait = 0
+local first = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+    warned = 0
+else
+    wait = math.ceil((1 - tokens) / rate * 1000)
+    if warned == 0 then first = 1 end
+    warned = 1
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', now, 'w', warned)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, wait, first}
+"""
+
+
+class RedisTokenBuckets:
+    """
+    Корзины токенов в Redis - общий лимит для нескольких процессов бота.
+
+    Каждая корзина - хэш с TTL, равным времени полного пополнения, поэтому
+    корзины неактивных пользователей удаляются самим Redis.
+    """
+
+    def __init__(self, redis_url: str, prefix: str, timeout: float = 1.0):
+        from redis.asyncio import Redis
+
+        # Недоступный Redis не должен надолго задерживать обработку обновлений
+        self.redis = Redis.from_url(redis_url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.prefix = prefix
+        self._script = self.redis.register_script(_REDIS_BUCKET_SCRIPT)
+
+    async def consume(self, key: Tuple, rate: float, burst: int) -> Tuple[float, bool]:
+        redis_key = f"{self.prefix}:throttle:{':'.join(str(part) for part in key)}"
+        allowed, wait_ms, first = await self._script(
+            keys=[redis_key], args=[rate, burst, int(time.time() * 1000)]
+        )
+        if int(allowed):
+            return 0.0, False
+        return int(wait_ms) / 1000, bool(int(first))
+
+    async def close(self):
+        # aclose появился в redis 5, в 4.x есть только close
+        close = getattr(self.redis, 'aclose', None) or self.redis.close
+        await close()
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты запросов каждого пользователя (outer middleware).
+
+    Сообщения и callback-запросы расходуют общий бюджет, тяжелые действия
+    (экспорт, поиск, создание ссылок, импорт) - дополнительно свой. Инлайн-запросы
+    приходят на каждое нажатие клавиши и расходуют отдельный, более щедрый бюджет.
+    Сообщения, которые дополняют уже начатую пачку ссылок (exempt), бюджет не
+    расходуют. Сверх лимита событие отбрасывается до обработчиков и запросов
+    к БД, а пользователь один раз получает короткую просьбу подождать.
+
+    Если хранилище лимитов (Redis) недоступно, лимиты временно считаются в
+    памяти процесса, а через redis_retry секунд Redis пробуется снова.
+    """
+
+    def __init__(self, rate: float, burst: int, heavy_rate: float, heavy_burst: int,
+                 inline_rate: float = None, inline_burst: int = None, buckets=None,
+                 exempt: Callable[[Message], bool] = None, redis_retry: float = 30):
+        self.rate = rate
+        self.burst = burst
+        self.heavy_rate = heavy_rate
+        self.heavy_burst = heavy_burst
+        self.inline_rate = inline_rate or rate
+        self.inline_burst = inline_burst or burst
+        self.exempt = exempt
+        self.redis_retry = redis_retry
+        self.buckets = buckets if buckets is not None else self._memory_buckets()
+        self._fallback: Optional[MemoryTokenBuckets] = None
+        self._retry_at = 0.0
+
+    @classmethod
+    def from_config(cls, exempt: Callable[[Message], bool] = None) -> "ThrottlingMiddleware":
+        buckets = None
+        if Config.THROTTLE_BACKEND == 'redis':
+            buckets = RedisTokenBuckets(Config.REDIS_URL, Config.REDIS_PREFIX)
+        return cls(
+            rate=Config.THROTTLE_RATE,
+            burst=Config.THROTTLE_BURST,
+            heavy_rate=Config.THROTTLE_HEAVY_RATE,
+            heavy_burst=Config.THROTTLE_HEAVY_BURST,
+            inline_rate=Config.THROTTLE_INLINE_RATE,
+            inline_burst=Config.THROTTLE_INLINE_BURST,
+            buckets=buckets,
+            exempt=exempt,
+            redis_retry=Config.THROTTLE_REDIS_RETRY
+        )
+
+    def _memory_buckets(self) -> MemoryTokenBuckets:
+        # Корзину можно забыть, когда пополнилась даже самая медленная из них
+        return MemoryTokenBuckets(idle_ttl=max(
+            self.burst / self.rate, self.heavy_burst / self.heavy_rate, self.inline_burst / self.inline_rate
+        ))
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is None:
+            return await handler(event, data)
+
+        if isinstance(event, InlineQuery):
+            wait, first_refusal = await self._consume((user.id, 'inline'), self.inline_rate, self.inline_burst)
+        elif isinstance(event, Message) and self.exempt is not None and self.exempt(event):
+            return await handler(event, data)
+        else:
+            wait, first_refusal = await self._consume((user.id, 'all'), self.rate, self.burst)
+        if not wait and self.is_heavy(event, data.get('raw_state')):
+            wait, first_refusal = await self._consume((user.id, 'heavy'), self.heavy_rate, self.heavy_burst)
+
+        if not wait:
+            return await handler(event, data)
+
+        logger.debug(f"Пользователь {user.id} превысил лимит запросов, ожидание {wait:.1f} сек")
+        await self._reply_slow_down(event, wait, first_refusal)
+        return None
+
+    @staticmethod
+    def is_heavy(event: TelegramObject, raw_state: Optional[str]) -> bool:
+        """Относится ли событие к тяжелым действиям"""
+        if isinstance(event, CallbackQuery):
+            data = event.data or ''
+            return (
+                data in HEAVY_CALLBACKS
+                or data.partition(':')[0] in HEAVY_CALLBACK_PREFIXES
+                or data.startswith(HEAVY_LEGACY_CALLBACK_PREFIXES)
+            )
+        if isinstance(event, Message):
+            if raw_state in HEAVY_STATES:
+                return True
+            text = event.text or ''
+            return text.startswith('/') and text.split(maxsplit=1)[0].split('@')[0] in HEAVY_COMMANDS
+        return False
+
+    async def _consume(self, key: Tuple, rate: float, burst: int) -> Tuple[float, bool]:
+        if self._fallback is None or time.monotonic() >= self._retry_at:
+            try:
+                result = await self.buckets.consume(key, rate, burst)
+            except Exception as e:
+                # Без Redis лучше ограничивать каждый процесс отдельно, чем не ограничивать вовсе
+                if self._fallback is None:
+                    logger.error(f"Ошибка хранилища лимитов, переключаемся на память процесса: {e}")
+                    self._fallback = self._memory_buckets()
+                self._retry_at = time.monotonic() + self.redis_retry
+            else:
+                if self._fallback is not None:
+                    logger.info("Хранилище лимитов снова доступно")
+                    await self._fallback.close()
+                    self._fallback = None
+                return result
+        return await self._fallback.consume(key, rate, burst)
+
+    @staticmethod
+    async def _reply_slow_down(event: TelegramObject, wait: float, first_refusal: bool):
+        text = f"⏳ Слишком много запросов. Подождите {max(1, round(wait))} сек."
+        try:
+            if isinstance(event, CallbackQuery):
+                # Ответ на callback нужен в любом случае, иначе у кнопки крутится индикатор
+                await event.answer(text)
+            elif isinstance(event, Message) and first_refusal:
+                await event.answer(text)
+            elif isinstance(event, InlineQuery):
+                await event.answer([], cache_time=1, is_personal=True)
+        except Exception as e:
+            logger.debug(f"Не удалось отправить предупреждение о лимите: {e}")
+
+    async def close(self):
+        await self.buckets.close()
+        if self._fallback is not None:
+            await self._fallback.close()
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from src.database.errors import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+# Ключ в service_state, под которым хранится update_id
+WATERMARK_KEY = 'last_update_id'
+# Сколько обновлений Telegram может прислать повторно после перезапуска: не больше
+# одного неподтвержденного ответа getUpdates, а в нем не больше 100 обновлений
+BACKLOG_WINDOW = 100
+
+
+class UpdateWatermark(BaseMiddleware):
+    """
+    Внешний middleware на dp.update: запоминает update_id, до которого
+    (включительно) все обновления обработаны, и пропускает повторы.
+
+    Telegram снова присылает после перезапуска обновления, которые бот получил,
+    но не успел подтвердить следующим getUpdates. Обновления обрабатываются
+    параллельно и заканчиваются не по порядку, поэтому граница - это самое
+    раннее еще не обработанное обновление минус один; обработанные после
+    границы обновления хранятся отдельно, пока граница до них не дойдет.
+    Граница сохраняется в service_state не чаще раза в save_interval секунд.
+    Обновления, обработка которых отменена (остановка бота по SHUTDOWN_TIMEOUT),
+    обработанными не считаются: граница остается ниже самого раннего из них,
+    и после перезапуска Telegram пришлет их снова.
+
+    Повторы по сохраненной границе пропускаются только в начале работы: пока
+    приходят обновления не дальше BACKLOG_WINDOW ниже нее. Первое обновление
+    выше границы заканчивает этот период. Обновление намного ниже границы
+    означает, что нумерация началась заново (Telegram выбирает случайный
+    update_id после недели без обновлений, или БД перенесена к другому боту),
+    и граница сбрасывается - иначе бот молча пропускал бы все новые обновления.
+    """
+
+    def __init__(self, db, save_interval: float = 1.0):
+        self.db = db
+        self.save_interval = save_interval
+        self.watermark: Optional[int] = None
+        self.skipped = 0
+        # Граница, загруженная при старте, пока идут повторно присланные обновления
+        self._backlog_until: Optional[int] = None
+        self._max_started: Optional[int] = None
+        self._in_flight: Set[int] = set()
+        self._done: Set[int] = set()
+        self._cancelled: Set[int] = set()
+        self._saved: Optional[int] = None
+        self._save_task: Optional[asyncio.Task] = None
+
+    async def load(self):
+        """Прочитать сохраненную границу (вызывается до начала polling)"""
+        value = await self.db.get_service_state(WATERMARK_KEY)
+        self.watermark = self._saved = self._backlog_until = int(value) if value else None
+        if self.watermark is not None:
+            logger.info(f"Продолжаем с обновления {self.watermark + 1}")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        update_id = event.update_id
+        if self._backlog_until is not None:
+            self._check_backlog(update_id)
+        if self._is_processed(update_id):
+            self.skipped += 1
+            logger.info(f"Обновление {update_id} уже обработано - пропускаем")
+            return None
+
+        self._in_flight.add(update_id)
+        if self._max_started is None or update_id > self._max_started:
+            self._max_started = update_id
+        try:
+            return await handler(event, data)
+        except asyncio.CancelledError:
+            self._cancelled.add(update_id)
+            raise
+        finally:
+            self._in_flight.discard(update_id)
+            if update_id not in self._cancelled:
+                self._done.add(update_id)
+            self._advance()
+
+    def _check_backlog(self, update_id: int):
+        """Закончить период повторов после перезапуска, если обновление уже не из него"""
+        if self._backlog_until - BACKLOG_WINDOW < update_id <= self._backlog_until:
+            return
+        if update_id <= self._backlog_until:
+            logger.warning(
+                f"update_id {update_id} намного меньше сохраненного {self._backlog_until} - "
+                f"нумерация обновлений началась заново, сбрасываем границу"
+            )
+            self.watermark = None
+            self._max_started = None
+            self._done.clear()
+        self._backlog_until = None
+
+    def _is_processed(self, update_id: int) -> bool:
+        return (
+            (self._backlog_until is not None and update_id <= self._backlog_until)
+            or update_id in self._in_flight
+            or update_id in self._done
+        )
+
+    def _advance(self):
+        pending = self._in_flight | self._cancelled
+        candidate = min(pending) - 1 if pending else self._max_started
+        if candidate is None or (self.watermark is not None and candidate <= self.watermark):
+            return
+        self.watermark = candidate
+        self._done = {update_id for update_id in self._done if update_id > candidate}
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self.save_interval)
+        await self.save()
+
+    async def save(self):
+        """Сохранить текущую границу, если она изменилась"""
+        watermark = self.watermark
+        if watermark is None or watermark == self._saved:
+            return
+        try:
+            if await self.db.set_service_state(WATERMARK_KEY, str(watermark)):
+                self._saved = watermark
+        except DatabaseError as e:
+            logger.error(f"Не удалось сохранить update_id {watermark}: {e}")
+
+    async def close(self):
+        """Сохранить границу при остановке бота"""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+            await asyncio.gather(self._save_task, return_exceptions=True)
+        await self.save()
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from src.monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT = registry.histogram(
+    'bot_update_queue_wait_seconds', 'Ожидание обновления в очереди пользователя и общем пуле'
+)
+UPDATES_DROPPED = registry.counter(
+    'bot_updates_dropped_total', 'Обновления, отброшенные из-за переполненной очереди пользователя'
+)
+
+
+class UserScheduler(BaseMiddleware):
+    """
+    Внешний middleware на dp.update: обновления одного пользователя
+    обрабатываются строго по очереди, разных пользователей - параллельно,
+    но не больше concurrency одновременно.
+
+    Каждое обновление aiogram уже обрабатывает в своей задаче. Задача встает
+    в очередь своего пользователя и ждет, пока закончатся его предыдущие
+    обновления, и только потом занимает место в общем пуле. Ожидающие своей
+    очереди обновления мест пула не занимают, поэтому активный пользователь
+    не задерживает остальных. Опустевшая очередь сразу удаляется.
+
+    Но каждое ожидающее обновление - это задача aiogram, и она держит место в
+    лимите tasks_concurrency_limit (UPDATES_MAX_PENDING): пока он занят, polling
+    не запрашивает новые обновления. Поэтому у пользователя может ждать и
+    выполняться не больше max_per_user обновлений, включая инлайн-запросы;
+    следующие отбрасываются сразу, не вставая в очередь. Ограничение частоты
+    запросов работает уже внутри очереди и такой поток сдержать не может.
+
+    Инлайн-запросы в очередь пользователя не встают, а только занимают место
+    в пуле: они приходят на каждое нажатие клавиши, ничего не меняют, а
+    устаревшие запросы отбрасывает пауза в handle_inline_query - в очереди
+    она бы не работала, потому что запросы доходили бы до нее по одному.
+
+    Подключается последним из внешних middleware на dp.update: трассировка и
+    граница update_id должны видеть обновление с момента поступления, а не с
+    момента, когда до него дошла очередь.
+    """
+
+    def __init__(self, concurrency: int, max_per_user: Optional[int] = None):
+        self.concurrency = concurrency
+        self.max_per_user = max_per_user
+        self.dropped = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._queues: Dict[int, Deque[asyncio.Future]] = {}
+        # Обновления пользователя в очереди и в работе, в том числе инлайн-запросы
+        self._pending: Dict[int, int] = {}
+
+    @property
+    def users(self) -> int:
+        """Пользователи, у которых есть обновления в обработке или в очереди"""
+        return len(self._queues)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        user = data.get('event_from_user')
+        if user is None:
+            return await self._run(handler, event, data, started)
+
+        pending = self._pending.get(user.id, 0)
+        if self.max_per_user is not None and pending >= self.max_per_user:
+            self.dropped += 1
+            UPDATES_DROPPED.inc()
+            logger.debug(f"У пользователя {user.id} уже {pending} обновлений в очереди - отбрасываем")
+            return None
+
+        self._pending[user.id] = pending + 1
+        try:
+            if getattr(event, 'inline_query', None) is not None:
+                return await self._run(handler, event, data, started)
+            return await self._run_in_turn(user.id, handler, event, data, started)
+        finally:
+            pending = self._pending.pop(user.id) - 1
+            if pending:
+                self._pending[user.id] = pending
+
+    async def _run(self, handler, event, data, started: float) -> Any:
+        """Занять место в общем пуле и обработать обновление"""
+        async with self._slots:
+            QUEUE_WAIT.observe(time.perf_counter() - started)
+            return await handler(event, data)
+
+    async def _run_in_turn(self, user_id: int, handler, event, data, started: float) -> Any:
+        """Дождаться окончания предыдущих обновлений пользователя и обработать это"""
+        turn = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(user_id, deque())
+        queue.append(turn)
+        try:
+            if len(queue) > 1:
+                # Очередь передаст предыдущее обновление этого пользователя, когда закончится
+                await turn
+            return await self._run(handler, event, data, started)
+        finally:
+            self._release(user_id, turn)
+
+    def _release(self, user_id: int, turn: asyncio.Future):
+        """Убрать обновление из очереди пользователя; если оно было первым - передать очередь следующему"""
+        queue = self._queues[user_id]
+        was_first = queue[0] is turn
+        queue.remove(turn)
+        if not queue:
+            del self._queues[user_id]
+        elif was_first and not queue[0].done():
+            queue[0].set_result(None)
@@ -0,0 +1,3 @@
+"""
+Мониторинг бота
+""" 
\ No newline at end of file
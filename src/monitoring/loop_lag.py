@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from src.monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = registry.summary(
+    'bot_event_loop_lag_seconds', 'Задержка планирования событийного цикла', window=3000
+)
+LOOP_STALLS = registry.counter(
+    'bot_event_loop_stalls_total', 'Блокировки событийного цикла дольше порога'
+)
+
+
+class LoopLagMonitor:
+    """
+    Сторожевой таймер событийного цикла.
+
+    Задача в цикле засыпает на interval и измеряет, насколько позже она
+    проснулась - это задержка, с которой цикл выполняет готовые задачи.
+    Отдельный поток следит за отметками этой задачи: если отметки нет дольше
+    порога, цикл чем-то заблокирован, и поток снимает стек главного потока -
+    видно, какой обработчик и какой вызов держит цикл.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.2, history: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        # Последние пойманные блокировки: (время, стек)
+        self.stalls = deque(maxlen=history)
+
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._captured_beat = 0.0
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запустить замеры в текущем событийном цикле"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name='loop-lag-watchdog', daemon=True)
+        self._thread.start()
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = time.monotonic()
+            LOOP_LAG.observe(lag)
+            if lag >= self.threshold:
+                logger.warning(f"Событийный цикл был заблокирован на {lag * 1000:.0f} мс")
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat - self.interval
+            # Один снимок стека на одну блокировку
+            if overdue < self.threshold or beat == self._captured_beat:
+                continue
+            self._captured_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            self.stalls.append((time.time(), stack))
+            LOOP_STALLS.inc()
+            logger.warning(
+                f"Событийный цикл не отвечает {overdue * 1000:.0f} мс, стек главного потока:\n{stack}"
+            )
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,436 @@
+import bisect
+import functools
+import inspect
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError
+from aiogram.types import TelegramObject
+
+from src.monitoring.tracing import trace_span
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержки (сек)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Границы корзин количества строк в ответах БД
+ROWS_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if math.isnan(value):
+        return 'NaN'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str):
+        """Дочерняя метрика для значений меток (создается один раз и переиспользуется)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """
+    Текущее значение. Вместо ручной установки можно передать функцию,
+    которая вызывается только при чтении метрик.
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def render(self) -> List[str]:
+        if self.function is not None:
+            try:
+                self.labels().set(self.function())
+            except Exception as e:
+                logger.debug(f"Не удалось получить значение метрики {self.name}: {e}")
+        return super().render()
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Количество по корзинам хранится без накопления - накопленные суммы считаются при выводе
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class _SummaryValue:
+    __slots__ = ('window', 'sum', 'count')
+
+    def __init__(self, window: int):
+        self.window = deque(maxlen=window)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.window.append(value)
+        self.sum += value
+        self.count += 1
+
+
+class Summary(_Metric):
+    """Квантили по скользящему окну последних наблюдений (считаются при выводе)"""
+    type_name = 'summary'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 quantiles: Iterable[float] = (0.5, 0.9, 0.99), window: int = 1000):
+        super().__init__(name, documentation, labelnames)
+        self.quantiles = tuple(quantiles)
+        self.window = window
+
+    def _new_child(self):
+        return _SummaryValue(self.window)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        ordered = sorted(child.window)
+        for quantile in self.quantiles:
+            value = ordered[min(len(ordered) - 1, int(quantile * len(ordered)))] if ordered else math.nan
+            labels = _format_labels(self.labelnames, values, f'quantile="{quantile}"')
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик, который выводится в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+              function: Callable[[], float] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def summary(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                quantiles: Iterable[float] = (0.5, 0.9, 0.99), window: int = 1000) -> Summary:
+        return self.register(Summary(name, documentation, labelnames, quantiles, window))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+HANDLER_LATENCY = registry.histogram(
+    'bot_handler_duration_seconds', 'Время обработки события обработчиком', ('route',)
+)
+HANDLER_ERRORS = registry.counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках', ('route', 'error')
+)
+UPDATES_TOTAL = registry.counter(
+    'bot_updates_total', 'Полученные обновления по типам', ('type',)
+)
+DB_LATENCY = registry.histogram(
+    'bot_db_query_duration_seconds', 'Время выполнения методов Database', ('method',)
+)
+DB_ROWS = registry.histogram(
+    'bot_db_query_rows', 'Количество строк в результатах методов Database', ('method',), ROWS_BUCKETS
+)
+DB_RETRIES = registry.counter(
+    'bot_db_busy_retries_total', 'Повторы методов Database из-за блокировки БД', ('method',)
+)
+DB_FAILURES = registry.counter(
+    'bot_db_failures_total', 'Сбои методов Database, о которых сообщено пользователю', ('method', 'reason')
+)
+API_LATENCY = registry.histogram(
+    'bot_api_request_duration_seconds', 'Время запросов к Telegram Bot API', ('method',)
+)
+API_ERRORS = registry.counter(
+    'bot_api_errors_total', 'Ошибки запросов к Telegram Bot API', ('method', 'error')
+)
+
+
+def observe_handler(route: str, started: float, error: Optional[BaseException] = None):
+    """Записать время работы обработчика route, запущенного в момент started (perf_counter)"""
+    HANDLER_LATENCY.labels(route).observe(time.perf_counter() - started)
+    if error is not None:
+        HANDLER_ERRORS.labels(route, type(error).__name__).inc()
+
+
+def _count_rows(result: Any) -> Optional[int]:
+    # Список или множество - строки или ID записей, отдельный tuple - одна строка
+    if isinstance(result, (list, set, frozenset)):
+        return len(result)
+    if isinstance(result, tuple):
+        return 1
+    if result is None:
+        return 0
+    return None
+
+
+def instrument_db_methods(cls):
+    """
+    Декоратор класса: замеряет время всех публичных асинхронных методов
+    и количество строк в их результатах.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.iscoroutinefunction(method):
+            continue
+        setattr(cls, name, _instrument_db_method(name, method))
+    return cls
+
+
+def _instrument_db_method(name: str, method: Callable) -> Callable:
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with trace_span(f"db.{name}"):
+                result = await method(*args, **kwargs)
+        finally:
+            DB_LATENCY.labels(name).observe(time.perf_counter() - started)
+        count = _count_rows(result)
+        if count is not None:
+            DB_ROWS.labels(name).observe(count)
+        return result
+
+    return wrapper
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware: время работы обработчика по его имени.
+
+    callback-запросы сюда не подключаются: их замеряет сама таблица маршрутов,
+    где известен конкретный обработчик, а не общий dispatch.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get('handler')
+        callback = getattr(handler_object, 'callback', None)
+        if callback is None:
+            return await handler(event, data)
+
+        route = getattr(callback, '__name__', type(callback).__name__)
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception as e:
+            observe_handler(route, started, e)
+            raise
+        observe_handler(route, started)
+        return result
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware на dp.update: количество обновлений по типам"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        UPDATES_TOTAL.labels(getattr(event, 'event_type', 'unknown')).inc()
+        return await handler(event, data)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время запросов к Bot API и ошибки по типам"""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = getattr(method, '__api_method__', type(method).__name__)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except (TelegramAPIError, TelegramNetworkError) as e:
+            API_ERRORS.labels(api_method, type(e).__name__).inc()
+            raise
+        finally:
+            API_LATENCY.labels(api_method).observe(time.perf_counter() - started)
+
+
+def instrument_bot(dp, bot, router):
+    """
+    Подключить сбор метрик: обновления и очередь на обработку в диспетчере,
+    время обработчиков роутера, запросы сессии бота и размер хранилища FSM.
+    """
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    router.message.middleware(HandlerMetricsMiddleware())
+    router.inline_query.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(RequestMetricsMiddleware())
+
+    # Задачи обработки обновлений, которые получены, но еще не завершены
+    registry.gauge(
+        'bot_update_backlog', 'Обновления в обработке',
+        function=lambda: len(getattr(dp, '_handle_update_tasks', ()))
+    )
+    # MemoryStorage хранит состояния в словаре storage; для Redis размер не считается
+    storage = getattr(dp.fsm.storage, 'storage', None)
+    if isinstance(storage, dict):
+        registry.gauge(
+            'bot_fsm_storage_keys', 'Записи в хранилище состояний FSM', function=lambda: len(storage)
+        )
+
+
+async def start_metrics_server(host: str, port: int, slow_updates=None):
+    """
+    Запустить HTTP-сервер с метриками (GET /metrics); возвращает runner для остановки.
+
+    Если передан буфер медленных обновлений, они отдаются на GET /traces в формате JSON Lines.
+    """
+    from aiohttp import web
+
+    async def metrics_handler(request):
+        return web.Response(
+            body=registry.render().encode('utf-8'),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    if slow_updates is not None:
+        async def traces_handler(request):
+            return web.Response(text=slow_updates.to_jsonl(), content_type='application/x-ndjson')
+
+        app.router.add_get('/traces', traces_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+    return runner
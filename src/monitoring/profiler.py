@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+# Сколько кадров стека сохраняет tracemalloc для каждого выделения памяти
+TRACEMALLOC_FRAMES = 10
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """
+    Семплирующий профилировщик потока событийного цикла.
+
+    Отдельный поток раз в interval секунд читает текущий стек целевого потока
+    через sys._current_frames и считает одинаковые стеки. Сам цикл при этом
+    ничего не делает, поэтому накладные расходы - только захват GIL на время снимка.
+    Результат - свернутые стеки (формат flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Свернутые стеки: 'кадр;кадр;кадр количество' по строке на стек"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+async def sample_stacks(seconds: float, interval: float = 0.005) -> StackSampler:
+    """Профилировать текущий событийный цикл seconds секунд"""
+    sampler = StackSampler(interval)
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler
+
+
+async def memory_growth(seconds: float, limit: int = 50) -> str:
+    """
+    Разница снимков tracemalloc за seconds секунд: места в коде, где больше
+    всего выросла занятая память. Если tracemalloc не был включен, он включается
+    только на время замера.
+    """
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+
+    # Выделения самого tracemalloc и этого модуля не интересны
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+
+    stats = after.compare_to(before, 'traceback')
+    total = sum(stat.size_diff for stat in stats)
+    lines = [
+        f"Замер: {seconds:g} сек, {time.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"Изменение занятой памяти: {total / 1024:+.1f} KiB",
+        "",
+    ]
+    for index, stat in enumerate(stats[:limit], 1):
+        lines.append(
+            f"#{index}: {stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} блоков), "
+            f"всего {stat.size / 1024:.1f} KiB"
+        )
+        lines.extend(f"    {line}" for line in stat.traceback.format(most_recent_first=True))
+        lines.append("")
+    return '\n'.join(lines)
@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+# Поля с текстом и личными данными пользователя, которые маскируются
+TEXT_FIELDS = {
+    'text', 'caption', 'query', 'first_name', 'last_name', 'username', 'title', 'file_name', 'url',
+    'sender_user_name', 'author_signature', 'phone_number', 'vcard', 'email',
+}
+# Объекты (или списки объектов), у которых id - это id пользователя или чата
+PERSON_FIELDS = {
+    'from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat',
+    'sender_user', 'new_chat_members', 'left_chat_member', 'via_bot',
+}
+# Поля, которые сами содержат id пользователя или чата (например, contact.user_id)
+ID_FIELDS = {'user_id', 'chat_id'}
+# Диапазон псевдонимов id: положительные числа, как у настоящих пользователей
+PSEUDONYM_RANGE = 10 ** 12
+
+# Команда в начале текста сохраняется, иначе при воспроизведении сработают другие обработчики
+_COMMAND_RE = re.compile(r'^/\w+(?:@\w+)?')
+
+
+def pseudonym(value: int, secret: bytes) -> int:
+    """
+    Постоянный псевдоним id: HMAC от id с секретом. С тем же секретом можно
+    так же обезличить снимок БД, чтобы записанные обновления нашли свои данные.
+    """
+    digest = hmac.new(secret, str(value).encode(), hashlib.sha256).digest()
+    result = int.from_bytes(digest[:8], 'big') % PSEUDONYM_RANGE + 1
+    return -result if value < 0 else result
+
+
+def mask_text(text: str) -> str:
+    """
+    Замена букв и цифр с сохранением длины и структуры текста: позиции
+    entities, ссылки (https://xxx.xx/xxx) и команды остаются на своих местах.
+    """
+    command = _COMMAND_RE.match(text)
+    start = command.end() if command else 0
+    masked = []
+    for char in text[start:]:
+        if char.isdigit():
+            masked.append('0')
+        elif char.isalpha():
+            masked.append('x' if char.isascii() else 'ж')
+        else:
+            masked.append(char)
+    return text[:start] + ''.join(masked)
+
+
+def pseudonymize(payload: Any, secret: bytes, person: bool = False) -> Any:
+    """Копия обновления без личных данных (рекурсивно по JSON)"""
+    if isinstance(payload, list):
+        return [pseudonymize(item, secret, person) for item in payload]
+    if not isinstance(payload, dict):
+        return payload
+    result = {}
+    for key, value in payload.items():
+        if key == 'file_name' and isinstance(value, str):
+            # Расширение определяет категорию файла - его оставляем
+            stem, dot, extension = value.rpartition('.')
+            result[key] = mask_text(stem) + dot + extension if dot else mask_text(value)
+        elif key in TEXT_FIELDS and isinstance(value, str):
+            result[key] = mask_text(value)
+        elif (key == 'id' and person or key in ID_FIELDS) and isinstance(value, int):
+            result[key] = pseudonym(value, secret)
+        else:
+            result[key] = pseudonymize(value, secret, person=key in PERSON_FIELDS)
+    return result
+
+
+class UpdateRecorder(BaseMiddleware):
+    """
+    Внешний middleware на dp.update: запись входящих обновлений в JSON Lines (gzip).
+
+    Строка файла - {"t": секунд от начала записи, "update": обновление}; id
+    пользователей и чатов заменены псевдонимами, текст замаскирован.
+    Записи воспроизводятся инструментом benchmarks.replay.
+    """
+
+    def __init__(self, directory: str, secret: str = ''):
+        if secret:
+            self.secret = secret.encode()
+        else:
+            # Без постоянного секрета псевдонимы нельзя сопоставить со снимком БД
+            self.secret = os.urandom(32)
+            logger.warning("Секрет для псевдонимов не задан - снимок БД нельзя будет обезличить так же")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"updates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz")
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+        self._started = time.monotonic()
+        self.recorded = 0
+        logger.info(f"Запись обновлений в {self.path}")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self._file is not None:
+            try:
+                self.record(event.model_dump(mode='json', exclude_none=True, by_alias=True))
+            except Exception as e:
+                logger.error(f"Ошибка записи обновления: {e}")
+        return await handler(event, data)
+
+    def record(self, update: dict):
+        line = {'t': round(time.monotonic() - self._started, 3), 'update': pseudonymize(update, self.secret)}
+        self._file.write(json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.recorded += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Записано обновлений: {self.recorded} ({self.path})")
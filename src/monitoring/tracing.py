@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+# Span, внутри которого сейчас выполняется код (свой для каждой задачи asyncio)
+_current_span: ContextVar[Optional["Span"]] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """Отрезок времени работы с вложенными отрезками"""
+
+    __slots__ = ('name', 'attrs', 'started', 'duration', 'children')
+
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List[Span] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.duration is not None
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    @property
+    def self_duration(self) -> float:
+        """Время самого отрезка без вложенных (для обновления - время нашего кода)"""
+        return max(0.0, (self.duration or 0.0) - sum(child.duration or 0.0 for child in self.children))
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        origin = self.started if origin is None else origin
+        result = {
+            'name': self.name,
+            'start_ms': round((self.started - origin) * 1000, 3),
+            'duration_ms': round((self.duration or 0.0) * 1000, 3),
+        }
+        if self.attrs:
+            result['attrs'] = self.attrs
+        if self.children:
+            result['children'] = [child.to_dict(origin) for child in self.children]
+        return result
+
+    def format_breakdown(self) -> str:
+        """Дерево отрезков для лога: имя, длительность, у корня - время без вложенных"""
+        lines = [f"{self.name} {self.duration * 1000:.1f} мс (свой код {self.self_duration * 1000:.1f} мс)"]
+        for child in self.children:
+            lines.extend(child._format_lines(1))
+        return '\n'.join(lines)
+
+    def _format_lines(self, depth: int) -> List[str]:
+        lines = [f"{'  ' * depth}{self.name} {(self.duration or 0.0) * 1000:.1f} мс"]
+        for child in self.children:
+            lines.extend(child._format_lines(depth + 1))
+        return lines
+
+
+@contextmanager
+def trace_span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Вложенный отрезок текущей трассировки.
+
+    Вне обновления (фоновые задачи) или после его завершения ничего не записывает,
+    чтобы задачи, запущенные из обработчика, не дописывали закрытую трассировку.
+    """
+    parent = _current_span.get()
+    if parent is None or parent.finished:
+        yield None
+        return
+
+    span = Span(name, attrs)
+    parent.children.append(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        span.finish()
+        _current_span.reset(token)
+
+
+class SlowUpdates:
+    """Самые медленные обновления с полными деревьями отрезков (не больше size)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, span: Span):
+        if self.size <= 0:
+            return
+        item = (span.duration, next(self._counter), span)
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, item)
+        elif span.duration > self._heap[0][0]:
+            # Вытесняем самое быстрое из сохраненных
+            heapq.heapreplace(self._heap, item)
+
+    def slowest(self) -> List[Span]:
+        return [span for _, _, span in sorted(self._heap, reverse=True)]
+
+    def to_jsonl(self) -> str:
+        return ''.join(json.dumps(span.to_dict(), ensure_ascii=False) + '\n' for span in self.slowest())
+
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на dp.update: трассировка обработки каждого обновления.
+
+    Вызовы Database и запросы к Bot API внутри обновления становятся вложенными
+    отрезками. Самые медленные обновления хранятся в памяти, а обновления дольше
+    порога пишутся в лог с разбивкой по времени и в файл JSON Lines.
+    """
+
+    def __init__(self, slow_threshold_ms: float, buffer_size: int = 50, export_path: Optional[str] = None):
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.slow_updates = SlowUpdates(buffer_size)
+        self.export_path = export_path
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get('event_from_user')
+        span = Span(f"update.{getattr(event, 'event_type', 'unknown')}", {
+            'update_id': getattr(event, 'update_id', None),
+            'user_id': user.id if user else None,
+        })
+        token = _current_span.set(span)
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            span.attrs['error'] = type(e).__name__
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            self._record(span)
+
+    def _record(self, span: Span):
+        self.slow_updates.add(span)
+        if span.duration < self.slow_threshold:
+            return
+        logger.warning(f"Медленное обновление {span.attrs.get('update_id')}:\n{span.format_breakdown()}")
+        if self.export_path:
+            try:
+                with open(self.export_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(span.to_dict(), ensure_ascii=False) + '\n')
+            except OSError as e:
+                logger.error(f"Ошибка записи трассировки: {e}")
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: каждый запрос к Bot API - вложенный отрезок трассировки"""
+
+    async def __call__(self, make_request, bot, method):
+        with trace_span(f"api.{getattr(method, '__api_method__', type(method).__name__)}") as span:
+            try:
+                return await make_request(bot, method)
+            except Exception as e:
+                if span is not None:
+                    span.attrs['error'] = type(e).__name__
+                raise
@@ -0,0 +1,3 @@
+"""
+Фоновые сервисы
+""" 
\ No newline at end of file
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from src.config.config import Config
+from src.utils.safe_http import UnsafeURLError, open_public_url, public_connector
+
+logger = logging.getLogger(__name__)
+
+# Ключ в service_state, под которым хранится id последней проверенной ссылки
+CURSOR_KEY = 'link_checker_cursor'
+
+# Ответы, означающие, что страница существует, но доступ к ней ограничен
+ALIVE_ERROR_STATUSES = {401, 403, 429}
+# Ответы на HEAD, после которых стоит повторить проверку обычным GET
+HEAD_FALLBACK_STATUSES = {400, 403, 404, 405, 501}
+
+
+class HostRateLimiter:
+    """
+    Ограничение частоты запросов к одному хосту.
+
+    Каждый запрос заранее резервирует себе время начала не раньше, чем через
+    interval после предыдущего запроса к тому же хосту, и ждет его наступления.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, host: str):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def prune(self):
+        """Забыть хосты, к которым давно не было запросов"""
+        now = asyncio.get_running_loop().time()
+        self._next_slot = {host: slot for host, slot in self._next_slot.items() if slot > now}
+
+
+class LinkChecker:
+    """
+    Фоновая проверка доступности сохраненных ссылок.
+
+    Ссылки перебираются пачками по возрастанию id, позиция сохраняется в БД
+    после каждой пачки, поэтому после перезапуска проверка продолжается с того
+    же места. Каждая ссылка проверяется запросом HEAD (при отказе - GET первого
+    байта) через общий пул соединений с ограничением частоты запросов к хосту.
+    Запросы идут только на публичные адреса, в том числе после перенаправлений:
+    иначе статусы ответов внутренних сервисов попадали бы в список мертвых ссылок.
+    """
+
+    def __init__(self, db, batch_size: int = None, concurrency: int = None,
+                 host_interval: float = None, timeout: float = None,
+                 recheck_after: int = None, idle_sleep: int = None, allow_private: bool = False):
+        self.db = db
+        self.batch_size = batch_size or Config.LINK_CHECK_BATCH_SIZE
+        self.concurrency = concurrency or Config.LINK_CHECK_CONCURRENCY
+        self.timeout = timeout or Config.LINK_CHECK_TIMEOUT
+        self.recheck_after = recheck_after if recheck_after is not None else Config.LINK_CHECK_RECHECK_AFTER
+        self.idle_sleep = idle_sleep or Config.LINK_CHECK_IDLE_SLEEP
+        self.allow_private = allow_private
+        self.limiter = HostRateLimiter(
+            host_interval if host_interval is not None else Config.LINK_CHECK_HOST_INTERVAL
+        )
+
+        self._cursor: Optional[int] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запустить проверку в фоне"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def run_forever(self):
+        logger.info("Фоновая проверка ссылок запущена")
+        while True:
+            try:
+                checked = await self.run_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при проверке ссылок: {e}")
+                checked = 0
+            if not checked:
+                await asyncio.sleep(self.idle_sleep)
+
+    async def run_batch(self) -> int:
+        """Проверить следующую пачку ссылок; возвращает количество проверенных"""
+        if self._cursor is None:
+            self._cursor = int(await self.db.get_service_state(CURSOR_KEY) or 0)
+
+        links = await self.db.get_links_for_check(self._cursor, self.batch_size, self.recheck_after)
+        if not links and self._cursor:
+            # Дошли до конца таблицы - начинаем новый круг
+            self._cursor = 0
+            links = await self.db.get_links_for_check(self._cursor, self.batch_size, self.recheck_after)
+        if not links:
+            await self.db.set_service_state(CURSOR_KEY, str(self._cursor))
+            return 0
+
+        results = await asyncio.gather(*(self.check_link(link_id, url) for link_id, url in links))
+        await self.db.save_link_check_results(results)
+
+        self._cursor = links[-1][0]
+        await self.db.set_service_state(CURSOR_KEY, str(self._cursor))
+        self.limiter.prune()
+
+        dead = sum(1 for *_, ok in results if not ok)
+        logger.info(f"Проверено ссылок: {len(results)}, недоступно: {dead}, позиция: {self._cursor}")
+        return len(results)
+
+    async def check_link(self, link_id: int, url: str) -> Tuple[int, Optional[int], Optional[int], bool]:
+        """Проверить одну ссылку: (link_id, HTTP-статус, задержка в мс, доступна ли)"""
+        host = urlsplit(url).hostname or ''
+        await self.limiter.wait(host)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            session = await self.get_session()
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            try:
+                async with open_public_url(session, 'HEAD', url, allow_private=self.allow_private) as response:
+                    status = response.status
+                if status in HEAD_FALLBACK_STATUSES:
+                    # Не все серверы поддерживают HEAD - запрашиваем только первый байт
+                    async with open_public_url(session, 'GET', url, allow_private=self.allow_private,
+                                               headers={'Range': 'bytes=0-0'}) as response:
+                        status = response.status
+            except UnsafeURLError as e:
+                # Внутренний адрес не проверяем и ничего о нем не сообщаем
+                logger.info(f"Ссылка {url} не проверяется: {e}")
+                return link_id, None, None, True
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.debug(f"Ссылка {url} недоступна: {e}")
+                return link_id, None, None, False
+
+            latency_ms = int((loop.time() - started) * 1000)
+            return link_id, status, latency_ms, status < 400 or status in ALIVE_ERROR_STATUSES
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Общая HTTP-сессия с ограниченным пулом соединений"""
+        if self._session is None or self._session.closed:
+            if self.allow_private:
+                connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            else:
+                connector = public_connector(limit=self.concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': 'Mozilla/5.0 (compatible; FileStorageBot/1.2)'}
+            )
+        return self._session
+
+    async def close(self):
+        """Остановить проверку и закрыть пул соединений"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,192 @@
+import asyncio
+import html
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import aiohttp
+
+from src.config.config import Config
+from src.utils.safe_http import open_public_url, public_connector
+from src.utils.urls import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+_TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title', re.IGNORECASE | re.DOTALL)
+_OG_TITLE_RE = re.compile(
+    rb'<meta[^>]+property=["\']og:title["\'][^>]+content=["\']([^"\']+)["\']', re.IGNORECASE
+)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+_TITLE_END = b'</title'
+
+# Сколько символов названия сохранять
+MAX_TITLE_LENGTH = 200
+
+
+def parse_title(body: bytes, charset: Optional[str] = None) -> Optional[str]:
+    """Извлекает название страницы из начала HTML (og:title имеет приоритет над <title>)"""
+    match = _OG_TITLE_RE.search(body) or _TITLE_RE.search(body)
+    if not match:
+        return None
+
+    if not charset:
+        charset_match = _META_CHARSET_RE.search(body)
+        charset = charset_match.group(1).decode('ascii', 'ignore') if charset_match else 'utf-8'
+    try:
+        raw_title = match.group(1).decode(charset, errors='replace')
+    except LookupError:
+        raw_title = match.group(1).decode('utf-8', errors='replace')
+
+    title = ' '.join(html.unescape(raw_title).split())
+    return title[:MAX_TITLE_LENGTH] or None
+
+
+class TitleFetcher:
+    """
+    Асинхронное получение названий страниц для сохраненных ссылок.
+
+    Запросы идут через общий пул соединений с ограничением на число соединений
+    к одному хосту, из ответа читаются только первые килобайты (чтение
+    прекращается сразу после </title>). Результаты кэшируются в памяти (LRU)
+    и на диске (таблица link_titles) по каноническому URL; неудача помнится
+    только failure_ttl секунд, потом страница запрашивается снова.
+
+    Запросы идут только на публичные адреса, в том числе после
+    перенаправлений: ссылку присылает пользователь, а название страницы
+    показывается ему в чате.
+
+    Сохранение ссылки никогда не ждет получения названия: ссылки ставятся
+    в очередь, которую разбирают фоновые воркеры.
+    """
+
+    def __init__(self, db, concurrency: int = None, limit_per_host: int = None,
+                 max_bytes: int = None, timeout: float = None, cache_size: int = None,
+                 failure_ttl: float = None, queue_size: int = 10000, allow_private: bool = False):
+        self.db = db
+        self.concurrency = concurrency or Config.TITLE_FETCH_CONCURRENCY
+        self.limit_per_host = limit_per_host or Config.TITLE_FETCH_PER_HOST
+        self.max_bytes = max_bytes or Config.TITLE_FETCH_MAX_BYTES
+        self.timeout = timeout or Config.TITLE_FETCH_TIMEOUT
+        self.cache_size = cache_size or Config.TITLE_CACHE_SIZE
+        self.failure_ttl = failure_ttl if failure_ttl is not None else Config.TITLE_FETCH_RETRY_AFTER
+        self.queue_size = queue_size
+        self.allow_private = allow_private
+
+        # URL -> (название или None, до какого момента неудача считается актуальной)
+        self._cache: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Общая HTTP-сессия с ограниченным пулом соединений (создается при первом запросе)"""
+        if self._session is None or self._session.closed:
+            connector_options = dict(limit=self.concurrency, limit_per_host=self.limit_per_host, ttl_dns_cache=300)
+            if self.allow_private:
+                connector = aiohttp.TCPConnector(**connector_options)
+            else:
+                connector = public_connector(**connector_options)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': 'Mozilla/5.0 (compatible; FileStorageBot/1.2)'}
+            )
+        return self._session
+
+    def submit(self, user_id: int, url: str, placeholder: str) -> bool:
+        """
+        Поставить ссылку в очередь на получение названия.
+
+        Когда название будет получено, оно заменит placeholder, если пользователь
+        за это время не переименовал ссылку. Возвращает False, если очередь переполнена.
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            self._queue.put_nowait((user_id, url, placeholder))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Очередь получения названий переполнена, пропускаем {url}")
+            return False
+
+    async def fetch_title(self, url: str) -> Optional[str]:
+        """Получить название страницы (из кэша или по сети)"""
+        # Фрагмент на сервер не отправляется - у всех якорей страницы одно название
+        key = canonicalize_url(url, keep_fragment=False)
+        cached = self._cache.get(key)
+        if cached is not None:
+            title, expires = cached
+            if title is not None or time.monotonic() < expires:
+                self._cache.move_to_end(key)
+                return title
+
+        title = await self.db.get_cached_link_title(key)
+        if title is None:
+            title = await self._download_title(url)
+            if title:
+                await self.db.save_cached_link_title(key, title)
+
+        self._cache[key] = (title, time.monotonic() + self.failure_ttl)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return title
+
+    async def close(self, timeout: float = 0):
+        """
+        Остановить воркеры и закрыть пул соединений. Если задан timeout, сначала
+        не дольше timeout секунд ждем, пока разберется очередь (названия
+        записываются в БД).
+        """
+        if self._queue is not None and timeout:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не дождались названий для {self._queue.qsize()} ссылок")
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _worker(self):
+        while True:
+            user_id, url, placeholder = await self._queue.get()
+            try:
+                title = await self.fetch_title(url)
+                if title and title != placeholder:
+                    await self.db.update_user_link_title(user_id, url, title, placeholder)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при получении названия для {url}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _download_title(self, url: str) -> Optional[str]:
+        """Скачать начало страницы и извлечь из него название"""
+        session = await self.get_session()
+        try:
+            async with open_public_url(session, 'GET', url, allow_private=self.allow_private) as response:
+                if response.status != 200:
+                    return None
+                if 'html' not in response.headers.get('Content-Type', 'text/html').lower():
+                    return None
+
+                body = b''
+                async for chunk in response.content.iter_chunked(2048):
+                    body += chunk
+                    # Дальше <title> читать незачем
+                    if _TITLE_END in body.lower() or len(body) >= self.max_bytes:
+                        break
+                return parse_title(body[:self.max_bytes], response.charset)
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, ValueError) as e:
+            logger.info(f"Не удалось получить название страницы {url}: {e}")
+            return None
@@ -0,0 +1,215 @@
+import csv
+import re
+from html.parser import HTMLParser
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from src.utils.fuzzy import split_words
+
+# Сколько символов читать из файла за раз при разборе HTML
+HTML_CHUNK_SIZE = 64 * 1024
+
+# Ссылки в обычном тексте (в файлах нет разметки Telegram)
+_TEXT_URL_RE = re.compile(r'(?:https?://|www\.)[^\s<>"\'`]+', re.IGNORECASE)
+_TRAILING_PUNCTUATION = '.,;:!?)]}»'
+
+# Названия колонок CSV (в том числе из экспорта ссылок бота) -> поле закладки
+CSV_COLUMNS = {
+    'title': 'title', 'name': 'title', 'название': 'title', 'заголовок': 'title',
+    'url': 'url', 'link': 'url', 'href': 'url', 'address': 'url', 'ссылка': 'url', 'адрес': 'url',
+    'category': 'folder', 'folder': 'folder', 'категория': 'folder', 'папка': 'folder',
+    'description': 'description', 'note': 'description', 'excerpt': 'description', 'описание': 'description',
+    'tags': 'tags', 'теги': 'tags',
+}
+
+# Слова в названии папки закладок -> категория ссылок
+FOLDER_KEYWORDS = {
+    'work': ['work', 'job', 'jobs', 'office', 'работа', 'работы', 'вакансии', 'проекты'],
+    'education': ['education', 'edu', 'study', 'learning', 'learn', 'courses', 'course', 'docs',
+                  'образование', 'учеба', 'учёба', 'обучение', 'курсы', 'книги'],
+    'social': ['social', 'соцсети', 'социальные', 'сети', 'друзья'],
+    'news': ['news', 'новости', 'сми', 'blogs', 'блоги'],
+    'shopping': ['shopping', 'shop', 'shops', 'store', 'покупки', 'магазины', 'магазин', 'wishlist'],
+    'tools': ['tools', 'dev', 'development', 'utilities', 'utils', 'инструменты', 'утилиты', 'разработка', 'сервисы'],
+    'games': ['games', 'gaming', 'game', 'игры', 'игровое'],
+    'entertainment': ['entertainment', 'music', 'video', 'videos', 'movies', 'films', 'fun', 'anime',
+                      'развлечения', 'музыка', 'видео', 'фильмы', 'кино', 'сериалы', 'аниме'],
+    'web': ['web', 'sites', 'websites', 'веб', 'сайты'],
+}
+_FOLDER_WORD_CATEGORY = {word: category for category, words in FOLDER_KEYWORDS.items() for word in words}
+
+
+class Bookmark(NamedTuple):
+    """Закладка из импортируемого файла"""
+    url: str
+    title: Optional[str] = None
+    folders: tuple = ()
+    description: Optional[str] = None
+    tags: Optional[str] = None
+
+
+def detect_format(filename: str, head: str) -> str:
+    """Определяет формат файла закладок: 'html', 'csv' или 'text'"""
+    name = (filename or '').lower()
+    start = head.lstrip('﻿ \t\r\n')[:200].lower()
+    if name.endswith(('.html', '.htm')) or start.startswith(('<!doctype netscape', '<!doctype html', '<html', '<dl')):
+        return 'html'
+    if name.endswith('.csv'):
+        return 'csv'
+    return 'text'
+
+
+def folder_to_category(folders: Iterable[str], category_names: dict = None) -> Optional[str]:
+    """
+    Категория ссылок по пути папок закладки (ближайшая к закладке папка важнее).
+
+    category_names - отображаемые названия категорий (например, "Работа" -> "work"),
+    чтобы понимать колонку "Категория" из экспорта ссылок бота.
+    """
+    for folder in reversed(tuple(folders)):
+        if not folder:
+            continue
+        name = folder.strip().lower()
+        if category_names and name in category_names:
+            return category_names[name]
+        if name in FOLDER_KEYWORDS:
+            return name
+        for word in split_words(name):
+            category = _FOLDER_WORD_CATEGORY.get(word)
+            if category:
+                return category
+    return None
+
+
+def iter_bookmarks(stream, file_format: str) -> Iterator[Bookmark]:
+    """Разбирает текстовый поток построчно или по частям, не загружая файл целиком"""
+    if file_format == 'html':
+        return iter_html_bookmarks(stream)
+    if file_format == 'csv':
+        return iter_csv_bookmarks(stream)
+    return iter_text_bookmarks(stream)
+
+
+class _NetscapeBookmarkParser(HTMLParser):
+    """Разбор формата закладок Netscape (экспорт Chrome, Firefox, Safari, Edge)"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.folders: List[str] = []
+        self.bookmarks: List[Bookmark] = []
+        self._pending_folder: Optional[str] = None
+        self._text: Optional[List[str]] = None
+        self._link: Optional[dict] = None
+        self._description: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._flush_description()
+            attributes = dict(attrs)
+            self._link = {'url': attributes.get('href') or '', 'tags': attributes.get('tags')}
+            self._text = []
+        elif tag == 'h3':
+            self._flush_description()
+            self._text = []
+        elif tag == 'dl':
+            self._flush_description()
+            # Список внутри папки - все закладки до </dl> лежат в ней
+            self.folders.append(self._pending_folder or '')
+            self._pending_folder = None
+        elif tag == 'dd':
+            self._description = []
+        elif tag == 'dt':
+            self._flush_description()
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._link is not None:
+            title = ' '.join(''.join(self._text or []).split()) or None
+            self.bookmarks.append(Bookmark(
+                url=self._link['url'].strip(),
+                title=title,
+                folders=tuple(folder for folder in self.folders[1:] if folder),
+                tags=self._link['tags'] or None
+            ))
+            self._link = None
+            self._text = None
+        elif tag == 'h3' and self._text is not None:
+            self._pending_folder = ' '.join(''.join(self._text).split())
+            self._text = None
+        elif tag == 'dl':
+            self._flush_description()
+            if self.folders:
+                self.folders.pop()
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+        elif self._description is not None:
+            self._description.append(data)
+
+    def _flush_description(self):
+        """Описание (<DD>) относится к предыдущей закладке"""
+        if self._description is None:
+            return
+        description = ' '.join(''.join(self._description).split())
+        self._description = None
+        if description and self.bookmarks:
+            self.bookmarks[-1] = self.bookmarks[-1]._replace(description=description)
+        # Последняя закладка могла уже уйти из буфера - тогда описание теряется
+
+    def drain(self) -> List[Bookmark]:
+        """Забрать разобранные закладки (последняя остается, пока к ней может прийти описание)"""
+        if self._description is not None or len(self.bookmarks) < 2:
+            return []
+        ready, self.bookmarks = self.bookmarks[:-1], self.bookmarks[-1:]
+        return ready
+
+
+def iter_html_bookmarks(stream) -> Iterator[Bookmark]:
+    parser = _NetscapeBookmarkParser()
+    while True:
+        chunk = stream.read(HTML_CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        yield from parser.drain()
+    parser.close()
+    parser._flush_description()
+    yield from parser.bookmarks
+
+
+def iter_csv_bookmarks(stream) -> Iterator[Bookmark]:
+    reader = csv.reader(stream)
+    columns = None
+    for row in reader:
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            header = [CSV_COLUMNS.get(cell.strip().lower().lstrip('﻿')) for cell in row]
+            if 'url' in header:
+                columns = header
+                continue
+            # Файл без заголовка: ссылкой считаем первую ячейку, похожую на URL
+            columns = []
+        if columns:
+            values = {field: cell.strip() for field, cell in zip(columns, row) if field}
+            url = values.get('url')
+            if not url:
+                continue
+            yield Bookmark(
+                url=url,
+                title=values.get('title') or None,
+                folders=(values['folder'],) if values.get('folder') else (),
+                description=values.get('description') or None,
+                tags=values.get('tags') or None
+            )
+        else:
+            for cell in row:
+                match = _TEXT_URL_RE.search(cell)
+                if match:
+                    yield Bookmark(url=match.group(0).rstrip(_TRAILING_PUNCTUATION))
+                    break
+
+
+def iter_text_bookmarks(stream) -> Iterator[Bookmark]:
+    for line in stream:
+        for match in _TEXT_URL_RE.finditer(line):
+            yield Bookmark(url=match.group(0).rstrip(_TRAILING_PUNCTUATION))
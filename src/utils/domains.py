@@ -0,0 +1,163 @@
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Категория по умолчанию для ссылок, домен которых не удалось определить
+DEFAULT_LINK_CATEGORY = 'general'
+
+# Суффиксы доменов и их категории. Правило для более длинного суффикса
+# важнее короткого: docs.google.com - tools, хотя google.com - web.
+DOMAIN_CATEGORIES = {
+    'education': [
+        'edu', 'ac.uk', 'edu.au', 'ac.jp', 'ac.ru', 'edu.ru',
+        'coursera.org', 'edx.org', 'udemy.com', 'khanacademy.org', 'stepik.org', 'skillbox.ru',
+        'geekbrains.ru', 'duolingo.com', 'wikipedia.org', 'wikibooks.org', 'arxiv.org',
+        'scholar.google.com', 'habr.com', 'w3schools.com', 'developer.mozilla.org',
+        'docs.python.org', 'leetcode.com', 'codewars.com', 'brilliant.org', 'stackoverflow.com',
+        'stackexchange.com', 'researchgate.net', 'openedu.ru', 'postnauka.ru', 'ted.com'
+    ],
+    'work': [
+        'slack.com', 'zoom.us', 'teams.microsoft.com', 'atlassian.net', 'atlassian.com', 'jira.com',
+        'trello.com', 'asana.com', 'notion.so', 'notion.site', 'linkedin.com', 'hh.ru', 'headhunter.ru',
+        'superjob.ru', 'indeed.com', 'glassdoor.com', 'upwork.com', 'fl.ru', 'kwork.ru',
+        'monday.com', 'clickup.com', 'basecamp.com', 'miro.com', 'figma.com', 'confluence.com',
+        'calendar.google.com', 'meet.google.com', 'mail.google.com', 'outlook.com', 'office.com'
+    ],
+    'social': [
+        'vk.com', 'vk.ru', 'ok.ru', 'facebook.com', 'fb.com', 'instagram.com', 'twitter.com', 'x.com',
+        't.me', 'telegram.me', 'telegram.org', 'reddit.com', 'pinterest.com', 'tumblr.com',
+        'threads.net', 'mastodon.social', 'discord.com', 'discord.gg', 'whatsapp.com', 'snapchat.com',
+        'quora.com', 'pikabu.ru', 'dzen.ru', 'livejournal.com', 'bsky.app'
+    ],
+    'news': [
+        'bbc.com', 'bbc.co.uk', 'cnn.com', 'nytimes.com', 'theguardian.com', 'reuters.com',
+        'apnews.com', 'bloomberg.com', 'ft.com', 'wsj.com', 'washingtonpost.com', 'forbes.com',
+        'news.google.com', 'news.yahoo.com', 'news.ycombinator.com', 'ria.ru', 'tass.ru', 'rbc.ru',
+        'lenta.ru', 'meduza.io', 'kommersant.ru', 'vedomosti.ru', 'interfax.ru', 'gazeta.ru',
+        'iz.ru', 'rg.ru', 'fontanka.ru', 'tjournal.ru', 'vc.ru', 'theverge.com', 'techcrunch.com',
+        'wired.com', 'arstechnica.com', 'engadget.com', 'euronews.com', 'aljazeera.com'
+    ],
+    'shopping': [
+        'amazon.com', 'amazon.de', 'amazon.co.uk', 'ebay.com', 'aliexpress.com', 'aliexpress.ru',
+        'alibaba.com', 'ozon.ru', 'wildberries.ru', 'wb.ru', 'market.yandex.ru', 'avito.ru',
+        'etsy.com', 'walmart.com', 'bestbuy.com', 'ikea.com', 'lamoda.ru', 'dns-shop.ru',
+        'mvideo.ru', 'eldorado.ru', 'citilink.ru', 'megamarket.ru', 'sbermegamarket.ru',
+        'temu.com', 'shein.com', 'asos.com', 'zara.com', 'joom.com', 'kazanexpress.ru'
+    ],
+    'tools': [
+        'github.com', 'gitlab.com', 'bitbucket.org', 'github.io', 'docs.google.com',
+        'drive.google.com', 'sheets.google.com', 'translate.google.com', 'maps.google.com',
+        'dropbox.com', 'disk.yandex.ru', 'translate.yandex.ru', 'maps.yandex.ru', 'cloud.mail.ru',
+        'onedrive.live.com', 'deepl.com', 'chatgpt.com', 'openai.com', 'claude.ai', 'canva.com',
+        'pastebin.com', 'regex101.com', 'jsfiddle.net', 'codepen.io', 'replit.com',
+        'colab.research.google.com', 'huggingface.co', 'pypi.org', 'npmjs.com', 'hub.docker.com',
+        'vercel.com', 'netlify.app', 'heroku.com', 'cloudflare.com', 'speedtest.net', 'ilovepdf.com',
+        'smallpdf.com', 'remove.bg', 'tinypng.com', 'wolframalpha.com', 'archive.org', 'bit.ly'
+    ],
+    'games': [
+        'steampowered.com', 'steamcommunity.com', 'epicgames.com', 'gog.com', 'itch.io',
+        'twitch.tv', 'roblox.com', 'minecraft.net', 'ea.com', 'ubisoft.com', 'blizzard.com',
+        'battle.net', 'playstation.com', 'xbox.com', 'nintendo.com', 'chess.com', 'lichess.org',
+        'ign.com', 'gamespot.com', 'kanobu.ru', 'stopgame.ru', 'playground.ru', 'wargaming.net',
+        'lesta.ru', 'riotgames.com', 'leagueoflegends.com', 'dota2.com', 'faceit.com'
+    ],
+    'entertainment': [
+        'youtube.com', 'youtu.be', 'netflix.com', 'spotify.com', 'music.yandex.ru',
+        'music.apple.com', 'soundcloud.com', 'kinopoisk.ru', 'ivi.ru', 'okko.tv', 'kion.ru',
+        'rutube.ru', 'imdb.com', 'hulu.com', 'disneyplus.com', 'primevideo.com', 'hbomax.com',
+        'max.com', 'vimeo.com', 'tiktok.com', 'deezer.com', 'last.fm', 'genius.com',
+        'shikimori.one', 'anilist.co', 'letterboxd.com', 'goodreads.com', 'litres.ru',
+        'afisha.ru', 'kassir.ru', 'coub.com', '9gag.com'
+    ],
+    'web': [
+        'google.com', 'yandex.ru', 'ya.ru', 'bing.com', 'duckduckgo.com', 'yahoo.com',
+        'mail.ru', 'rambler.ru', 'medium.com', 'substack.com', 'wordpress.com', 'blogspot.com',
+        'tilda.ws', 'wix.com', 'wixsite.com', 'squarespace.com', 'sites.google.com'
+    ],
+}
+
+
+def get_host(url: str) -> str:
+    """Хост ссылки в нижнем регистре без www (пустая строка, если не удалось разобрать)"""
+    if '://' not in url:
+        url = f"http://{url}"
+    try:
+        host = (urlsplit(url).hostname or '').rstrip('.')
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def host_suffixes(host: str) -> Iterable[str]:
+    """Суффиксы хоста от самого длинного: a.b.c -> a.b.c, b.c, c"""
+    while host:
+        yield host
+        _, _, host = host.partition('.')
+
+
+class DomainTrie:
+    """
+    Префиксное дерево по меткам домена в обратном порядке (com -> github -> docs).
+
+    Поиск проходит метки хоста с конца и возвращает категорию самого длинного
+    совпавшего суффикса, поэтому время поиска зависит только от числа меток в хосте.
+    """
+
+    __slots__ = ('_root',)
+
+    # Ключ узла, под которым хранится категория (метка домена не может быть пустой)
+    _VALUE = ''
+
+    def __init__(self, rules: Iterable[Tuple[str, str]] = ()):
+        self._root: Dict[str, dict] = {}
+        for suffix, category in rules:
+            self.add(suffix, category)
+
+    def add(self, suffix: str, category: str):
+        """Добавить правило: домены, оканчивающиеся на suffix, относятся к category"""
+        node = self._root
+        for label in reversed(suffix.lower().strip('.').split('.')):
+            node = node.setdefault(label, {})
+        node[self._VALUE] = category
+
+    def lookup(self, host: str) -> Optional[str]:
+        """Категория самого длинного совпавшего суффикса или None"""
+        node = self._root
+        found = None
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            found = node.get(self._VALUE, found)
+        return found
+
+
+class LinkClassifier:
+    """
+    Определение категории ссылки по домену.
+
+    Общие правила задаются DOMAIN_CATEGORIES и собираются в дерево один раз.
+    Поверх них действуют правила пользователя (домен -> категория), которые
+    запоминаются, когда пользователь сам выбирает категорию для ссылки.
+    """
+
+    def __init__(self, rules: Dict[str, Iterable[str]] = None):
+        rules = DOMAIN_CATEGORIES if rules is None else rules
+        self.trie = DomainTrie(
+            (suffix, category) for category, suffixes in rules.items() for suffix in suffixes
+        )
+
+    def default_category(self, host: str) -> str:
+        """Категория домена по общим правилам"""
+        return self.trie.lookup(host) or DEFAULT_LINK_CATEGORY
+
+    def classify(self, url: str, overrides: Optional[Dict[str, str]] = None) -> str:
+        """Категория ссылки с учетом правил пользователя (overrides: домен -> категория)"""
+        host = get_host(url)
+        if not host:
+            return DEFAULT_LINK_CATEGORY
+        if overrides:
+            for suffix in host_suffixes(host):
+                category = overrides.get(suffix)
+                if category is not None:
+                    return category
+        return self.default_category(host)
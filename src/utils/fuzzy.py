@@ -0,0 +1,209 @@
+import bisect
+import heapq
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Все, что не буква и не цифра, считаем разделителем слов
+_SEPARATORS = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Приводит строку к нижнему регистру и заменяет разделители пробелами"""
+    if not text:
+        return ''
+    return _SEPARATORS.sub(' ', text.lower()).strip()
+
+
+def split_words(text: str) -> List[str]:
+    """Разбивает строку на нормализованные слова"""
+    normalized = normalize_text(text)
+    return normalized.split() if normalized else []
+
+
+def trigrams(text: str) -> Set[str]:
+    """Возвращает множество триграмм строки (слова дополняются пробелами, как в pg_trgm)"""
+    result = set()
+    for word in split_words(text):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Расстояние Левенштейна с ранним выходом при превышении max_distance"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class TrigramIndex:
+    """
+    Инвертированный индекс триграмм для нечеткого поиска по коротким строкам.
+
+    Дополнительно хранит отсортированный список слов, по которому работает
+    быстрый поиск по префиксу (для инлайн-режима, где запрос набирается по буквам).
+    """
+
+    def __init__(self):
+        self._texts: Dict[int, str] = {}
+        self._grams: Dict[int, Set[str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._words: List[Tuple[str, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._texts
+
+    def add(self, doc_id: int, *parts: Optional[str]):
+        """Добавить (или заменить) документ в индексе"""
+        for word in self._insert(doc_id, parts):
+            bisect.insort(self._words, (word, doc_id))
+
+    def add_many(self, documents: Iterable[Tuple]):
+        """Добавить документы пачкой: (doc_id, часть1, часть2, ...)"""
+        for doc_id, *parts in documents:
+            self._words.extend((word, doc_id) for word in self._insert(doc_id, parts))
+        self._words.sort()
+
+    def _insert(self, doc_id: int, parts) -> Set[str]:
+        """Проиндексировать триграммы документа и вернуть его слова для списка префиксов"""
+        if doc_id in self._texts:
+            self.remove(doc_id)
+
+        text = normalize_text(' '.join(part for part in parts if part))
+        grams = trigrams(text)
+        self._texts[doc_id] = text
+        self._grams[doc_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(doc_id)
+        return set(text.split())
+
+    def remove(self, doc_id: int):
+        """Удалить документ из индекса"""
+        grams = self._grams.pop(doc_id, None)
+        text = self._texts.pop(doc_id, None)
+        for word in set(text.split()) if text else ():
+            position = bisect.bisect_left(self._words, (word, doc_id))
+            if position < len(self._words) and self._words[position] == (word, doc_id):
+                del self._words[position]
+        if not grams:
+            return
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            posting.discard(doc_id)
+            if not posting:
+                del self._postings[gram]
+
+    def prefix_search(self, query: str, limit: int = 50) -> List[int]:
+        """
+        Найти документы, в которых каждое слово запроса является началом какого-либо слова.
+
+        Возвращает ID документов по убыванию (новые записи первыми).
+        """
+        query_words = split_words(query)
+        if not query_words or limit <= 0:
+            return []
+
+        # Кандидатов выбираем по самому длинному слову - у него самый узкий диапазон
+        anchor = max(query_words, key=len)
+        candidates = set()
+        position = bisect.bisect_left(self._words, (anchor,))
+        while position < len(self._words) and self._words[position][0].startswith(anchor):
+            candidates.add(self._words[position][1])
+            position += 1
+
+        matches = []
+        for doc_id in sorted(candidates, reverse=True):
+            doc_words = self._texts[doc_id].split()
+            if all(any(word.startswith(query_word) for word in doc_words) for query_word in query_words):
+                matches.append(doc_id)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.3) -> List[Tuple[int, float]]:
+        """
+        Найти документы, похожие на запрос.
+
+        Кандидаты отбираются по числу общих триграмм, затем лучшие из них
+        оцениваются по сходству триграмм и расстоянию Левенштейна до ближайшего слова.
+        Возвращает список (doc_id, score), отсортированный по убыванию score.
+        """
+        query_text = normalize_text(query)
+        query_grams = trigrams(query_text)
+        if not query_grams or limit <= 0:
+            return []
+
+        shared = Counter()
+        for gram in query_grams:
+            for doc_id in self._postings.get(gram, ()):
+                shared[doc_id] += 1
+        if not shared:
+            return []
+
+        # Дорогую оценку по расстоянию редактирования считаем только для лучших кандидатов
+        candidates = heapq.nlargest(limit * 5, shared.items(), key=lambda item: item[1])
+
+        query_words = query_text.split()
+        scored = []
+        for doc_id, common in candidates:
+            doc_grams = self._grams[doc_id]
+            similarity = common / (len(query_grams) + len(doc_grams) - common)
+            score = 0.6 * similarity + 0.4 * self._edit_similarity(query_text, query_words, self._texts[doc_id])
+            if score >= min_score:
+                scored.append((doc_id, score))
+
+        return heapq.nlargest(limit, scored, key=lambda item: item[1])
+
+    @staticmethod
+    def _edit_similarity(query_text: str, query_words: List[str], doc_text: str) -> float:
+        """Сходство запроса с ближайшим словом документа по расстоянию Левенштейна (0..1)"""
+        doc_words = doc_text.split()
+        if not doc_words:
+            return 0.0
+
+        total = 0.0
+        for query_word in query_words:
+            best = 0.0
+            for doc_word in doc_words:
+                longest = max(len(query_word), len(doc_word))
+                max_distance = longest // 2
+                distance = levenshtein(query_word, doc_word, max_distance)
+                if distance <= max_distance:
+                    best = max(best, 1 - distance / longest)
+                    if best == 1.0:
+                        break
+            total += best
+        word_score = total / len(query_words)
+
+        # Запрос из нескольких слов сравниваем еще и с документом целиком
+        if len(query_words) > 1:
+            longest = max(len(query_text), len(doc_text))
+            distance = levenshtein(query_text, doc_text, longest // 2)
+            word_score = max(word_score, 1 - distance / longest if distance <= longest // 2 else 0.0)
+        return word_score
@@ -0,0 +1,95 @@
+import ipaddress
+import socket
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Union
+
+import aiohttp
+from aiohttp.abc import AbstractResolver, ResolveResult
+from aiohttp.resolver import DefaultResolver
+from yarl import URL
+
+# Сколько перенаправлений проходить при запросе страницы пользователя
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+
+class UnsafeURLError(aiohttp.ClientError):
+    """Адрес ведет во внутреннюю сеть (localhost, RFC1918, link-local и т.п.)"""
+
+
+def is_public_address(address: Union[str, ipaddress.IPv4Address, ipaddress.IPv6Address]) -> bool:
+    """Можно ли обращаться к адресу: только глобальные unicast-адреса"""
+    ip = ipaddress.ip_address(address)
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        # ::ffff:127.0.0.1 - это тот же 127.0.0.1
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class PublicResolver(AbstractResolver):
+    """
+    Резолвер для TCPConnector, который отбрасывает внутренние адреса.
+
+    Проверяются именно адреса, к которым будет подключение, поэтому имя,
+    указывающее на 127.0.0.1, и подмена DNS между проверкой и запросом
+    не помогут обойти ограничение. Если публичных адресов нет - UnsafeURLError.
+    """
+
+    def __init__(self):
+        self._resolver = DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET) -> List[ResolveResult]:
+        results = await self._resolver.resolve(host, port, family)
+        public = [result for result in results if is_public_address(result['host'])]
+        if not public:
+            raise UnsafeURLError(f"{host} ведет во внутреннюю сеть")
+        return public
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+
+def public_connector(**kwargs) -> aiohttp.TCPConnector:
+    """TCPConnector, который подключается только к публичным адресам"""
+    return aiohttp.TCPConnector(resolver=PublicResolver(), **kwargs)
+
+
+def ensure_public_url(url: Union[str, URL]):
+    """
+    Проверка адреса перед запросом: схема http/https, а хост, заданный
+    IP-адресом, - публичный (такие хосты aiohttp не передает резолверу).
+    """
+    url = URL(url)
+    if url.scheme not in ('http', 'https') or not url.host:
+        raise UnsafeURLError(f"Неподдерживаемый адрес: {url}")
+    try:
+        address = ipaddress.ip_address(url.host.strip('[]'))
+    except ValueError:
+        return
+    if not is_public_address(address):
+        raise UnsafeURLError(f"{url.host} - внутренний адрес")
+
+
+@asynccontextmanager
+async def open_public_url(session: aiohttp.ClientSession, method: str, url: str,
+                          max_redirects: int = MAX_REDIRECTS, allow_private: bool = False,
+                          **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+    """
+    Запрос к адресу, присланному пользователем. Перенаправления проходятся
+    вручную, и каждый следующий адрес проверяется так же, как первый.
+    Сессия должна быть создана с public_connector(); allow_private отключает
+    проверку (локальные тестовые серверы).
+    """
+    for _ in range(max_redirects + 1):
+        if not allow_private:
+            ensure_public_url(url)
+        async with session.request(method, url, allow_redirects=False, **kwargs) as response:
+            location = response.headers.get('Location')
+            if response.status in REDIRECT_STATUSES and location:
+                url = response.url.join(URL(location))
+                if response.status == 303 and method != 'HEAD':
+                    method = 'GET'
+                continue
+            yield response
+            return
+    raise aiohttp.TooManyRedirects(response.request_info, ())
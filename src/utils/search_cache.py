@@ -0,0 +1,116 @@
+import itertools
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+_SPACES_RE = re.compile(r'\s+')
+
+# ID записи файла или ссылки; в инлайн-поиске файлы и ссылки идут вперемешку - ("f" или "l", ID)
+ResultId = Union[int, Tuple[str, int]]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Запрос, по которому ищется и кэшируется результат. Поиск идет через LIKE:
+    регистр кириллицы и знаки препинания меняют результат, поэтому схлопываются
+    только пробелы.
+    """
+    return _SPACES_RE.sub(' ', query.strip())
+
+
+class SearchResult:
+    """Закэшированный результат поиска: упорядоченный список ID записей"""
+
+    __slots__ = ('token', 'user_id', 'kind', 'query', 'ids', 'fuzzy', 'version')
+
+    def __init__(self, token: int, user_id: int, kind: str, query: str,
+                 ids: List[ResultId], fuzzy: bool, version: int):
+        self.token = token
+        self.user_id = user_id
+        self.kind = kind
+        self.query = query
+        self.ids = ids
+        self.fuzzy = fuzzy
+        self.version = version
+
+    def page_count(self, page_size: int) -> int:
+        """Количество страниц при заданном размере страницы"""
+        return max(1, (len(self.ids) + page_size - 1) // page_size)
+
+    def page_ids(self, page: int, page_size: int) -> List[ResultId]:
+        """ID записей на указанной странице (нумерация с нуля)"""
+        start = page * page_size
+        return self.ids[start:start + page_size]
+
+
+class SearchCache:
+    """
+    LRU-кэш результатов поиска по ключу (user_id, тип, запрос).
+
+    Каждая запись помнит версию библиотеки пользователя, на которой она была
+    построена: после любого добавления или удаления версия меняется, и запись
+    считается устаревшей. Короткий числовой токен записи используется в кнопках
+    пагинации, чтобы не передавать сам запрос в callback_data.
+    """
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[int, str, str], SearchResult]" = OrderedDict()
+        self._tokens: Dict[int, Tuple[int, str, str]] = {}
+        self._counter = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(user_id: int, kind: str, query: str) -> Tuple[int, str, str]:
+        # Искать нужно по тому же normalize_query(query), иначе запросы с одним
+        # ключом могут дать разные результаты
+        return user_id, kind, normalize_query(query)
+
+    def get(self, user_id: int, kind: str, query: str, version: int) -> Optional[SearchResult]:
+        """Вернуть актуальный результат для запроса или None"""
+        return self._get_valid(self.make_key(user_id, kind, query), version)
+
+    def get_by_token(self, token: int, user_id: int) -> Optional[SearchResult]:
+        """
+        Вернуть запись по токену из кнопки пагинации.
+
+        Запись может быть устаревшей: вызывающий код сверяет entry.version
+        с текущей версией библиотеки и при необходимости повторяет поиск по entry.query.
+        """
+        key = self._tokens.get(token)
+        if key is None or key[0] != user_id:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, user_id: int, kind: str, query: str, ids: List[ResultId],
+            fuzzy: bool, version: int) -> SearchResult:
+        """Сохранить результат поиска и вернуть созданную запись"""
+        key = self.make_key(user_id, kind, query)
+        self._drop(key)
+
+        entry = SearchResult(next(self._counter), user_id, kind, query, list(ids), fuzzy, version)
+        self._entries[key] = entry
+        self._tokens[entry.token] = key
+
+        while len(self._entries) > self.max_size:
+            _, old_entry = self._entries.popitem(last=False)
+            self._tokens.pop(old_entry.token, None)
+        return entry
+
+    def _get_valid(self, key: Tuple[int, str, str], version: int) -> Optional[SearchResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != version:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _drop(self, key: Tuple[int, str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._tokens.pop(entry.token, None)
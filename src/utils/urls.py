@@ -0,0 +1,143 @@
+import hashlib
+from typing import List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from aiogram.types import Message
+
+# Порты по умолчанию, которые не нужно хранить в URL
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Параметры отслеживания, которые не влияют на содержимое страницы
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'ysclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'ref_src', 'ref_url', 'si', 'spm'
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_')
+
+
+def extract_urls(message: Message) -> List[str]:
+    """
+    Извлекает все ссылки из сообщения по сущностям Telegram (url и text_link).
+
+    Telegram уже разметил ссылки в тексте или подписи, поэтому регулярные
+    выражения не нужны. Порядок сохраняется, повторы убираются. Остаются только
+    адреса веб-страниц: text_link может вести на tg://, mailto: и т.п.
+    """
+    text = message.text or message.caption
+    entities = message.entities or message.caption_entities or []
+
+    urls = []
+    seen = set()
+    # Одна и та же страница может встретиться в разных написаниях - оставляем первое
+    for entity in entities:
+        if entity.type == 'url':
+            url = entity.extract_from(text)
+        elif entity.type == 'text_link':
+            # Адрес text_link Telegram присылает со схемой, и mailto: без "//"
+            # нельзя дополнять схемой http, как адрес из текста
+            url = entity.url
+            if not is_web_url(url):
+                continue
+        else:
+            continue
+
+        url = canonicalize_url(url)
+        if not is_web_url(url):
+            continue
+        key = dedup_key(url)
+        if key not in seen:
+            seen.add(key)
+            urls.append(url)
+    return urls
+
+
+def canonicalize_url(url: str, keep_fragment: bool = True) -> str:
+    """
+    Приводит URL к каноническому виду для хранения и поиска дубликатов.
+
+    Фрагмент (#якорь, маршрут одностраничного приложения) по умолчанию
+    сохраняется - это часть сохраненной ссылки; dedup_key его не учитывает.
+    """
+    url = (url or '').strip()
+    if not url:
+        return ''
+
+    # Telegram размечает и ссылки без схемы ("example.com/page")
+    if '://' not in url:
+        url = f"http://{url}"
+
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if not host:
+        return url
+
+    netloc = host
+    if parts.username:
+        netloc = f"{parts.username}{':' + parts.password if parts.password else ''}@{netloc}"
+    if port and DEFAULT_PORTS.get(scheme) != port:
+        netloc = f"{netloc}:{port}"
+
+    fragment = parts.fragment if keep_fragment else ''
+    return urlunsplit((scheme, netloc, parts.path or '/', strip_tracking_params(parts.query), fragment))
+
+
+def is_web_url(url: str) -> bool:
+    """Проверяет, что канонический URL - адрес веб-страницы (http/https с корректным хостом)"""
+    try:
+        parts = urlsplit(url)
+        parts.port
+    except ValueError:
+        return False
+    return parts.scheme in DEFAULT_PORTS and bool(parts.hostname)
+
+
+def strip_tracking_params(query: str) -> str:
+    """Убирает из строки запроса параметры отслеживания (utm_*, fbclid и т.п.)"""
+    if not query:
+        return ''
+    params = parse_qsl(query, keep_blank_values=True)
+    kept = [
+        (key, value) for key, value in params
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    if len(kept) == len(params):
+        return query
+    return urlencode(kept)
+
+
+def dedup_key(url: str) -> str:
+    """
+    Ключ для поиска дубликатов: одна и та же страница дает один ключ.
+
+    В дополнение к canonicalize_url не различает http и https, www и домен без него,
+    путь со слешем на конце и без, порядок параметров запроса и фрагмент.
+    Ключ служит только для сравнения - открывать по нему страницу нельзя.
+    """
+    url = canonicalize_url(url, keep_fragment=False)
+    if not url:
+        return ''
+
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+
+    netloc = parts.netloc
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    path = parts.path.rstrip('/')
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+    scheme = 'http' if parts.scheme in DEFAULT_PORTS else parts.scheme
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def url_hash(url: str) -> str:
+    """Хэш ключа дубликатов, который хранится в БД в колонке url_hash"""
+    return hashlib.sha1(dedup_key(url).encode('utf-8')).hexdigest()
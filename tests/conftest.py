@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Тесты импортируют модули бота как src.*
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -0,0 +1,91 @@
+import pytest
+
+from src.database.database import Database
+from src.handlers import handlers
+from src.utils.bookmarks import detect_format, iter_bookmarks
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'files.db'))
+    monkeypatch.setattr(handlers, 'db', db)
+    return db
+
+
+def test_iter_csv_bookmarks(tmp_path):
+    path = tmp_path / 'links.csv'
+    path.write_text('url,title,category,tags\nhttps://a.example/,A,Work,"x,y"\n,,,\nhttps://b.example/,,,\n', encoding='utf-8')
+    with open(path, encoding='utf-8', newline='') as stream:
+        bookmarks = list(iter_bookmarks(stream, detect_format('links.csv', '')))
+    assert [(b.url, b.title, b.folders, b.tags) for b in bookmarks] == [
+        ('https://a.example/', 'A', ('Work',), 'x,y'),
+        ('https://b.example/', None, (), None),
+    ]
+
+
+async def test_links_export_can_be_imported_back(db, tmp_path):
+    await db.add_user_links(1, [
+        ('Документация', 'https://example.com/doc#section', 'заметка', 'education', 'python, docs'),
+        ('Репозиторий', 'https://github.com/example/repo', None, 'tools', None),
+    ])
+    filename, data = handlers.create_links_export(await db.get_user_links(1))
+    path = tmp_path / filename
+    path.write_bytes(data)
+
+    stats = await handlers.import_bookmarks_file(2, str(path), filename)
+
+    assert stats['total'] == stats['added'] == 2
+    exported = {row[1:6] for row in await db.get_user_links(1)}
+    imported = {row[1:6] for row in await db.get_user_links(2)}
+    assert imported == exported
+
+
+async def test_import_skips_duplicates(db, tmp_path):
+    path = tmp_path / 'links.txt'
+    path.write_text('https://example.com/a http://www.example.com/a/ https://example.com/b ftp://x\n', encoding='utf-8')
+
+    stats = await handlers.import_bookmarks_file(1, str(path), 'links.txt')
+    again = await handlers.import_bookmarks_file(1, str(path), 'links.txt')
+
+    assert (stats['total'], stats['added'], stats['duplicates']) == (3, 2, 1)
+    assert (again['added'], again['duplicates']) == (0, 3)
+
+
+def write_links_file(path, urls):
+    path.write_text('\n'.join(urls) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_bookmark_batches_are_read_lazily(tmp_path):
+    path = write_links_file(tmp_path / 'links.txt', [f'https://example.com/{number}' for number in range(5)])
+    stats = {'total': 0, 'skipped': 0}
+    batches = handlers.iter_bookmark_batches(path, 'links.txt', {}, stats, 2)
+
+    assert [url for _, url, *_ in next(batches)] == ['https://example.com/0', 'https://example.com/1']
+    assert stats['total'] == 2
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert stats['total'] == 5
+
+
+async def test_import_saves_each_batch_as_it_is_read(db, tmp_path, monkeypatch):
+    path = write_links_file(tmp_path / 'links.csv', [
+        'url', 'https://example.com/a', 'https://example.com/b', 'https://www.example.com/a/',
+        'javascript:void(0)', 'https://example.com/c', 'https://example.com/b',
+    ])
+    monkeypatch.setattr(handlers, 'IMPORT_BATCH_SIZE', 2)
+    saved = []
+    add_user_links = db.add_user_links
+
+    async def record_batch(user_id, links):
+        saved.append(len(links))
+        return await add_user_links(user_id, links)
+
+    monkeypatch.setattr(db, 'add_user_links', record_batch)
+
+    stats = await handlers.import_bookmarks_file(1, path, 'links.csv')
+
+    assert saved == [2, 2, 1]
+    assert stats == {'total': 6, 'added': 3, 'duplicates': 2, 'skipped': 1, 'errors': 0}
+    assert sorted(row[2] for row in await db.get_user_links(1)) == [
+        'https://example.com/a', 'https://example.com/b', 'https://example.com/c',
+    ]
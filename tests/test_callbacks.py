@@ -0,0 +1,74 @@
+import pytest
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import CallbackQuery
+
+from src.handlers import handlers
+from src.handlers.callbacks import (
+    LEGACY_PREFIXES, CallbackTable, ChooseLinkCategory, ConfirmDeleteFile, ConfirmDeleteLink, DeleteFile,
+    DeleteLink, DownloadFile, DownloadShared, FileCategory, LinkCategory, SelectFile, ShareFile, ViewLink,
+)
+
+# Кнопки, отправленные до перехода на компактный формат, и их новые callback_data
+LEGACY_BUTTONS = [
+    ("download_42", DownloadFile(record_id=42)),
+    ("select_file_42", SelectFile(record_id=42)),
+    ("share_42", ShareFile(record_id=42)),
+    ("delete_42", DeleteFile(record_id=42)),
+    ("confirm_delete_42", ConfirmDeleteFile(record_id=42)),
+    ("download_shared_AbC-12_x", DownloadShared(share_id="AbC-12_x")),
+    ("category_documents", FileCategory(category="documents")),
+    ("link_category_education", LinkCategory(category="education")),
+    ("link_cat_tools", ChooseLinkCategory(category="tools")),
+    ("view_link_7", ViewLink(link_id=7)),
+    ("delete_link_7", DeleteLink(link_id=7)),
+    ("confirm_delete_link_7", ConfirmDeleteLink(link_id=7)),
+]
+
+
+def callback_query(data):
+    return CallbackQuery.model_validate({
+        'id': '1', 'chat_instance': '1', 'data': data,
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'Test'},
+    })
+
+
+def test_every_legacy_prefix_is_covered():
+    assert {factory for _, factory in LEGACY_PREFIXES} == {type(data) for _, data in LEGACY_BUTTONS}
+
+
+@pytest.mark.parametrize('legacy, current', LEGACY_BUTTONS, ids=[legacy for legacy, _ in LEGACY_BUTTONS])
+def test_legacy_buttons_reach_the_same_handler(legacy, current):
+    old_handler, _, old_data = handlers.callbacks.resolve(legacy)
+    new_handler, _, new_data = handlers.callbacks.resolve(current.pack())
+    assert old_handler is new_handler
+    assert old_data == new_data == current
+
+
+def test_exact_routes_are_not_taken_for_legacy_buttons():
+    # Точное значение проверяется раньше старых префиксов ("delete_", "share_" и т.п.)
+    for data, (expected, _) in handlers.callbacks._exact.items():
+        handler, _, callback_data = handlers.callbacks.resolve(data)
+        assert handler is expected and callback_data is None
+
+
+async def test_dispatch_passes_legacy_data_to_handler():
+    table = CallbackTable()
+    calls = []
+
+    @table.route(DownloadFile)
+    async def download(callback, callback_data, state=None):
+        calls.append((callback.data, callback_data, state))
+
+    await table.dispatch(callback_query("download_5"), state="fsm", bot="unused")
+    assert calls == [("download_5", DownloadFile(record_id=5), "fsm")]
+
+
+async def test_dispatch_leaves_unknown_and_malformed_data_unhandled():
+    table = CallbackTable()
+
+    @table.route(DownloadFile)
+    async def download(callback, callback_data):
+        raise AssertionError("не должен вызываться")
+
+    assert await table.dispatch(callback_query("download_abc")) is UNHANDLED
+    assert await table.dispatch(callback_query("unknown_button")) is UNHANDLED
@@ -0,0 +1,95 @@
+import gc
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from src.database.database import Database
+from src.utils.urls import url_hash
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'files.db')
+
+
+async def test_backfill_media_kinds(db_path):
+    db = Database(db_path)
+    names = {
+        'photo_1700000000_AgACAg.jpg': 'images',
+        'video_1700000000_BAACAg.mp4': 'videos',
+        'audio_1700000000_CQACAg.mp3': 'audio',
+        'voice_1700000000_AwACAg.ogg': 'audio',
+        'movie.mp4': 'videos',
+        'song.mp3': 'audio',
+        'report.pdf': 'documents',
+        'file_1700000000_BQACAg': 'other',
+    }
+    for number, (name, category) in enumerate(names.items()):
+        await db.add_file(f'id{number}', name, 10, name.rsplit('.', 1)[-1], category, user_id=1)
+    # Так выглядят файлы, сохраненные до появления колонки
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('UPDATE files SET media_kind = NULL')
+
+    Database(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        kinds = dict(conn.execute('SELECT file_name, media_kind FROM files'))
+    assert kinds == {
+        'photo_1700000000_AgACAg.jpg': 'photo',
+        'video_1700000000_BAACAg.mp4': 'video',
+        'audio_1700000000_CQACAg.mp3': 'audio',
+        'voice_1700000000_AwACAg.ogg': 'voice',
+        'movie.mp4': 'unknown',
+        'song.mp3': 'unknown',
+        'report.pdf': 'document',
+        'file_1700000000_BQACAg': 'document',
+    }
+
+
+def test_backfill_keeps_one_active_link_per_hash(db_path):
+    Database(db_path)
+    # Ссылки, сохраненные до появления url_hash: дубликаты тогда не отсекались
+    rows = [
+        (1, 'https://example.com/docs', 1),
+        (1, 'https://www.example.com/docs/', 1),
+        (1, 'http://example.com/docs#intro', 1),
+        (1, 'https://example.com/other', 1),
+        (1, 'https://example.com/other/', 0),
+        (2, 'https://example.com/docs', 1),
+    ]
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('DROP INDEX idx_user_links_user_hash')
+        conn.executemany(
+            "INSERT INTO user_links (user_id, title, url, category, is_active) VALUES (?, 't', ?, 'general', ?)",
+            rows
+        )
+
+    Database(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        links = conn.execute('SELECT id, user_id, url_hash, is_active FROM user_links ORDER BY id').fetchall()
+    assert all(link_hash == url_hash(url) for (_, _, link_hash, _), (_, url, _) in zip(links, rows))
+    active = [(link_id, user_id) for link_id, user_id, _, is_active in links if is_active]
+    # Из дубликатов остается самая ранняя ссылка, у каждого пользователя свой набор
+    assert active == [(1, 1), (4, 1), (6, 2)]
+
+
+
+def journal_mode(db_path):
+    with closing(sqlite3.connect(db_path)) as conn:
+        return conn.execute('PRAGMA journal_mode').fetchone()[0]
+
+
+def test_journal_mode_is_set_once_in_the_file(db_path):
+    Database(db_path)
+    assert journal_mode(db_path) == 'wal'
+
+    class DeleteJournalDatabase(Database):
+        JOURNAL_MODE = 'DELETE'
+
+    # Выйти из WAL можно, только когда файл не открыт другими соединениями, а sqlite3
+    # закрывает брошенное соединение лишь при сборке мусора (его кэш запросов - цикл ссылок)
+    gc.collect()
+    DeleteJournalDatabase(db_path)
+    assert journal_mode(db_path) == 'delete'
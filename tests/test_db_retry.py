@@ -0,0 +1,121 @@
+import sqlite3
+import time
+
+import pytest
+
+from src.database.errors import (
+    DatabaseBusyError, DatabaseUnavailableError, is_busy_error, raise_for_db_error,
+)
+from src.database.retry import _retrying, retry_on_busy
+from src.monitoring.metrics import DB_FAILURES, DB_RETRIES
+
+
+def counter_value(metric, *labels):
+    child = metric._children.get(labels)
+    return child.value if child else 0
+
+
+@retry_on_busy
+class Store:
+    BUSY_RETRY_BUDGET = 0.2
+    BUSY_RETRY_BASE_DELAY = 0.001
+    BUSY_RETRY_MAX_DELAY = 0.01
+
+    def __init__(self, failures=0, error='database is locked'):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self.outer_calls = 0
+
+    async def stub_read(self):
+        self.calls += 1
+        try:
+            if self.calls <= self.failures:
+                raise sqlite3.OperationalError(self.error)
+            return 'ok'
+        except Exception as e:
+            raise_for_db_error(e)
+            return None
+
+    async def stub_outer(self):
+        self.outer_calls += 1
+        return await self.stub_read()
+
+
+async def test_busy_method_is_retried_until_it_succeeds():
+    store = Store(failures=2)
+    retries = counter_value(DB_RETRIES, 'stub_read')
+
+    assert await store.stub_read() == 'ok'
+    assert store.calls == 3
+    assert counter_value(DB_RETRIES, 'stub_read') == retries + 2
+
+
+async def test_busy_method_gives_up_after_budget():
+    store = Store(failures=10 ** 6)
+    failures = counter_value(DB_FAILURES, 'stub_read', 'busy')
+    started = time.monotonic()
+
+    with pytest.raises(DatabaseBusyError):
+        await store.stub_read()
+    # Пауза, которая вышла бы за бюджет, не делается - метод сдается сразу
+    assert time.monotonic() - started <= Store.BUSY_RETRY_BUDGET + 0.1
+    assert store.calls > 2
+    assert counter_value(DB_FAILURES, 'stub_read', 'busy') == failures + 1
+
+
+async def test_unavailable_database_is_not_retried():
+    store = Store(failures=1, error='disk I/O error')
+    failures = counter_value(DB_FAILURES, 'stub_read', 'unavailable')
+
+    with pytest.raises(DatabaseUnavailableError):
+        await store.stub_read()
+    assert store.calls == 1
+    assert counter_value(DB_FAILURES, 'stub_read', 'unavailable') == failures + 1
+
+
+async def test_nested_call_is_retried_by_outer_method():
+    store = Store(failures=1)
+
+    assert await store.stub_outer() == 'ok'
+    # Внутренний метод не повторяется сам - повторяется внешний целиком
+    assert (store.outer_calls, store.calls) == (2, 2)
+    assert _retrying.get() is False
+
+
+@pytest.mark.parametrize('error, expected', [
+    (sqlite3.OperationalError('database is locked'), DatabaseBusyError),
+    (sqlite3.OperationalError('database table is locked'), DatabaseBusyError),
+    (sqlite3.OperationalError('disk I/O error'), DatabaseUnavailableError),
+    (sqlite3.OperationalError('database or disk is full'), DatabaseUnavailableError),
+    (sqlite3.DatabaseError('file is not a database'), DatabaseUnavailableError),
+    (DatabaseBusyError('already typed'), DatabaseBusyError),
+])
+def test_raise_for_db_error_classifies_failures(error, expected):
+    with pytest.raises(expected):
+        raise_for_db_error(error)
+
+
+@pytest.mark.parametrize('error', [
+    sqlite3.IntegrityError('UNIQUE constraint failed: files.file_id'),
+    sqlite3.ProgrammingError('Incorrect number of bindings supplied'),
+    ValueError('bad record id'),
+])
+def test_raise_for_db_error_leaves_other_errors_to_the_method(error):
+    assert raise_for_db_error(error) is None
+
+
+def test_real_lock_is_recognized_by_error_code(tmp_path):
+    path = str(tmp_path / 'locked.db')
+    writer = sqlite3.connect(path)
+    writer.execute('CREATE TABLE t (x INTEGER)')
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        other = sqlite3.connect(path, timeout=0)
+        with pytest.raises(sqlite3.OperationalError) as info:
+            other.execute('INSERT INTO t VALUES (1)')
+        other.close()
+    finally:
+        writer.rollback()
+        writer.close()
+    assert is_busy_error(info.value)
@@ -0,0 +1,114 @@
+import pytest
+
+from src.database.database import Database
+from src.utils.fuzzy import TrigramIndex, levenshtein, normalize_text, trigrams
+
+
+@pytest.fixture
+def index():
+    index = TrigramIndex()
+    index.add_many([
+        (1, 'Отчет за март.pdf', 'работа финансы'),
+        (2, 'Договор аренды.docx', None),
+        (3, 'vacation_photos.zip', 'travel'),
+        (4, 'Отчет за апрель.pdf', 'работа'),
+    ])
+    return index
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'files.db'))
+
+
+def test_normalize_and_trigrams():
+    assert normalize_text('Vacation_Photos.ZIP') == 'vacation photos zip'
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+
+
+@pytest.mark.parametrize('a, b, distance', [
+    ('kitten', 'sitting', 3),
+    ('отчет', 'отчёт', 1),
+    ('', 'abc', 3),
+    ('same', 'same', 0),
+])
+def test_levenshtein(a, b, distance):
+    assert levenshtein(a, b) == distance
+
+
+def test_levenshtein_stops_after_max_distance():
+    assert levenshtein('abcdef', 'uvwxyz', max_distance=2) == 3
+
+
+def test_exact_word_scores_highest(index):
+    results = index.search('договор')
+    assert results[0][0] == 2
+    assert results[0][1] == pytest.approx(max(score for _, score in results))
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('догвор', 2),       # пропущена буква
+    ('vacaton', 3),
+    ('отчт апрель', 4),  # опечатка в одном из слов
+    ('travle', 3),       # переставлены буквы
+])
+def test_typo_tolerance(index, query, expected):
+    assert index.search(query)[0][0] == expected
+
+
+def test_scores_are_sorted_and_filtered(index):
+    results = index.search('отчет', min_score=0.3)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert {doc_id for doc_id, _ in results} == {1, 4}
+    assert index.search('zzzzzz') == []
+    assert index.search('') == []
+
+
+def test_prefix_search_needs_every_word(index):
+    assert index.prefix_search('отч') == [4, 1]
+    assert index.prefix_search('отч апр') == [4]
+    assert index.prefix_search('отч раб фин') == [1]
+    assert index.prefix_search('апрель март') == []
+    assert index.prefix_search('отч', limit=1) == [4]
+
+
+def test_add_replaces_and_remove_forgets(index):
+    index.add(2, 'Счет на оплату')
+    assert index.prefix_search('догов') == []
+    assert index.prefix_search('счет') == [2]
+
+    index.remove(2)
+    assert 2 not in index
+    assert index.search('счет') == []
+    assert index.prefix_search('счет') == []
+    index.remove(2)  # повторное удаление ничего не ломает
+
+
+async def test_database_keeps_file_index_in_sync(db):
+    first = await db.add_file('f1', 'Отчет за март.pdf', 10, 'pdf', 'documents', user_id=1)
+    # Индекс строится при первом поиске, дальше обновляется при изменениях
+    assert await db.fuzzy_search_file_ids(1, 'отчот') == [first]
+
+    second = await db.add_file('f2', 'Отчет за апрель.pdf', 10, 'pdf', 'documents', user_id=1)
+    assert await db.prefix_search_file_ids(1, 'отч') == [second, first]
+
+    await db.delete_file_by_record_id(first, 1)
+    assert await db.prefix_search_file_ids(1, 'отч') == [second]
+    await db.delete_file('f2', 1)
+    assert await db.fuzzy_search_file_ids(1, 'отчет') == []
+    # Файлы другого пользователя в индекс не попадают
+    await db.add_file('f3', 'Отчет.pdf', 10, 'pdf', 'documents', user_id=2)
+    assert await db.fuzzy_search_file_ids(1, 'отчет') == []
+
+
+async def test_database_keeps_link_index_in_sync(db):
+    link_id = await db.add_user_link(1, 'Документация aiogram', 'https://docs.aiogram.dev/', tags='python')
+    assert await db.fuzzy_search_user_link_ids(1, 'aoigram') == [link_id]
+
+    other_id = await db.add_user_link(1, 'Python tutorial', 'https://docs.python.org/3/tutorial/')
+    assert await db.prefix_search_user_link_ids(1, 'pyt') == [other_id, link_id]
+
+    await db.delete_user_link(link_id, 1)
+    assert await db.prefix_search_user_link_ids(1, 'pyt') == [other_id]
+    assert await db.fuzzy_search_user_link_ids(1, 'aiogram') == []
@@ -0,0 +1,69 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.services.link_checker import LinkChecker
+
+
+@pytest.fixture
+async def site():
+    """Локальный HTTP-сервер вместо настоящих сайтов; hits - запросы (метод, путь)"""
+    hits = []
+
+    async def handle(request):
+        hits.append((request.method, request.path))
+        if request.path == '/ok':
+            return web.Response(text='ok')
+        if request.path == '/no-head':
+            if request.method == 'HEAD':
+                raise web.HTTPMethodNotAllowed('HEAD', ['GET'])
+            return web.Response(text='ok')
+        if request.path == '/moved':
+            raise web.HTTPMovedPermanently('/ok')
+        if request.path == '/forbidden':
+            raise web.HTTPForbidden()
+        raise web.HTTPNotFound()
+
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', handle)
+    server = TestServer(app)
+    await server.start_server()
+    server.hits = hits
+    yield server
+    await server.close()
+
+
+@pytest.fixture
+async def checker():
+    checker = LinkChecker(db=None, host_interval=0, timeout=5, allow_private=True)
+    yield checker
+    await checker.close()
+
+
+@pytest.mark.parametrize('path, status, alive', [
+    ('/ok', 200, True),
+    ('/no-head', 200, True),
+    ('/moved', 200, True),
+    ('/forbidden', 403, True),
+    ('/gone', 404, False),
+])
+async def test_check_link(site, checker, path, status, alive):
+    link_id, checked_status, latency_ms, ok = await checker.check_link(1, str(site.make_url(path)))
+    assert (link_id, checked_status, ok) == (1, status, alive)
+    assert latency_ms is not None
+
+
+async def test_head_falls_back_to_get(site, checker):
+    await checker.check_link(1, str(site.make_url('/no-head')))
+    assert site.hits == [('HEAD', '/no-head'), ('GET', '/no-head')]
+
+
+@pytest.mark.parametrize('host', ['127.0.0.1', 'localhost'])
+async def test_internal_hosts_are_not_requested(site, host):
+    checker = LinkChecker(db=None, host_interval=0, timeout=5)
+    try:
+        url = str(site.make_url('/gone').with_host(host))
+        assert await checker.check_link(7, url) == (7, None, None, True)
+        assert not site.hits
+    finally:
+        await checker.close()
@@ -0,0 +1,74 @@
+import pytest
+
+from src.database.database import Database
+from src.monitoring.metrics import DB_ROWS, MetricsRegistry, _count_rows, instrument_db_methods
+
+
+@pytest.mark.parametrize('result, rows', [
+    ([(1, 'a.pdf'), (2, 'b.pdf')], 2),  # строки
+    ([5, 3, 9], 3),                     # ID записей
+    (['https://a.example/'], 1),
+    ({'https://a.example/', 'https://b.example/'}, 2),
+    ([], 0),
+    (set(), 0),
+    ((1, 'a.pdf', 10), 1),              # одна строка
+    (None, 0),
+    (7, None),
+    ({'files': 3}, None),
+])
+def test_count_rows(result, rows):
+    assert _count_rows(result) == rows
+
+
+def rows_observed(method):
+    child = DB_ROWS._children.get((method,))
+    return (child.count, child.sum) if child else (0, 0)
+
+
+async def test_database_methods_report_row_counts(tmp_path):
+    db = Database(str(tmp_path / 'files.db'))
+    for number in range(3):
+        await db.add_file(f'f{number}', f'report {number}.pdf', 10, 'pdf', 'documents', user_id=1)
+    await db.add_user_link(1, 'A', 'https://a.example/')
+    await db.add_user_link(1, 'B', 'https://b.example/')
+
+    before = {name: rows_observed(name) for name in ('search_file_ids', 'get_existing_link_urls')}
+    await db.search_file_ids(1, 'report')
+    await db.get_existing_link_urls(1, ['https://a.example/', 'https://b.example/', 'https://c.example/'])
+
+    count, total = rows_observed('search_file_ids')
+    assert (count, total) == (before['search_file_ids'][0] + 1, before['search_file_ids'][1] + 3)
+    count, total = rows_observed('get_existing_link_urls')
+    assert (count, total) == (before['get_existing_link_urls'][0] + 1, before['get_existing_link_urls'][1] + 2)
+
+
+async def test_instrumented_class_keeps_results():
+    @instrument_db_methods
+    class Store:
+        async def get_ids(self):
+            return [1, 2]
+
+        async def _private(self):
+            return [1]
+
+    store = Store()
+    assert await store.get_ids() == [1, 2]
+    assert rows_observed('get_ids')[1] >= 2
+    assert rows_observed('_private') == (0, 0)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('rows', 'Строки', ('method',), buckets=(1, 5))
+    for value in (0, 1, 3, 7):
+        histogram.labels('get').observe(value)
+
+    assert registry.render().splitlines() == [
+        '# HELP rows Строки',
+        '# TYPE rows histogram',
+        'rows_bucket{method="get",le="1"} 2',
+        'rows_bucket{method="get",le="5"} 3',
+        'rows_bucket{method="get",le="+Inf"} 4',
+        'rows_sum{method="get"} 11',
+        'rows_count{method="get"} 4',
+    ]
@@ -0,0 +1,108 @@
+import json
+
+from aiogram.types import Update
+
+from src.monitoring.recorder import mask_text, pseudonym, pseudonymize
+
+SECRET = b'test-secret'
+SENDER = {'id': 111111111, 'is_bot': False, 'first_name': 'Иван', 'last_name': 'Петров', 'username': 'ivan_p'}
+CHAT = {'id': 111111111, 'type': 'private', 'first_name': 'Иван', 'username': 'ivan_p'}
+THIRD_PARTY = {'id': 222222222, 'is_bot': False, 'first_name': 'Мария', 'username': 'maria_s'}
+
+
+def record(update: dict) -> dict:
+    """Обновление так же, как его пишет UpdateRecorder"""
+    dumped = Update.model_validate(update).model_dump(mode='json', exclude_none=True, by_alias=True)
+    return pseudonymize(dumped, SECRET)
+
+
+def assert_no_leaks(recorded: dict, *secrets):
+    text = json.dumps(recorded, ensure_ascii=False)
+    for value in secrets:
+        assert str(value) not in text, value
+
+
+def test_forwarded_message_roundtrip():
+    update = {
+        'update_id': 1,
+        'message': {
+            'message_id': 10, 'date': 1700000000, 'chat': CHAT, 'from': SENDER,
+            'text': 'https://example.com/secret-page',
+            'entities': [{'type': 'url', 'offset': 0, 'length': 31}],
+            'forward_origin': {'type': 'user', 'date': 1690000000, 'sender_user': THIRD_PARTY},
+            'via_bot': {'id': 333333333, 'is_bot': True, 'first_name': 'Helper', 'username': 'helper_bot'},
+        },
+    }
+    recorded = record(update)
+
+    message = Update.model_validate(recorded).message
+    assert message.forward_origin.sender_user.id == pseudonym(THIRD_PARTY['id'], SECRET)
+    assert message.from_user.id == message.chat.id == pseudonym(SENDER['id'], SECRET)
+    assert message.via_bot.id == pseudonym(333333333, SECRET)
+    # Ссылка распознается так же, как в исходном сообщении
+    assert len(message.text) == 31 and message.entities[0].extract_from(message.text) == message.text
+    assert_no_leaks(recorded, 111111111, 222222222, 333333333, 'Мария', 'maria_s', 'Иван', 'ivan_p', 'secret-page')
+
+
+def test_hidden_forward_and_channel_signature():
+    update = {
+        'update_id': 2,
+        'message': {
+            'message_id': 11, 'date': 1700000000, 'chat': CHAT, 'from': SENDER, 'text': 'привет',
+            'forward_origin': {'type': 'hidden_user', 'date': 1690000000, 'sender_user_name': 'Мария Сидорова'},
+            'author_signature': 'Главный редактор',
+        },
+    }
+    recorded = record(update)
+
+    message = Update.model_validate(recorded).message
+    assert message.forward_origin.sender_user_name == mask_text('Мария Сидорова')
+    assert_no_leaks(recorded, 'Мария', 'Сидорова', 'редактор', 'привет')
+
+
+def test_contact_roundtrip():
+    update = {
+        'update_id': 3,
+        'message': {
+            'message_id': 12, 'date': 1700000000, 'chat': CHAT, 'from': SENDER,
+            'contact': {
+                'phone_number': '+79991234567', 'first_name': 'Мария', 'last_name': 'Сидорова',
+                'user_id': 222222222, 'vcard': 'BEGIN:VCARD\nTEL:+79991234567\nEND:VCARD',
+            },
+        },
+    }
+    recorded = record(update)
+
+    contact = Update.model_validate(recorded).message.contact
+    assert contact.user_id == pseudonym(222222222, SECRET)
+    assert contact.phone_number == '+00000000000'
+    assert_no_leaks(recorded, 222222222, '79991234567', 'Мария', 'Сидорова')
+
+
+def test_new_chat_members():
+    update = {
+        'update_id': 4,
+        'message': {
+            'message_id': 13, 'date': 1700000000, 'from': SENDER,
+            'chat': {'id': -1001234567890, 'type': 'supergroup', 'title': 'Семья'},
+            'new_chat_members': [THIRD_PARTY],
+        },
+    }
+    recorded = record(update)
+
+    message = Update.model_validate(recorded).message
+    assert message.chat.id == pseudonym(-1001234567890, SECRET) < 0
+    assert [member.id for member in message.new_chat_members] == [pseudonym(THIRD_PARTY['id'], SECRET)]
+    assert_no_leaks(recorded, 222222222, 1234567890, 'Мария', 'maria_s', 'Семья')
+
+
+def test_file_extension_and_command_are_kept():
+    assert mask_text('/search отчет 2024') == '/search жжжжж 0000'
+    update = {
+        'update_id': 5,
+        'message': {
+            'message_id': 14, 'date': 1700000000, 'chat': CHAT, 'from': SENDER,
+            'document': {'file_id': 'abc', 'file_unique_id': 'u', 'file_name': 'Паспорт Иванова.pdf'},
+        },
+    }
+    assert Update.model_validate(record(update)).message.document.file_name == 'жжжжжжж жжжжжжж.pdf'
@@ -0,0 +1,34 @@
+import pytest
+
+from src.database.database import Database
+from src.handlers import handlers
+from src.utils.search_cache import SearchCache, normalize_query
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'files.db'))
+    monkeypatch.setattr(handlers, 'db', db)
+    monkeypatch.setattr(handlers, 'search_cache', SearchCache())
+    return db
+
+
+def test_normalize_query_collapses_only_spaces():
+    assert normalize_query('  отчет \t за\n март ') == 'отчет за март'
+    assert normalize_query('Отчет, март') == 'Отчет, март'
+
+
+def test_cache_entry_is_dropped_with_new_library_version():
+    cache = SearchCache()
+    entry = cache.put(1, 'f', 'a  b', [3, 2], False, version=1)
+    assert cache.get(1, 'f', ' a b ', 1) is entry
+    assert cache.get(1, 'f', 'a b', 2) is None
+    assert cache.get_by_token(entry.token, 1) is None
+
+
+async def test_queries_with_one_key_find_the_same(db):
+    await db.add_file('f1', 'отчет за март.pdf', 10, 'pdf', 'documents', user_id=1)
+
+    spaced = await handlers.run_cached_search(1, 'f', 'за  март')
+    assert spaced.ids and spaced.query == 'за март'
+    assert await handlers.run_cached_search(1, 'f', 'за март') is spaced
@@ -0,0 +1,88 @@
+import asyncio
+
+from aiogram.types import InlineQuery, Message
+
+from src.middlewares.throttling import MemoryTokenBuckets, ThrottlingMiddleware
+
+USER = {'id': 1, 'is_bot': False, 'first_name': 'Test'}
+
+
+def make_message(message_id: int, text: str = 'hello') -> Message:
+    return Message.model_validate({
+        'message_id': message_id, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'from': USER, 'text': text
+    })
+
+
+def make_inline_query(query_id: int) -> InlineQuery:
+    return InlineQuery.model_validate({'id': str(query_id), 'from': USER, 'query': 'q' * query_id, 'offset': ''})
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, event, data):
+        self.calls += 1
+
+
+class FlakyBuckets(MemoryTokenBuckets):
+    """Хранилище лимитов, которое можно "уронить" (вместо Redis)"""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.calls = 0
+
+    async def consume(self, key, rate, burst):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError('Redis недоступен')
+        return await super().consume(key, rate, burst)
+
+
+async def test_messages_over_burst_are_dropped():
+    middleware = ThrottlingMiddleware(rate=2, burst=10, heavy_rate=0.2, heavy_burst=3)
+    handler = Counter()
+    for message_id in range(20):
+        await middleware(handler, make_message(message_id), {})
+    assert handler.calls == 10
+
+
+async def test_exempt_messages_do_not_spend_tokens():
+    middleware = ThrottlingMiddleware(
+        rate=2, burst=10, heavy_rate=0.2, heavy_burst=3,
+        exempt=lambda message: 'https://' in message.text
+    )
+    handler = Counter()
+    for message_id in range(200):
+        await middleware(handler, make_message(message_id, f'https://example.com/{message_id}'), {})
+    for message_id in range(20):
+        await middleware(handler, make_message(message_id), {})
+    assert handler.calls == 200 + 10
+
+
+async def test_inline_queries_use_their_own_bucket():
+    middleware = ThrottlingMiddleware(rate=2, burst=10, heavy_rate=0.2, heavy_burst=3, inline_rate=5, inline_burst=30)
+    handler = Counter()
+    for query_id in range(30):
+        await middleware(handler, make_inline_query(query_id), {})
+    for message_id in range(10):
+        await middleware(handler, make_message(message_id), {})
+    assert handler.calls == 40
+
+
+async def test_storage_is_retried_after_cooldown():
+    buckets = FlakyBuckets()
+    middleware = ThrottlingMiddleware(rate=2, burst=10, heavy_rate=0.2, heavy_burst=3, buckets=buckets, redis_retry=0.1)
+    buckets.down = True
+    handler = Counter()
+    await middleware(handler, make_message(1), {})
+    await middleware(handler, make_message(2), {})
+    assert handler.calls == 2
+    assert buckets.calls == 1
+
+    buckets.down = False
+    await asyncio.sleep(0.15)
+    await middleware(handler, make_message(3), {})
+    assert buckets.calls == 2
+    assert middleware._fallback is None
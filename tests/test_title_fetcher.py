@@ -0,0 +1,151 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.database.database import Database
+from src.services.title_fetcher import TitleFetcher, parse_title
+from src.utils.safe_http import UnsafeURLError, ensure_public_url, is_public_address
+
+
+@pytest.fixture
+async def site():
+    """Локальный HTTP-сервер вместо настоящих сайтов; hits - число запросов к каждому пути"""
+    hits = {}
+
+    async def page(request):
+        hits[request.path] = hits.get(request.path, 0) + 1
+        name = request.match_info['name']
+        if name == 'long':
+            body = '<html><head><title>Длинная</title></head><body>' + 'x' * 100000 + '</body></html>'
+            return web.Response(text=body, content_type='text/html')
+        if name == 'og':
+            return web.Response(
+                text='<meta property="og:title" content="Из og"><title>Из title</title>',
+                content_type='text/html'
+            )
+        if name == 'cp1251':
+            return web.Response(
+                body='<title>Привет</title>'.encode('cp1251'),
+                headers={'Content-Type': 'text/html; charset=windows-1251'}
+            )
+        if name == 'redirect':
+            raise web.HTTPFound('/page/plain')
+        if name == 'loop':
+            raise web.HTTPFound('/page/loop')
+        if name == 'missing':
+            return web.Response(status=404, text='<title>Not found</title>', content_type='text/html')
+        if name == 'json':
+            return web.json_response({'title': 'nope'})
+        return web.Response(text='<html><title>  Простая &amp; страница </title></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/page/{name}', page)
+    server = TestServer(app)
+    await server.start_server()
+    server.hits = hits
+    yield server
+    await server.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'files.db'))
+
+
+@pytest.fixture
+async def fetcher(db):
+    fetcher = TitleFetcher(db, timeout=5, failure_ttl=60, allow_private=True)
+    yield fetcher
+    await fetcher.close()
+
+
+def test_parse_title_prefers_og_title():
+    assert parse_title(b'<meta property="og:title" content="A"><title>B</title>') == 'A'
+    assert parse_title(b'<title>\n  A &lt;b&gt;\n</title>') == 'A <b>'
+    assert parse_title(b'<html></html>') is None
+
+
+async def test_fetch_title(site, fetcher):
+    assert await fetcher.fetch_title(str(site.make_url('/page/plain'))) == 'Простая & страница'
+    assert await fetcher.fetch_title(str(site.make_url('/page/og'))) == 'Из og'
+    assert await fetcher.fetch_title(str(site.make_url('/page/cp1251'))) == 'Привет'
+
+
+async def test_reads_only_page_head(site, db):
+    fetcher = TitleFetcher(db, max_bytes=4096, allow_private=True)
+    try:
+        assert await fetcher.fetch_title(str(site.make_url('/page/long'))) == 'Длинная'
+    finally:
+        await fetcher.close()
+
+
+async def test_follows_redirects(site, fetcher):
+    assert await fetcher.fetch_title(str(site.make_url('/page/redirect'))) == 'Простая & страница'
+    assert site.hits['/page/plain'] == 1
+
+
+async def test_redirect_loop_gives_no_title(site, fetcher):
+    assert await fetcher.fetch_title(str(site.make_url('/page/loop'))) is None
+
+
+async def test_no_title_for_errors_and_non_html(site, fetcher):
+    assert await fetcher.fetch_title(str(site.make_url('/page/missing'))) is None
+    assert await fetcher.fetch_title(str(site.make_url('/page/json'))) is None
+
+
+async def test_title_is_cached(site, fetcher, db):
+    url = str(site.make_url('/page/plain'))
+    await fetcher.fetch_title(url)
+    await fetcher.fetch_title(url + '#section')
+    assert site.hits['/page/plain'] == 1
+    assert await db.get_cached_link_title(url) == 'Простая & страница'
+
+
+@pytest.mark.parametrize('failure_ttl, expected_hits', [(60, 1), (0, 2)])
+async def test_failure_is_retried_after_ttl(site, db, failure_ttl, expected_hits):
+    url = str(site.make_url('/page/missing'))
+    fetcher = TitleFetcher(db, failure_ttl=failure_ttl, allow_private=True)
+    try:
+        await fetcher.fetch_title(url)
+        await fetcher.fetch_title(url)
+        assert site.hits['/page/missing'] == expected_hits
+    finally:
+        await fetcher.close()
+
+
+@pytest.mark.parametrize('host', ['127.0.0.1', 'localhost'])
+async def test_private_addresses_are_refused(site, db, host):
+    fetcher = TitleFetcher(db)
+    try:
+        url = str(site.make_url('/page/plain').with_host(host))
+        assert await fetcher.fetch_title(url) is None
+        assert not site.hits
+    finally:
+        await fetcher.close()
+
+
+@pytest.mark.parametrize('address', [
+    '127.0.0.1', '10.1.2.3', '172.16.0.1', '192.168.1.1', '169.254.169.254',
+    '100.64.0.1', '0.0.0.0', '::1', 'fe80::1', 'fc00::1', '::ffff:127.0.0.1', '224.0.0.1'
+])
+def test_internal_addresses(address):
+    assert not is_public_address(address)
+
+
+def test_public_addresses():
+    assert is_public_address('93.184.216.34')
+    assert is_public_address('2606:2800:220:1:248:1893:25c8:1946')
+
+
+@pytest.mark.parametrize('url', [
+    'http://169.254.169.254/latest/meta-data/', 'http://[::1]:8080/', 'http://10.0.0.1/',
+    'ftp://example.com/', 'file:///etc/passwd'
+])
+def test_ensure_public_url_refuses(url):
+    with pytest.raises(UnsafeURLError):
+        ensure_public_url(url)
+
+
+def test_ensure_public_url_allows_names_and_public_ips():
+    ensure_public_url('https://example.com/page')
+    ensure_public_url('http://93.184.216.34/')
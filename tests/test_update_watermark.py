@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from aiogram.types import Update
+
+from src.database.database import Database
+from src.middlewares.update_watermark import BACKLOG_WINDOW, WATERMARK_KEY, UpdateWatermark
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'files.db'))
+
+
+async def make_watermark(db, saved=None):
+    if saved is not None:
+        await db.set_service_state(WATERMARK_KEY, str(saved))
+    watermark = UpdateWatermark(db, save_interval=0)
+    await watermark.load()
+    return watermark
+
+
+async def feed(watermark, *update_ids):
+    """Пропустить обновления через middleware; возвращает id тех, что дошли до обработчика"""
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.update_id)
+
+    for update_id in update_ids:
+        await watermark(handler, Update(update_id=update_id), {})
+    return handled
+
+
+async def test_skips_redelivered_backlog(db):
+    watermark = await make_watermark(db, saved=1000)
+
+    assert await feed(watermark, 999, 1000, 1001, 1002) == [1001, 1002]
+    assert watermark.skipped == 2
+    await watermark.close()
+    assert await db.get_service_state(WATERMARK_KEY) == '1002'
+
+
+async def test_skip_ends_after_backlog(db):
+    watermark = await make_watermark(db, saved=1000)
+    await feed(watermark, 1001)
+
+    # Граница с диска больше не действует - значение ниже нее уже не повтор
+    assert await feed(watermark, 990) == [990]
+
+
+async def test_resets_when_update_ids_start_over(db):
+    watermark = await make_watermark(db, saved=5_000_000)
+
+    assert await feed(watermark, 17, 18) == [17, 18]
+    await watermark.close()
+    assert await db.get_service_state(WATERMARK_KEY) == '18'
+
+
+async def test_update_just_below_window_resets(db):
+    watermark = await make_watermark(db, saved=1000)
+
+    assert await feed(watermark, 1000 - BACKLOG_WINDOW) == [1000 - BACKLOG_WINDOW]
+    assert watermark.watermark == 1000 - BACKLOG_WINDOW
+
+
+async def test_without_saved_watermark(db):
+    watermark = await make_watermark(db)
+
+    assert await feed(watermark, 5, 6) == [5, 6]
+    assert watermark.watermark == 6
+    assert watermark.skipped == 0
+
+
+async def test_cancelled_update_keeps_watermark_below_it(db):
+    watermark = await make_watermark(db)
+    release = asyncio.Event()
+
+    async def slow(event, data):
+        await release.wait()
+
+    async def fast(event, data):
+        pass
+
+    stuck = asyncio.create_task(watermark(slow, Update(update_id=11), {}))
+    await asyncio.sleep(0)
+    await watermark(fast, Update(update_id=10), {})
+    await watermark(fast, Update(update_id=12), {})
+
+    # Остановка по SHUTDOWN_TIMEOUT отменяет незаконченные обработчики
+    stuck.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await stuck
+    await watermark.close()
+    assert await db.get_service_state(WATERMARK_KEY) == '10'
@@ -0,0 +1,38 @@
+import asyncio
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message
+
+from src.handlers import handlers
+
+
+def make_message(message_id, url):
+    return Message.model_validate({
+        'message_id': message_id, 'date': 0, 'text': url,
+        'chat': {'id': 1, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'Test'},
+        'entities': [{'type': 'url', 'offset': 0, 'length': len(url)}],
+    })
+
+
+async def test_batch_confirmation_task_is_tracked_until_done(monkeypatch):
+    confirmed = []
+
+    async def confirm(message, state, user_id, urls):
+        confirmed.append(list(urls))
+
+    monkeypatch.setattr(handlers, 'URL_BATCH_DELAY', 0.01)
+    monkeypatch.setattr(handlers, 'send_url_batch_confirmation', confirm)
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=1, user_id=1))
+
+    for number, url in enumerate(['https://a.example/', 'https://b.example/'], 1):
+        await handlers.handle_url_message(make_message(number, url), state, [url])
+    # Первое подтверждение отменено вторым сообщением пачки, второе ждет паузы
+    assert handlers.pending_url_batches[1]['task'] in handlers.url_batch_tasks
+
+    await asyncio.gather(*handlers.url_batch_tasks, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert confirmed == [['https://a.example/', 'https://b.example/']]
+    assert not handlers.url_batch_tasks and not handlers.pending_url_batches
@@ -0,0 +1,83 @@
+import pytest
+from aiogram.types import Message
+
+from src.utils.urls import canonicalize_url, dedup_key, extract_urls, url_hash
+
+
+def make_message(text, *entities):
+    """Сообщение с сущностями: (тип, подстрока текста[, url для text_link])"""
+    return Message.model_validate({
+        'message_id': 1, 'date': 0, 'text': text,
+        'chat': {'id': 1, 'type': 'private'},
+        'entities': [
+            {'type': kind, 'offset': text.index(part), 'length': len(part), **({'url': extra[0]} if extra else {})}
+            for kind, part, *extra in entities
+        ],
+    })
+
+
+def test_extract_urls_keeps_order_and_drops_duplicates():
+    message = make_message(
+        'example.com/a, тут и https://www.example.com/a/?utm_source=x, docs.python.org',
+        ('url', 'example.com/a'),
+        ('text_link', 'тут', 'https://github.com/'),
+        ('url', 'https://www.example.com/a/?utm_source=x'),
+        ('url', 'docs.python.org'),
+    )
+    assert extract_urls(message) == ['http://example.com/a', 'https://github.com/', 'http://docs.python.org/']
+
+
+def test_extract_urls_skips_non_web_links():
+    message = make_message(
+        'канал, почта, звонок, сайт',
+        ('text_link', 'канал', 'tg://resolve?domain=example'),
+        ('text_link', 'почта', 'mailto:user@example.com'),
+        ('text_link', 'звонок', 'tel:+10000000000'),
+        ('text_link', 'сайт', 'https://example.com/'),
+        ('bold', 'сайт'),
+    )
+    assert extract_urls(message) == ['https://example.com/']
+
+
+@pytest.mark.parametrize('url, canonical', [
+    ('HTTP://Example.COM', 'http://example.com/'),
+    ('example.com/page', 'http://example.com/page'),
+    ('https://example.com:443/a', 'https://example.com/a'),
+    ('http://example.com:8080/a', 'http://example.com:8080/a'),
+    ('https://example.com/a?b=2&utm_source=tg&a=1&fbclid=x', 'https://example.com/a?b=2&a=1'),
+    ('https://example.com/app#/settings', 'https://example.com/app#/settings'),
+])
+def test_canonicalize_url(url, canonical):
+    assert canonicalize_url(url) == canonical
+
+
+def test_canonicalize_url_can_drop_fragment():
+    assert canonicalize_url('https://example.com/a#top', keep_fragment=False) == 'https://example.com/a'
+
+
+@pytest.mark.parametrize('url', [
+    'https://example.com/docs',
+    'http://example.com/docs',
+    'https://www.example.com/docs',
+    'https://example.com/docs/',
+    'https://example.com/docs#intro',
+    'https://example.com/docs?utm_campaign=spring',
+])
+def test_dedup_key_folds_spellings_of_one_page(url):
+    assert dedup_key(url) == dedup_key('http://example.com/docs')
+    assert url_hash(url) == url_hash('http://example.com/docs')
+
+
+def test_dedup_key_ignores_query_order():
+    assert dedup_key('https://example.com/s?q=1&page=2') == dedup_key('https://example.com/s?page=2&q=1')
+
+
+@pytest.mark.parametrize('other', [
+    'https://example.com/docs/other',
+    'https://example.com/docs?page=2',
+    'https://docs.example.com/docs',
+    'https://example.com:8443/docs',
+])
+def test_dedup_key_keeps_different_pages_apart(other):
+    assert url_hash(other) != url_hash('https://example.com/docs')
+
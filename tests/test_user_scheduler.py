@@ -0,0 +1,143 @@
+import asyncio
+
+from aiogram.types import Update, User
+
+from src.middlewares.user_scheduler import UserScheduler
+
+USER = User(id=1, is_bot=False, first_name='Test')
+
+
+def message_update(update_id):
+    return Update.model_validate({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': 0, 'text': 'hi',
+            'chat': {'id': USER.id, 'type': 'private'}, 'from': USER.model_dump(),
+        },
+    })
+
+
+def inline_update(update_id, query):
+    return Update.model_validate({
+        'update_id': update_id,
+        'inline_query': {'id': str(update_id), 'from': USER.model_dump(), 'query': query, 'offset': ''},
+    })
+
+
+async def run(scheduler, updates, handler):
+    await asyncio.gather(*(scheduler(handler, update, {'event_from_user': USER}) for update in updates))
+
+
+async def test_messages_of_one_user_run_in_order():
+    scheduler = UserScheduler(concurrency=4)
+    running, order = [], []
+
+    async def handler(event, data):
+        running.append(event.update_id)
+        assert len(running) == 1
+        await asyncio.sleep(0.01)
+        order.append(event.update_id)
+        running.remove(event.update_id)
+
+    await run(scheduler, [message_update(i) for i in range(1, 4)], handler)
+    assert order == [1, 2, 3]
+    assert scheduler.users == 0
+
+
+async def test_inline_queries_skip_user_queue():
+    scheduler = UserScheduler(concurrency=4)
+    release = asyncio.Event()
+    started = []
+
+    async def handler(event, data):
+        started.append(event.update_id)
+        if event.message is not None:
+            await release.wait()
+
+    busy = asyncio.create_task(scheduler(handler, message_update(1), {'event_from_user': USER}))
+    await asyncio.sleep(0)
+    # Нажатия клавиш не ждут, пока закончится обработка сообщения этого пользователя
+    await asyncio.wait_for(run(scheduler, [inline_update(2, 'a'), inline_update(3, 'ab')], handler), 1)
+    assert started == [1, 2, 3]
+
+    release.set()
+    await busy
+    assert scheduler.users == 0
+
+
+async def test_inline_queries_take_pool_slots():
+    scheduler = UserScheduler(concurrency=1)
+    running = []
+
+    async def handler(event, data):
+        running.append(event.update_id)
+        assert len(running) == 1
+        await asyncio.sleep(0.01)
+        running.remove(event.update_id)
+
+    await run(scheduler, [inline_update(i, 'q' * i) for i in range(1, 4)], handler)
+
+
+def other_user_update(update_id):
+    update = message_update(update_id).model_dump(by_alias=True, exclude_none=True)
+    update['message']['from']['id'] = update['message']['chat']['id'] = 2
+    return Update.model_validate(update)
+
+
+async def poll(scheduler, updates, handler, limit):
+    """
+    Как Dispatcher._polling с tasks_concurrency_limit: место в лимите занимается
+    до создания задачи обновления и освобождается, когда задача закончилась.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    tasks = []
+    for update in updates:
+        await semaphore.acquire()
+        user = (update.message or update.inline_query).from_user
+        task = asyncio.create_task(scheduler(handler, update, {'event_from_user': user}))
+        task.add_done_callback(lambda _: semaphore.release())
+        tasks.append(task)
+    return tasks
+
+
+async def test_flooding_user_does_not_block_polling_for_others():
+    scheduler = UserScheduler(concurrency=4, max_per_user=3)
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.update_id)
+        if event.message.from_user.id == USER.id:
+            await release.wait()
+
+    flood = [message_update(update_id) for update_id in range(1, 21)]
+    tasks = await asyncio.wait_for(poll(scheduler, flood + [other_user_update(100)], handler, limit=5), 1)
+    await asyncio.wait_for(tasks[-1], 1)
+
+    # Первое сообщение еще обрабатывается, а другой пользователь уже получил ответ
+    assert handled == [1, 100]
+    assert scheduler.dropped == 17
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert handled == [1, 100, 2, 3]
+    assert scheduler.users == 0 and not scheduler._pending
+
+
+async def test_inline_queries_count_towards_user_limit():
+    scheduler = UserScheduler(concurrency=4, max_per_user=2)
+    release = asyncio.Event()
+
+    async def handler(event, data):
+        await release.wait()
+
+    tasks = [
+        asyncio.create_task(scheduler(handler, inline_update(update_id, 'q'), {'event_from_user': USER}))
+        for update_id in range(1, 5)
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.dropped == 2
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert not scheduler._pending